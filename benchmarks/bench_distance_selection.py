@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark distance selection against buffering the target polygon.
+
+For each vertex count, builds a star polygon in WGS84 (its radius jittered by
+1% from vertex to vertex) and selects the random points within ``--distance``
+metres of it three ways, all in the polygon's UTM zone:
+
+  selector   distance_selection.DistanceSelector (bbox, distance grid, inside
+             test, STRtree of boundary pieces queried with dwithin)
+  buffer     buffer the polygon by the distance, then intersects_xy
+  dwithin    shapely.dwithin against the whole prepared polygon (the reference)
+
+The selector must return exactly the reference points; the buffer's
+mismatches (its arcs are approximated by segments) are reported, or the error
+if GEOS cannot buffer the polygon at all.
+
+  python benchmarks/bench_distance_selection.py --vertices 1000,100000 --points 5000000 --distance 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distance_selection import DistanceSelector  # noqa: E402
+from reprojection import get_transformer  # noqa: E402
+
+# Where the star is placed and its radius, in degrees (about 90 km across)
+LON, LAT, RADIUS = 88.5, 23.5, 0.4
+
+
+def star_polygon(vertices: int, seed: int = 0) -> shapely.Polygon:
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = RADIUS * (1 + 0.01 * rng.random(vertices))
+    return shapely.Polygon(np.column_stack([LON + radii * np.cos(angles), LAT + radii * np.sin(angles)]))
+
+
+def _timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark distance selection against buffering the polygon.")
+    parser.add_argument("--vertices", default="1000,100000",
+                        help="Comma-separated polygon vertex counts (default: 1000,100000)")
+    parser.add_argument("--points", type=int, default=1000000, help="Number of random points (default: 1000000)")
+    parser.add_argument("--distance", type=float, default=5000, help="Distance in metres (default: 5000)")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(1)
+    lon = rng.uniform(LON - 1.75 * RADIUS, LON + 1.75 * RADIUS, args.points)
+    lat = rng.uniform(LAT - 1.75 * RADIUS, LAT + 1.75 * RADIUS, args.points)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lon, lat), crs="EPSG:4326")
+
+    for vertices in (int(value) for value in args.vertices.split(",")):
+        geom = star_polygon(vertices)
+
+        def build():
+            selector = DistanceSelector(geom, "EPSG:4326", args.distance)
+            selector.grid  # Built on first use otherwise
+            return selector
+
+        selector, build_seconds = _timed(build)
+        selected, selector_seconds = _timed(lambda: selector.select(points))
+
+        x, y = get_transformer("EPSG:4326", selector.metric_crs).transform(lon, lat)
+
+        def buffered():
+            grown = shapely.buffer(selector.geom, args.distance)
+            shapely.prepare(grown)
+            return np.flatnonzero(shapely.intersects_xy(grown, x, y))
+
+        try:
+            buffer_selected, buffer_seconds = _timed(buffered)
+        except (MemoryError, shapely.errors.GEOSException) as exc:
+            buffer_selected, buffer_seconds = None, f"failed: {exc}"
+        expected, dwithin_seconds = _timed(
+            lambda: np.flatnonzero(shapely.dwithin(selector.geom, shapely.points(x, y), args.distance))
+        )
+        if not np.array_equal(selected.index.to_numpy(), expected):
+            raise SystemExit(f"Selector differs from the dwithin reference for {vertices} vertices")
+
+        buffer = {"buffer_seconds": buffer_seconds}
+        if buffer_selected is not None:
+            buffer = {"buffer_seconds": round(buffer_seconds, 4),
+                      "buffer_mismatches": int(len(np.setxor1d(buffer_selected, expected)))}
+        print(json.dumps({
+            "vertices": int(shapely.get_num_coordinates(selector.geom)),
+            "points": args.points,
+            "distance": args.distance,
+            "selected": len(expected),
+            "build_seconds": round(build_seconds, 4),
+            "selector_seconds": round(selector_seconds, 4),
+            **buffer,
+            "dwithin_seconds": round(dwithin_seconds, 4),
+        }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
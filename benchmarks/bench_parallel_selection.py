@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark the process-pool point-in-polygon test against the serial one.
+
+Generates random points around a detailed polygon and times the exact
+``within`` / ``intersects`` mask serially and with 1..N worker processes,
+checking that every run returns the same mask.
+
+  python benchmarks/bench_parallel_selection.py --points 5000000 --workers 1,2,4,8,16,32
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parallel_selection import ParallelPredicatePool, predicate_mask  # noqa: E402
+
+
+def detailed_polygon(vertices: int, seed: int = 0) -> shapely.Geometry:
+    """A star-like polygon with ``vertices`` jittered boundary vertices around (0.5, 0.5)."""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = 0.4 + 0.05 * rng.random(vertices)
+    return shapely.Polygon(np.column_stack([0.5 + radii * np.cos(angles), 0.5 + radii * np.sin(angles)]))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark parallel point-in-polygon evaluation.")
+    parser.add_argument("--points", type=int, default=2000000, help="Number of random points (default: 2000000)")
+    parser.add_argument("--vertices", type=int, default=100000, help="Polygon boundary vertices (default: 100000)")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated worker counts (default: 1,2,4,8)")
+    parser.add_argument("--predicate", choices=["within", "intersects"], default="within")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(1)
+    points = shapely.points(rng.random(args.points), rng.random(args.points))
+    geom = detailed_polygon(args.vertices)
+    shapely.prepare(geom)
+
+    start = time.perf_counter()
+    expected = predicate_mask(points, geom, args.predicate)
+    serial_seconds = time.perf_counter() - start
+    print(json.dumps({"mode": "serial", "points": args.points, "seconds": round(serial_seconds, 4)}))
+
+    for workers in (int(value) for value in args.workers.split(",")):
+        with ParallelPredicatePool(workers, min_parallel_rows=0) as pool:
+            pool.mask(points[:workers], geom, args.predicate)  # start the worker processes
+            start = time.perf_counter()
+            mask = pool.mask(points, geom, args.predicate)
+            seconds = time.perf_counter() - start
+        if not np.array_equal(mask, expected):
+            raise SystemExit(f"Mask from {workers} workers differs from the serial result")
+        print(json.dumps({
+            "mode": "pool",
+            "workers": workers,
+            "points": args.points,
+            "seconds": round(seconds, 4),
+            "speedup": round(serial_seconds / seconds, 2) if seconds else None,
+        }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark every stage of the extraction pipeline on synthetic layers.
+
+Generates a random point layer for each size and a grid of named district
+polygons with ``simple`` (a handful of vertices) or ``detailed`` (tens of
+thousands of jittered vertices) boundaries, writes them as GeoPackage,
+GeoJSON and zipped Shapefile, and times the stages of one extraction:
+
+  read_polygons, read_points   gpd.read_file
+  ensure_crs_compatible        points (EPSG:4326) -> polygons (EPSG:32631)
+  filter_polygons_by_name
+  build_union_geometry
+  select_points
+  write_csv                    write_points_csv
+
+Each case runs in its own Python process so its peak RSS is its own. Results
+are printed as one JSON object per case and, with ``--output``, saved as one
+JSON document (with library versions) for comparison between releases.
+Generated layers are kept in ``--data-dir`` and reused by later runs.
+
+  python benchmarks/bench_pipeline.py --sizes 10000,1000000 --output bench.json
+  python benchmarks/bench_pipeline.py --sizes 50000000 --formats gpkg --detail detailed
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parallel_selection import detailed_polygon  # noqa: E402
+from instrumentation import peak_rss_bytes  # noqa: E402
+
+FORMATS = ("gpkg", "geojson", "zip")
+DETAIL_VERTICES = {"simple": 8, "detailed": 20000}
+
+POINTS_CRS = "EPSG:4326"
+POLYGONS_CRS = "EPSG:32631"
+# Extent of the synthetic districts in EPSG:32631 (northern France)
+EXTENT = (400000.0, 5400000.0, 600000.0, 5600000.0)
+GRID = 4
+TARGET_NAME = "district_05"
+
+
+def synthetic_points(size: int, seed: int = 1) -> gpd.GeoDataFrame:
+    """``size`` random points over :data:`EXTENT`, with a few attribute columns, in EPSG:4326."""
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = EXTENT
+    geometry = gpd.GeoSeries(
+        gpd.points_from_xy(rng.uniform(minx, maxx, size), rng.uniform(miny, maxy, size)), crs=POLYGONS_CRS
+    ).to_crs(POINTS_CRS)
+    return gpd.GeoDataFrame(
+        {
+            "pid": np.arange(size),
+            "category": rng.choice(["a", "b", "c", "d"], size),
+            "value": rng.random(size),
+        },
+        geometry=geometry,
+    )
+
+
+def synthetic_polygons(detail: str, seed: int = 0) -> gpd.GeoDataFrame:
+    """A ``GRID`` x ``GRID`` grid of named districts, each a star-like polygon filling its cell."""
+    vertices = DETAIL_VERTICES[detail]
+    minx, miny, maxx, maxy = EXTENT
+    cell_w = (maxx - minx) / GRID
+    cell_h = (maxy - miny) / GRID
+    names, geometries = [], []
+    for row in range(GRID):
+        for col in range(GRID):
+            unit = detailed_polygon(vertices, seed=seed + row * GRID + col)
+            # Scale the unit polygon (around 0.5, 0.5) up to the grid cell
+            geometries.append(shapely.transform(unit, lambda coords: coords * (cell_w, cell_h) + (minx + col * cell_w, miny + row * cell_h)))
+            names.append(f"district_{row * GRID + col:02d}")
+    return gpd.GeoDataFrame({"NAME": names}, geometry=geometries, crs=POLYGONS_CRS)
+
+
+def write_layer(gdf: gpd.GeoDataFrame, path: str, layer_format: str) -> None:
+    if layer_format == "gpkg":
+        gdf.to_file(path, driver="GPKG")
+    elif layer_format == "geojson":
+        gdf.to_file(path, driver="GeoJSON")
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            gdf.to_file(os.path.join(tmp, f"{stem}.shp"), driver="ESRI Shapefile")
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for name in sorted(os.listdir(tmp)):
+                    archive.write(os.path.join(tmp, name), name)
+
+
+def ensure_layers(data_dir: str, size: int, detail: str, layer_format: str):
+    """Paths of the points and polygons files for one case, generating them if missing."""
+    os.makedirs(data_dir, exist_ok=True)
+    points_path = os.path.join(data_dir, f"points_{size}.{layer_format}")
+    polygons_path = os.path.join(data_dir, f"districts_{detail}.{layer_format}")
+    if not os.path.exists(points_path):
+        print(f"Generating {points_path}", file=sys.stderr)
+        write_layer(synthetic_points(size), points_path, layer_format)
+    if not os.path.exists(polygons_path):
+        print(f"Generating {polygons_path}", file=sys.stderr)
+        write_layer(synthetic_polygons(detail), polygons_path, layer_format)
+    return points_path, polygons_path
+
+
+def peak_rss_mb():
+    peak = peak_rss_bytes()
+    return round(peak / (1024 * 1024), 1) if peak is not None else None
+
+
+def run_case(points_path: str, polygons_path: str, predicate: str) -> dict:
+    """Run the pipeline stages once and return their timings."""
+    from chunked_io import write_points_csv
+    from extraction import build_union_geometry, ensure_crs_compatible, filter_polygons_by_name
+    from point_selection import select_points
+
+    stages = {}
+
+    def timed(stage, run):
+        start = time.perf_counter()
+        result = run()
+        stages[stage] = {"seconds": round(time.perf_counter() - start, 4), "peak_rss_mb": peak_rss_mb()}
+        return result
+
+    polygons = timed("read_polygons", lambda: gpd.read_file(polygons_path))
+    points = timed("read_points", lambda: gpd.read_file(points_path))
+    points = timed("ensure_crs_compatible", lambda: ensure_crs_compatible(points, polygons))
+    matched = timed("filter_polygons_by_name", lambda: filter_polygons_by_name(polygons, "NAME", TARGET_NAME, False))
+    union_geom = timed("build_union_geometry", lambda: build_union_geometry(matched))
+    selection_stats = {}
+    selected = timed("select_points", lambda: select_points(points, union_geom, predicate, stats=selection_stats))
+    with tempfile.TemporaryDirectory() as tmp:
+        timed("write_csv", lambda: write_points_csv(selected, os.path.join(tmp, "selected.csv")))
+
+    return {
+        "points": len(points),
+        "polygon_vertices": int(shapely.get_num_coordinates(union_geom)),
+        "selected": len(selected),
+        "total_seconds": round(sum(stage["seconds"] for stage in stages.values()), 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def _environment() -> dict:
+    import pyogrio
+    import pyproj
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "geopandas": gpd.__version__,
+        "shapely": shapely.__version__,
+        "pyogrio": pyogrio.__version__,
+        "gdal": pyogrio.__gdal_version_string__,
+        "pyproj": pyproj.__version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the point extraction pipeline stage by stage.")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="Comma-separated point counts, up to tens of millions (default: 10000,100000,1000000)")
+    parser.add_argument("--formats", default=",".join(FORMATS), help=f"Comma-separated layer formats out of {', '.join(FORMATS)}")
+    parser.add_argument("--detail", default="simple,detailed",
+                        help="Comma-separated polygon boundary detail: simple, detailed (default: both)")
+    parser.add_argument("--predicate", choices=["within", "intersects"], default="within")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "gis_points_bench"),
+                        help="Where generated layers are kept and reused")
+    parser.add_argument("--output", help="Also write all results to this JSON file")
+    parser.add_argument("--run-case", nargs=2, metavar=("POINTS", "POLYGONS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        # Child process: one case, result on stdout
+        print(json.dumps(run_case(args.run_case[0], args.run_case[1], args.predicate)))
+        return 0
+
+    formats = args.formats.split(",")
+    details = args.detail.split(",")
+    for value in formats:
+        if value not in FORMATS:
+            parser.error(f"Unknown format: {value}")
+    for value in details:
+        if value not in DETAIL_VERTICES:
+            parser.error(f"Unknown polygon detail: {value}")
+
+    results = []
+    for size in (int(value) for value in args.sizes.split(",")):
+        for layer_format in formats:
+            for detail in details:
+                points_path, polygons_path = ensure_layers(args.data_dir, size, detail, layer_format)
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--predicate", args.predicate,
+                     "--run-case", points_path, polygons_path],
+                    check=True, stdout=subprocess.PIPE, text=True,
+                )
+                result = {"format": layer_format, "detail": detail, "predicate": args.predicate}
+                result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+                print(json.dumps(result))
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"environment": _environment(), "results": results}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
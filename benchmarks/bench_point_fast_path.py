@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark the x/y point fast path of ``select_points`` against ``points.within(geom)``.
+
+For each layer size, random points are generated around a detailed polygon and
+the selection is timed three ways: the plain GeoSeries predicate, the
+general STRtree path (forced by adding one multi-point to the layer) and the
+coordinate fast path. Every run must select the same rows. Layers with tens of
+millions of points need tens of GB of memory for the shapely objects alone.
+
+  python benchmarks/bench_point_fast_path.py --sizes 1000000,10000000,50000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parallel_selection import detailed_polygon  # noqa: E402
+from point_selection import select_points  # noqa: E402
+
+
+def _timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the point-in-polygon coordinate fast path.")
+    parser.add_argument("--sizes", default="1000000,10000000,50000000",
+                        help="Comma-separated point counts (default: 1000000,10000000,50000000)")
+    parser.add_argument("--vertices", type=int, default=10000, help="Polygon boundary vertices (default: 10000)")
+    parser.add_argument("--predicate", choices=["within", "intersects"], default="within")
+    args = parser.parse_args(argv)
+
+    geom = detailed_polygon(args.vertices)
+    shapely.prepare(geom)
+    for size in (int(value) for value in args.sizes.split(",")):
+        rng = np.random.default_rng(1)
+        # Points spread over twice the polygon's extent, so the bbox prunes some
+        points = gpd.GeoDataFrame(
+            {"id": np.arange(size)},
+            geometry=gpd.points_from_xy(rng.uniform(-0.5, 1.5, size), rng.uniform(-0.5, 1.5, size)),
+        )
+
+        expected, geoseries_seconds = _timed(lambda: np.flatnonzero(getattr(points, args.predicate)(geom)))
+        fast, fast_seconds = _timed(lambda: select_points(points, geom, args.predicate))
+
+        # One multi-point sends the whole layer down the STRtree path
+        general_layer = points.copy()
+        general_layer.loc[size - 1, "geometry"] = shapely.MultiPoint([(5, 5), (6, 6)])
+        general, general_seconds = _timed(lambda: select_points(general_layer, geom, args.predicate))
+
+        if not np.array_equal(fast["id"].to_numpy(), expected):
+            raise SystemExit(f"Fast path selection differs from points.{args.predicate}(geom) for {size} points")
+        if not np.array_equal(general["id"].to_numpy(), expected[expected != size - 1]):
+            raise SystemExit(f"STRtree path selection differs from points.{args.predicate}(geom) for {size} points")
+
+        print(json.dumps({
+            "points": size,
+            "selected": len(expected),
+            "geoseries_seconds": round(geoseries_seconds, 4),
+            "strtree_seconds": round(general_seconds, 4),
+            "fast_path_seconds": round(fast_seconds, 4),
+            "speedup_vs_geoseries": round(geoseries_seconds / fast_seconds, 2) if fast_seconds else None,
+        }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark the grid-tiled point-in-polygon test against the whole-polygon test.
+
+For each vertex count, builds a detailed star polygon (with a detailed hole),
+decomposes it into grid cells and times the tiled ``within`` / ``intersects``
+mask against ``shapely.contains_xy`` / ``intersects_xy`` on the prepared
+polygon. Points on the polygon's vertices and edges are added to the random
+ones, and every run must return the same mask.
+
+  python benchmarks/bench_polygon_tiles.py --vertices 10000,100000,500000 --points 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import shapely
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parallel_selection import detailed_polygon  # noqa: E402
+from parallel_selection import predicate_mask_xy  # noqa: E402
+from polygon_tiles import TiledGeometry  # noqa: E402
+
+
+def holed_polygon(vertices: int) -> shapely.Geometry:
+    """:func:`detailed_polygon` with a detailed hole of a tenth of its vertices."""
+    outer = detailed_polygon(vertices)
+    hole = shapely.affinity.scale(detailed_polygon(max(vertices // 10, 3), seed=1), 0.3, 0.3, origin=(0.5, 0.5))
+    return shapely.Polygon(outer.exterior, [hole.exterior])
+
+
+def _timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the tiled point-in-polygon test on high-vertex polygons.")
+    parser.add_argument("--vertices", default="10000,100000",
+                        help="Comma-separated polygon vertex counts (default: 10000,100000)")
+    parser.add_argument("--points", type=int, default=500000, help="Number of random points (default: 500000)")
+    parser.add_argument("--cells", type=int, default=None, help="Grid cells per axis (default: sized by vertex count)")
+    parser.add_argument("--predicate", choices=["within", "intersects"], default="within")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(1)
+    for vertices in (int(value) for value in args.vertices.split(",")):
+        geom = holed_polygon(vertices)
+        shapely.prepare(geom)
+        # Random points plus points on every 100th vertex and on the edges next to them
+        coords = shapely.get_coordinates(geom)[::100]
+        x = np.concatenate([rng.random(args.points), coords[:-1, 0], (coords[:-1, 0] + coords[1:, 0]) / 2])
+        y = np.concatenate([rng.random(args.points), coords[:-1, 1], (coords[:-1, 1] + coords[1:, 1]) / 2])
+
+        tiles, build_seconds = _timed(lambda: TiledGeometry(geom, args.cells))
+        tiled, tiled_seconds = _timed(lambda: tiles.mask_xy(x, y, args.predicate))
+        expected, full_seconds = _timed(lambda: predicate_mask_xy(x, y, geom, args.predicate))
+        if not np.array_equal(tiled, expected):
+            raise SystemExit(f"Tiled mask differs from the whole-polygon mask for {vertices} vertices")
+
+        print(json.dumps({
+            "vertices": int(shapely.get_num_coordinates(geom)),
+            "points": len(x),
+            "selected": int(expected.sum()),
+            "cells": tiles.cells,
+            **{f"{name}_cells": count for name, count in tiles.cell_counts().items()},
+            "build_seconds": round(build_seconds, 4),
+            "tiled_seconds": round(tiled_seconds, 4),
+            "full_seconds": round(full_seconds, 4),
+            "speedup": round(full_seconds / tiled_seconds, 2) if tiled_seconds else None,
+        }))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
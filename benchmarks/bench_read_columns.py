@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading a wide point layer in full against a column-projected read.
+
+Generates a GeoPackage of random points with ``--attributes`` attribute
+columns (integers, floats and strings in turn) and loads it three ways, each
+in its own Python process so its peak RSS is its own:
+
+  current           gpd.read_file(path): every column, default reader
+  projected         only --columns (and the geometry), default reader
+  projected_arrow   only --columns, through Arrow (chunked_io.layer_reader)
+
+Results are printed as one JSON object per mode: load time, peak RSS and the
+in-memory size of the loaded frame. Generated layers are kept in
+``--data-dir`` and reused by later runs.
+
+  python benchmarks/bench_read_columns.py --points 1000000 --attributes 40 --columns attr_000,attr_001,attr_002
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import geopandas as gpd
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunked_io import ARROW_READ_KWARGS, layer_reader  # noqa: E402
+from instrumentation import peak_rss_bytes  # noqa: E402
+
+MODES = ("current", "projected", "projected_arrow")
+
+
+def wide_points(size: int, attributes: int, seed: int = 1) -> gpd.GeoDataFrame:
+    """``size`` random points in EPSG:4326 with ``attributes`` int, float and string columns in turn."""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for number in range(attributes):
+        name = f"attr_{number:03d}"
+        kind = number % 3
+        if kind == 0:
+            columns[name] = rng.integers(0, 1000000, size)
+        elif kind == 1:
+            columns[name] = rng.random(size)
+        else:
+            columns[name] = np.char.add("value_", rng.integers(0, 10000, size).astype(str))
+    geometry = gpd.points_from_xy(rng.uniform(-10, 10, size), rng.uniform(40, 60, size))
+    return gpd.GeoDataFrame(columns, geometry=geometry, crs="EPSG:4326")
+
+
+def ensure_layer(data_dir: str, size: int, attributes: int) -> str:
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"wide_points_{size}_{attributes}.gpkg")
+    if not os.path.exists(path):
+        print(f"Generating {path}", file=sys.stderr)
+        wide_points(size, attributes).to_file(path, driver="GPKG")
+    return path
+
+
+def run_mode(path: str, mode: str, columns) -> dict:
+    """Load the layer once in ``mode`` and return its timings."""
+    start = time.perf_counter()
+    if mode == "current":
+        frame = gpd.read_file(path)
+    elif mode == "projected":
+        frame = gpd.read_file(path, columns=columns)
+    else:
+        frame = layer_reader(path, columns=columns)()
+    seconds = time.perf_counter() - start
+    peak = peak_rss_bytes()
+    return {
+        "rows": len(frame),
+        "columns": len(frame.columns) - 1,
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": round(peak / (1024 * 1024), 1) if peak is not None else None,
+        "frame_mb": round(frame.memory_usage(deep=True).sum() / (1024 * 1024), 1),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark full against column-projected layer loading.")
+    parser.add_argument("--points", type=int, default=500000, help="Number of random points (default: 500000)")
+    parser.add_argument("--attributes", type=int, default=30, help="Attribute columns in the layer (default: 30)")
+    parser.add_argument("--columns", default="attr_000,attr_001,attr_002",
+                        help="Comma-separated columns of the projected reads (default: attr_000,attr_001,attr_002)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "gis_points_bench"),
+                        help="Where generated layers are kept and reused")
+    parser.add_argument("--run-mode", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    columns = args.columns.split(",")
+
+    if args.run_mode:
+        # Child process: one mode, result on stdout
+        print(json.dumps(run_mode(args.run_mode[0], args.run_mode[1], columns)))
+        return 0
+
+    path = ensure_layer(args.data_dir, args.points, args.attributes)
+    for mode in MODES:
+        if mode == "projected_arrow" and not ARROW_READ_KWARGS:
+            print(json.dumps({"mode": mode, "skipped": "needs pyogrio and pyarrow"}))
+            continue
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--columns", args.columns, "--run-mode", path, mode],
+            check=True, stdout=subprocess.PIPE, text=True,
+        )
+        result = {"mode": mode}
+        result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+        print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,293 @@
+"""
+Chunked reading of point layers and incremental CSV writing.
+
+Point layers are read in fixed-size row ranges so peak memory is bounded by the
+chunk size rather than the layer size, and selected rows are appended to the
+output CSV as each chunk is processed. Downloads are produced the same way: as
+a stream of CSV (optionally gzip) blocks rather than one buffer. Reads can be restricted to the bounding
+box of the target polygons so the format's spatial index skips the rest of
+the file, and to a range of feature ids so incremental runs only read the
+rows appended since the last one.
+
+Layers are read through :func:`layer_reader`, which can skip all but the
+attribute columns that are needed and, with pyogrio and pyarrow installed,
+reads through Arrow so the attributes come back as columnar arrays instead of
+one Python object per value.
+"""
+
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from pyproj import CRS, Transformer
+from shapely.geometry import base as shapely_base
+
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+BBox = Tuple[float, float, float, float]
+# Feature ids after < fid <= upto; None leaves that end open
+FidRange = Tuple[Optional[int], Optional[int]]
+
+
+def _arrow_read_kwargs() -> Dict[str, object]:
+    if pyogrio is None or pyarrow is None:
+        return {}
+    kwargs: Dict[str, object] = {"engine": "pyogrio", "use_arrow": True}
+    try:
+        infer_string = pd.get_option("future.infer_string")
+    except pd.errors.OptionError:
+        infer_string = False  # pandas < 2.1 has no such option
+    if not infer_string:
+        # Before pandas 3, keep strings Arrow-backed instead of converting them to objects
+        string_dtype = pd.StringDtype("pyarrow")
+        kwargs["arrow_to_pandas_kwargs"] = {
+            "types_mapper": {pyarrow.string(): string_dtype, pyarrow.large_string(): string_dtype}.get,
+        }
+    return kwargs
+
+
+# gpd.read_file options of the Arrow read path; empty when pyogrio or pyarrow is missing
+ARROW_READ_KWARGS = _arrow_read_kwargs()
+
+# gpd.read_file options of reads that list or filter feature ids. Over Arrow, an
+# attribute-less listing of a Shapefile within a bbox returns no ids, and
+# OGRSQL drivers (Shapefile among them) reject fids= lists of a few thousand ids.
+_FID_READ_KWARGS = {"engine": "pyogrio", "use_arrow": False}
+
+
+def layer_reader(path: str, layer: Optional[str] = None,
+                 columns: Optional[Sequence[str]] = None) -> Callable[..., gpd.GeoDataFrame]:
+    """A ``read_file(**kwargs)`` callable for one layer, reading only ``columns`` and the geometry.
+
+    ``columns=None`` reads every attribute; otherwise they come back in the
+    order given. Reads go through the Arrow path (:data:`ARROW_READ_KWARGS`)
+    when it is available. Keyword arguments passed to the callable override
+    these defaults.
+    """
+    base_kwargs = dict(ARROW_READ_KWARGS)
+    if layer:
+        base_kwargs["layer"] = layer
+    if columns is not None:
+        base_kwargs["columns"] = list(columns)
+
+    def read_file(**kwargs) -> gpd.GeoDataFrame:
+        read_kwargs = {**base_kwargs, **kwargs}
+        return order_columns(gpd.read_file(path, **read_kwargs), read_kwargs.get("columns"))
+    return read_file
+
+
+def order_columns(frame: gpd.GeoDataFrame, columns: Optional[Sequence[str]]) -> gpd.GeoDataFrame:
+    """``frame`` with ``columns`` first, in the order given (readers return them in layer order)."""
+    if not columns:
+        return frame
+    return frame[list(columns) + [name for name in frame.columns if name not in columns]]
+
+
+class MissingColumnsError(KeyError):
+    """Requested attribute columns are not in the layer."""
+
+    def __str__(self) -> str:
+        # KeyError would quote the message
+        return str(self.args[0])
+
+
+def check_columns(available: Iterable[str], columns: Optional[Sequence[str]], layer_label: str) -> None:
+    available = list(available)
+    missing = [column for column in columns or [] if column not in available]
+    if missing:
+        raise MissingColumnsError(f"Column(s) {missing} not found in {layer_label}. Available columns: {available}")
+
+
+def check_layer_columns(read_file: Callable[..., gpd.GeoDataFrame], columns: Optional[Sequence[str]],
+                        layer_label: str) -> None:
+    """Raise :class:`MissingColumnsError` if the layer behind ``read_file`` lacks any of ``columns``.
+
+    A projected read silently leaves out unknown columns, so they are checked
+    against the layer's full schema (one feature is read).
+    """
+    if columns:
+        sample = read_file(rows=slice(0, 1), columns=None)
+        geometry_name = sample.geometry.name if isinstance(sample, gpd.GeoDataFrame) else None
+        check_columns([name for name in sample.columns if name != geometry_name], columns, layer_label)
+
+
+def iter_chunks(
+    read_rows: Callable[[Optional[slice]], gpd.GeoDataFrame],
+    chunk_size: Optional[int],
+) -> Iterator[gpd.GeoDataFrame]:
+    """Yield a layer chunk by chunk using ``read_rows(slice(start, stop))``.
+
+    With ``chunk_size=None`` the whole layer is read in one go (``read_rows(None)``).
+    The first chunk is always yielded, even if empty, so callers can write a
+    CSV header for empty results.
+    """
+    if chunk_size is None:
+        yield read_rows(None)
+        return
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be a positive number of rows.")
+
+    start = 0
+    while True:
+        chunk = read_rows(slice(start, start + chunk_size))
+        if start == 0 or len(chunk):
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        start += chunk_size
+
+
+def make_rows_reader(
+    read_file: Callable[..., gpd.GeoDataFrame],
+    bbox: Optional[BBox] = None,
+    fid_range: Optional[FidRange] = None,
+) -> Callable[[Optional[slice]], gpd.GeoDataFrame]:
+    """Adapt ``read_file(**kwargs)`` (e.g. a ``gpd.read_file`` partial) to the ``read_rows`` form.
+
+    With a ``bbox`` only features intersecting it are read. Spatially filtered
+    reads come back in spatial index order, so with pyogrio the ids of the
+    features inside the box are listed once, sorted, and the row ranges are
+    read by id. The output then keeps the file order even across chunks.
+
+    With ``fid_range=(after, upto)`` only features with ``after < fid <= upto``
+    are read (either end may be None), by the same id listing; this needs
+    pyogrio. Id listings and reads by id do not go through Arrow.
+    """
+    if bbox is None and fid_range is None:
+        def read_rows(rows: Optional[slice]) -> gpd.GeoDataFrame:
+            return read_file() if rows is None else read_file(rows=rows)
+        return read_rows
+
+    if pyogrio is None:
+        if fid_range is not None:
+            raise ValueError("Reading features by id needs 'pyogrio'.")
+
+        def read_rows(rows: Optional[slice]) -> gpd.GeoDataFrame:
+            return read_file(bbox=bbox) if rows is None else read_file(bbox=bbox, rows=rows)
+        return read_rows
+
+    filter_kwargs = {"bbox": bbox} if bbox is not None else {}
+    sorted_fids = []
+
+    def read_rows(rows: Optional[slice]) -> gpd.GeoDataFrame:
+        if rows is None and fid_range is None:
+            return read_file(engine="pyogrio", bbox=bbox, fid_as_index=True).sort_index()
+        if not sorted_fids:
+            sorted_fids.append(select_fids(read_fids(read_file, **filter_kwargs), fid_range))
+        fids = sorted_fids[0] if rows is None else sorted_fids[0][rows]
+        if len(fids) == 0:
+            # An empty id list would mean "no filter"; keep just the schema
+            return read_file(engine="pyogrio", rows=slice(0, 1), **filter_kwargs).iloc[:0]
+        return read_file(fids=fids, fid_as_index=True, **_FID_READ_KWARGS)
+
+    return read_rows
+
+
+def read_fids(read_file: Callable[..., gpd.GeoDataFrame], **kwargs) -> np.ndarray:
+    """Sorted feature ids of a layer (pyogrio only), read without geometry or attributes."""
+    ids = read_file(fid_as_index=True, read_geometry=False, columns=[], **_FID_READ_KWARGS, **kwargs).index
+    return np.sort(ids.to_numpy())
+
+
+def select_fids(fids: np.ndarray, fid_range: Optional[FidRange]) -> np.ndarray:
+    """The ids in ``fids`` with ``after < fid <= upto`` for ``fid_range=(after, upto)``."""
+    if fid_range is None:
+        return fids
+    after, upto = fid_range
+    if after is not None:
+        fids = fids[fids > after]
+    if upto is not None:
+        fids = fids[fids <= upto]
+    return fids
+
+
+def iter_file_chunks(
+    path: str,
+    chunk_size: Optional[int],
+    layer: Optional[str] = None,
+    bbox: Optional[BBox] = None,
+    fid_range: Optional[FidRange] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[gpd.GeoDataFrame]:
+    return iter_chunks(make_rows_reader(layer_reader(path, layer, columns), bbox, fid_range), chunk_size)
+
+
+def read_layer_crs(read_rows: Callable[[Optional[slice]], gpd.GeoDataFrame]) -> Optional[CRS]:
+    """Return the CRS of a layer by reading at most one feature."""
+    return read_rows(slice(0, 1)).crs
+
+
+def points_read_bbox(geom: shapely_base.BaseGeometry, geom_crs, points_crs) -> Optional[BBox]:
+    """Bounding box of ``geom`` expressed in the points' CRS, for a ``bbox=`` read filter.
+
+    Returns None (no filter) when either CRS is unknown or the geometry is empty,
+    so the caller falls back to reading the whole layer and the usual CRS
+    checks report the problem.
+    """
+    if geom is None or geom.is_empty or geom_crs is None or points_crs is None:
+        return None
+    minx, miny, maxx, maxy = geom.bounds
+    if CRS.from_user_input(geom_crs) == CRS.from_user_input(points_crs):
+        return (minx, miny, maxx, maxy)
+
+    # Densified edges keep the box a superset when the reprojection bends them
+    transformer = Transformer.from_crs(geom_crs, points_crs, always_xy=True)
+    minx, miny, maxx, maxy = transformer.transform_bounds(minx, miny, maxx, maxy, densify_pts=21)
+    if not minx <= maxx:
+        return None  # Crosses the antimeridian in the points' CRS; read everything
+    # Pad for round-off so points on the polygon boundary are still read
+    pad_x = (maxx - minx) * 1e-6
+    pad_y = (maxy - miny) * 1e-6
+    return (minx - pad_x, miny - pad_y, maxx + pad_x, maxy + pad_y)
+
+
+def write_points_csv(points: gpd.GeoDataFrame, output: str, append: bool = False) -> None:
+    """Write ``points`` without geometry to the CSV file ``output``.
+
+    With ``append=True`` the rows are added to the existing file and no header
+    is written.
+    """
+    df_out = points.drop(columns=["geometry"], errors="ignore")
+    # Ensure index not written
+    df_out.to_csv(output, mode="a" if append else "w", header=not append, index=False, encoding="utf-8")
+
+
+def iter_points_csv(points: gpd.GeoDataFrame, rows_per_chunk: int = 50000) -> Iterator[bytes]:
+    """Yield the CSV of ``points`` (as written by :func:`write_points_csv`) in UTF-8 blocks.
+
+    Only ``rows_per_chunk`` rows are serialized at a time, so the CSV text is
+    never held in memory as a whole.
+    """
+    df_out = points.drop(columns=["geometry"], errors="ignore")
+    for start in range(0, max(len(df_out), 1), rows_per_chunk):
+        rows = df_out.iloc[start:start + rows_per_chunk]
+        yield rows.to_csv(header=start == 0, index=False).encode("utf-8")
+
+
+def iter_file_blocks(path: str, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        while True:
+            block = fh.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a stream of byte blocks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
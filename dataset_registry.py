@@ -0,0 +1,113 @@
+"""
+In-memory registry of uploaded layers for the web app's dataset API.
+
+Layers are uploaded once and kept in process memory together with their
+spatial index, so queries only pay for filtering and selection. The registry
+holds at most ``memory_budget`` bytes (an estimate, see
+:func:`estimate_layer_bytes`) and evicts the least recently used layers. An
+optional ``loader`` brings evicted layers back, e.g. from the on-disk layer
+cache.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS
+
+from reprojection import reproject_points
+
+# Rough per-geometry cost of a shapely object on top of its coordinates
+_GEOMETRY_OVERHEAD_BYTES = 100
+_COORDINATE_BYTES = 16
+# Rough per-geometry cost of the spatial index (envelope and tree node)
+_SINDEX_BYTES = 64
+
+
+def estimate_layer_bytes(gdf: gpd.GeoDataFrame) -> int:
+    """Approximate memory held by ``gdf``, including its shapely geometries and spatial index."""
+    attributes = gdf.drop(columns=[gdf.geometry.name]).memory_usage(deep=True).sum()
+    coordinates = int(np.sum(shapely.get_num_coordinates(np.asarray(gdf.geometry))))
+    return int(attributes) + len(gdf) * (_GEOMETRY_OVERHEAD_BYTES + _SINDEX_BYTES) + coordinates * _COORDINATE_BYTES
+
+
+def layer_summary(gdf: gpd.GeoDataFrame) -> Dict[str, object]:
+    return {
+        "rows": len(gdf),
+        "columns": [column for column in gdf.columns if column != gdf.geometry.name],
+        "crs": gdf.crs.to_string() if gdf.crs is not None else None,
+    }
+
+
+class DatasetRegistry:
+    """LRU map of dataset id to a loaded GeoDataFrame (with a built spatial index)."""
+
+    def __init__(self, memory_budget: int, loader: Optional[Callable[[str], Optional[gpd.GeoDataFrame]]] = None):
+        self.memory_budget = memory_budget
+        self.loader = loader
+        self.evictions = 0
+        self._layers: "OrderedDict[Tuple[str, Optional[str]], Tuple[gpd.GeoDataFrame, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, dataset_id: str, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        return self._put((dataset_id, None), gdf)
+
+    def _put(self, key: Tuple[str, Optional[str]], gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        # Build the spatial index once, outside the lock; select_points queries it instead of
+        # extracting the whole layer's coordinates
+        gdf.sindex
+        size = estimate_layer_bytes(gdf)
+        with self._lock:
+            self._layers[key] = (gdf, size)
+            self._layers.move_to_end(key)
+            self._evict(keep=key)
+        return gdf
+
+    def _evict(self, keep: Tuple[str, Optional[str]]) -> None:
+        total = sum(size for _, size in self._layers.values())
+        for key in list(self._layers):
+            if total <= self.memory_budget:
+                break
+            if key == keep:
+                continue
+            total -= self._layers.pop(key)[1]
+            self.evictions += 1
+
+    def get(self, dataset_id: str, crs=None) -> Optional[gpd.GeoDataFrame]:
+        """Return the dataset, reprojected to ``crs`` if given, or None if unknown.
+
+        Reprojected copies are kept in the registry as well, so repeated queries
+        against a layer in another CRS reproject it only once.
+        """
+        with self._lock:
+            if (dataset_id, None) in self._layers:
+                self._layers.move_to_end((dataset_id, None))
+                gdf = self._layers[(dataset_id, None)][0]
+            else:
+                gdf = None
+        if gdf is None:
+            gdf = self.loader(dataset_id) if self.loader is not None else None
+            if gdf is None:
+                return None
+            self.add(dataset_id, gdf)
+
+        if crs is None or gdf.crs is None or gdf.crs == crs:
+            return gdf
+        key = (dataset_id, CRS.from_user_input(crs).to_wkt())
+        with self._lock:
+            if key in self._layers:
+                self._layers.move_to_end(key)
+                return self._layers[key][0]
+        return self._put(key, reproject_points(gdf, crs))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "datasets": len(self._layers),
+                "bytes": sum(size for _, size in self._layers.values()),
+                "memory_budget": self.memory_budget,
+                "evictions": self.evictions,
+            }
@@ -8,6 +8,18 @@ import os
 import sys
 from pathlib import Path
 
+def analyze_zip_members(file_list):
+    """Group ZIP member names by Shapefile component (shp, shx, dbf, prj, other) and list folder entries"""
+    analysis = {"shp": [], "shx": [], "dbf": [], "prj": [], "other": []}
+    for file_name in file_list:
+        extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+        if extension in ("shp", "shx", "dbf", "prj"):
+            analysis[extension].append(file_name)
+        else:
+            analysis["other"].append(file_name)
+    analysis["folders"] = [f for f in file_list if f.endswith('/') or '/' in f]
+    return analysis
+
 def diagnose_zip_file(zip_path):
     """Diagnose what's inside a ZIP file"""
     print(f"Analyzing ZIP file: {zip_path}")
@@ -23,25 +35,15 @@ def diagnose_zip_file(zip_path):
             print(f"📂 Total files in ZIP: {len(file_list)}")
             print("\n📋 File listing:")
             
-            shp_files = []
-            shx_files = []
-            dbf_files = []
-            prj_files = []
-            other_files = []
-            
             for file_name in file_list:
                 print(f"   • {file_name}")
-                
-                if file_name.lower().endswith('.shp'):
-                    shp_files.append(file_name)
-                elif file_name.lower().endswith('.shx'):
-                    shx_files.append(file_name)
-                elif file_name.lower().endswith('.dbf'):
-                    dbf_files.append(file_name)
-                elif file_name.lower().endswith('.prj'):
-                    prj_files.append(file_name)
-                else:
-                    other_files.append(file_name)
+
+            analysis = analyze_zip_members(file_list)
+            shp_files = analysis["shp"]
+            shx_files = analysis["shx"]
+            dbf_files = analysis["dbf"]
+            prj_files = analysis["prj"]
+            other_files = analysis["other"]
             
             print("\n🔍 Shapefile Component Analysis:")
             print(f"   🗺️  .shp files (geometry): {len(shp_files)}")
@@ -64,7 +66,7 @@ def diagnose_zip_file(zip_path):
                 print("   • .prj file (projection) - RECOMMENDED")
             
             # Check for folder structure issues
-            folders_in_zip = [f for f in file_list if f.endswith('/') or '/' in f]
+            folders_in_zip = analysis["folders"]
             if folders_in_zip:
                 print(f"\n⚠️  WARNING: ZIP contains folder structure:")
                 for folder in folders_in_zip[:5]:  # Show first 5
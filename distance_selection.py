@@ -0,0 +1,222 @@
+"""
+Distance selection: the points within a given number of metres of a target geometry.
+
+Distances are measured in a metric CRS, the UTM zone of the target
+(``GeoSeries.estimate_utm_crs``), whatever the CRSs of the layers. The target
+is transformed there once, with densified edges; the points of each chunk are
+transformed from their own CRS as coordinate arrays, so they are never
+reprojected to the polygons' CRS first.
+
+Nothing is buffered. For simple points:
+
+1. the coordinates are pruned to the target's bounds grown by the distance;
+2. for large chunks, a grid laid over those bounds settles most points at
+   once: a cell whose center is within ``distance - r`` of the target (``r``
+   its half-diagonal) holds only selected points, one whose center is farther
+   than ``distance + r`` holds none (the distance to a geometry changes no
+   faster than the point moves);
+3. of the rest, the points inside the target (distance 0) are found with the
+   prepared (or grid-tiled, see :mod:`polygon_tiles`) ``intersects`` test;
+4. the others are queried against an STRtree of the target's boundary split
+   into short pieces with ``predicate="dwithin"``: the tree prunes by the
+   pieces' envelopes and GEOS checks the exact distance to a few short pieces
+   only, instead of to the whole boundary.
+
+The result is identical to ``shapely.dwithin(target, points, distance)`` in
+the metric CRS. Multi-points and other geometries are transformed with
+``to_crs`` and selected with one ``sindex.query(target, predicate="dwithin")``.
+"""
+
+import time
+from typing import Dict, Optional
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS
+from shapely.geometry import base as shapely_base
+
+from parallel_selection import point_coordinates, predicate_mask_xy
+from point_selection import MIN_TILED_CANDIDATES
+from polygon_catalog import prepare_geometry
+from polygon_tiles import tiled_geometry
+from reprojection import get_transformer, reproject_geometry, reproject_points
+
+# Segments per boundary piece in the STRtree
+_PIECE_SEGMENTS = 32
+
+# Cells along the longer side of the distance grid
+_GRID_CELLS = 256
+
+# Cell classes of the distance grid
+NONE, ALL, MIXED = 0, 1, 2
+
+
+def metric_crs_for(geom: shapely_base.BaseGeometry, crs) -> CRS:
+    """The UTM CRS of the zone ``geom`` (in ``crs``) lies in, to measure distances in metres."""
+    return gpd.GeoSeries([geom], crs=crs).estimate_utm_crs()
+
+
+def boundary_pieces(geom: shapely_base.BaseGeometry, segments: int = _PIECE_SEGMENTS) -> np.ndarray:
+    """The boundary of ``geom`` (its lines and points, if not polygonal) as lines of at most ``segments`` segments."""
+    outline = shapely.boundary(geom) if shapely.get_dimensions(geom) == 2 else geom
+    pieces, counts, kept = [], [], []
+    for part in shapely.get_parts(shapely.get_parts(outline)):
+        if shapely.get_type_id(part) not in (1, 2):  # Points stay as they are
+            kept.append(part)
+            continue
+        coords = shapely.get_coordinates(part)
+        for start in range(0, len(coords) - 1, segments):
+            piece = coords[start:start + segments + 1]
+            pieces.append(piece)
+            counts.append(len(piece))
+    lines = (shapely.linestrings(np.concatenate(pieces), indices=np.repeat(np.arange(len(pieces)), counts))
+             if pieces else np.empty(0, dtype=object))
+    return np.concatenate([lines, np.array(kept, dtype=object)])
+
+
+class DistanceGrid:
+    """A grid over ``bounds`` whose cells are classified against ``distance`` from ``geom``.
+
+    Each cell is :data:`ALL` (every point of it is within the distance),
+    :data:`NONE` (no point is) or :data:`MIXED` (its points need the exact test).
+    """
+
+    def __init__(self, geom: shapely_base.BaseGeometry, distance: float, bounds):
+        minx, miny, maxx, maxy = bounds
+        # Square cells, _GRID_CELLS along the longer side: the finer the cells, the fewer MIXED points
+        side = max(maxx - minx, maxy - miny) / _GRID_CELLS
+        self.shape = tuple(int(np.clip(np.ceil(span / side), 1, _GRID_CELLS)) if side > 0 else 1
+                           for span in (maxx - minx, maxy - miny))
+        self.origin = (minx, miny)
+        # A flat extent (a straight line at distance 0) still gets cells of some size
+        self.size = tuple(span / cells or 1.0 for span, cells in zip((maxx - minx, maxy - miny), self.shape))
+
+        ix, iy = np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]), indexing="ij")
+        cell_minx, cell_miny = minx + ix.ravel() * self.size[0], miny + iy.ravel() * self.size[1]
+        centers = shapely.points(cell_minx + self.size[0] / 2, cell_miny + self.size[1] / 2)
+        half_diagonal = np.hypot(*self.size) / 2
+        # Covers rounding in the point-to-cell lookup and in GEOS's distances
+        tolerance = 1e-9 * max(abs(minx), abs(miny), abs(maxx), abs(maxy), 1.0)
+
+        shapely.prepare(geom)
+        classes = np.full(len(centers), MIXED, dtype=np.uint8)
+        classes[~shapely.dwithin(geom, centers, distance + half_diagonal + tolerance)] = NONE
+        mixed = np.flatnonzero(classes == MIXED)
+        if distance - half_diagonal - tolerance > 0:
+            near = shapely.dwithin(geom, centers[mixed], distance - half_diagonal - tolerance)
+            classes[mixed[near]] = ALL
+            mixed = mixed[~near]
+        # Cells wholly in the target are at distance 0
+        boxes = shapely.box(cell_minx[mixed], cell_miny[mixed],
+                            cell_minx[mixed] + self.size[0], cell_miny[mixed] + self.size[1])
+        classes[mixed[shapely.contains_properly(geom, boxes)]] = ALL
+        self.classes = classes.reshape(self.shape)
+
+    def classify_xy(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """The class of the cell of each point, which must lie within the grid's bounds."""
+        ix = np.clip(np.floor((x - self.origin[0]) / self.size[0]).astype(np.intp), 0, self.shape[0] - 1)
+        iy = np.clip(np.floor((y - self.origin[1]) / self.size[1]).astype(np.intp), 0, self.shape[1] - 1)
+        return self.classes[ix, iy]
+
+
+class DistanceSelector:
+    """Selects the points within ``distance`` metres of ``geom`` (given in ``crs``).
+
+    Build it once per target; :meth:`select` then takes point chunks in any CRS.
+    """
+
+    def __init__(self, geom: shapely_base.BaseGeometry, crs, distance: float, metric_crs=None):
+        if crs is None:
+            raise ValueError("Polygon layer CRS is missing. Please define it before running.")
+        if not distance >= 0:
+            raise ValueError("The distance must be a number of metres, zero or more.")
+        self.distance = float(distance)
+        self.metric_crs = CRS.from_user_input(metric_crs) if metric_crs is not None else metric_crs_for(geom, crs)
+        self.geom = prepare_geometry(reproject_geometry(geom, crs, self.metric_crs))
+        self.pieces = boundary_pieces(self.geom)
+        self.tree = shapely.STRtree(self.pieces)
+        self._grid = None
+
+    @property
+    def grid(self) -> "DistanceGrid":
+        """The :class:`DistanceGrid` over :attr:`extent`, built on first use."""
+        if self._grid is None:
+            self._grid = DistanceGrid(self.geom, self.distance, self.extent.bounds)
+        return self._grid
+
+    @property
+    def extent(self) -> shapely_base.BaseGeometry:
+        """The target's bounds grown by the distance (in :attr:`metric_crs`): no selected point lies outside."""
+        minx, miny, maxx, maxy = self.geom.bounds
+        return shapely.box(minx - self.distance, miny - self.distance, maxx + self.distance, maxy + self.distance)
+
+    def select(self, points: gpd.GeoDataFrame, stats: Optional[Dict[str, float]] = None) -> gpd.GeoDataFrame:
+        """The rows of ``points`` within the distance of the target, in their original order.
+
+        ``stats`` is filled like :func:`point_selection.select_points` does
+        (``index_seconds`` is the time spent moving the points to the metric CRS).
+        """
+        if points.crs is None:
+            raise ValueError("Point layer CRS is missing. Please define it before running.")
+        start = time.perf_counter()
+        coords = point_coordinates(np.asarray(points.geometry.array))
+        if coords is not None:
+            x, y = get_transformer(points.crs, self.metric_crs).transform(coords[:, 0], coords[:, 1])
+            x, y = np.asarray(x), np.asarray(y)
+        else:
+            geometries = np.asarray(reproject_points(points, self.metric_crs).geometry.array)
+        transform_done = time.perf_counter()
+
+        if coords is not None:
+            minx, miny, maxx, maxy = self.extent.bounds
+            candidate_positions = np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+        else:
+            candidate_positions = np.sort(shapely.STRtree(geometries).query(self.extent))
+        bbox_done = time.perf_counter()
+
+        if coords is not None:
+            candidate_x, candidate_y = x[candidate_positions], y[candidate_positions]
+            if len(candidate_positions) >= MIN_TILED_CANDIDATES:
+                classes = self.grid.classify_xy(candidate_x, candidate_y)
+                mixed = np.flatnonzero(classes == MIXED)
+                selected = classes == ALL
+                selected[self._select_xy(candidate_x[mixed], candidate_y[mixed], mixed)] = True
+                selected_positions = candidate_positions[selected]
+            else:
+                selected_positions = self._select_xy(candidate_x, candidate_y, candidate_positions)
+        else:
+            candidates = geometries[candidate_positions]
+            hits = shapely.STRtree(candidates).query(self.geom, predicate="dwithin", distance=self.distance)
+            selected_positions = candidate_positions[np.sort(hits)]
+        exact_done = time.perf_counter()
+
+        if stats is not None:
+            stats.update(
+                total=len(points),
+                candidates=len(candidate_positions),
+                selected=len(selected_positions),
+                index_seconds=transform_done - start,
+                bbox_seconds=bbox_done - transform_done,
+                exact_seconds=exact_done - bbox_done,
+            )
+        return points.iloc[selected_positions]
+
+    def _select_xy(self, x: np.ndarray, y: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        # Inside (or on) the target: distance 0
+        minx, miny, maxx, maxy = self.geom.bounds
+        inside = np.zeros(len(x), dtype=bool)
+        in_bounds = np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+        tiles = tiled_geometry(self.geom, len(in_bounds)) if len(in_bounds) >= MIN_TILED_CANDIDATES else None
+        if tiles is not None:
+            inside[in_bounds] = tiles.mask_xy(x[in_bounds], y[in_bounds], "intersects")
+        else:
+            inside[in_bounds] = predicate_mask_xy(x[in_bounds], y[in_bounds], self.geom, "intersects")
+
+        # Outside: near enough to a piece of the boundary
+        outside = np.flatnonzero(~inside)
+        point_idx, _ = self.tree.query(shapely.points(x[outside], y[outside]), predicate="dwithin",
+                                       distance=self.distance)
+        near = np.zeros(len(x), dtype=bool)
+        near[outside[point_idx]] = True
+        return positions[inside | near]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 """
-Extract all point features that fall inside a polygon selected by name and export them to CSV.
+Extract all point features that fall inside a polygon selected by name and export them to CSV
+(or Parquet, Feather, GeoPackage or GeoJSON Sequence with --output-format).
 
 Usage example (PowerShell on Windows):
 
@@ -11,25 +12,100 @@ Usage example (PowerShell on Windows):
     --name-value "bankura" \
     --output "C:\\data\\bankura_points.csv"
 
+Batch mode writes one file per name into the --output directory, reading both
+layers only once:
+
+  python extract_points_in_polygon.py \
+    --points "C:\\data\\points.shp" \
+    --polygons "C:\\data\\districts.shp" \
+    --name-column "NAME" \
+    --all-names \
+    --output "C:\\data\\district_points"
+
+Join mode tags every point with the name of the polygon it falls in, using
+one bulk spatial-index query over all polygons (one output file):
+
+  python extract_points_in_polygon.py \
+    --points "C:\\data\\points.shp" \
+    --polygons "C:\\data\\districts.shp" \
+    --name-column "NAME" \
+    --join --ties first --unmatched keep \
+    --output "C:\\data\\points_with_district.csv"
+
+When the layers are in different CRSs the points are reprojected to the
+polygons' CRS. --reproject polygons moves the (few) polygons into the points'
+CRS instead. Output geometry (--geometry, gpkg, geojsonseq) is always in the
+polygon layer's CRS.
+
+Keep the coordinates and write typed, compressed Parquet instead of CSV:
+
+  python extract_points_in_polygon.py ... --output-format parquet --geometry xy \
+    --output "C:\\data\\bankura_points.parquet"
+
+For a large point layer that changes rarely, convert it once into a
+memory-mapped points store and pass the store directory as --points; each
+extraction then loads only the pages around the target polygon instead of
+parsing the whole layer:
+
+  python extract_points_in_polygon.py index \
+    --points "C:\\data\\points.gpkg" \
+    --output "C:\\data\\points_store"
+
+  python extract_points_in_polygon.py \
+    --points "C:\\data\\points_store" ...
+
+For a points layer that only gains rows (e.g. a nightly run), --incremental
+reads only the features added since the last run and appends the selected
+ones to the output. The last processed feature id and the run's settings are
+kept in <output>.state.json; if the polygons, name, predicate, CRS or output
+settings change, or the output was touched, the output is rebuilt in full:
+
+  python extract_points_in_polygon.py ... --name-value "bankura" \
+    --output "C:\\data\\bankura_points.csv" --incremental
+
+--distance selects the points within that many metres of the named polygon
+(measured in its UTM zone, so it works on WGS84 layers too) instead of those
+inside it:
+
+  python extract_points_in_polygon.py ... --name-value "bankura" --distance 5000 \
+    --output "C:\\data\\bankura_5km_points.csv"
+
+--profile writes the wall time, rows in/out and memory of every stage (read,
+reprojection, union, selection, write) to stderr as JSON lines, followed by a
+per-stage summary; --cprofile FILE dumps cProfile stats for the whole run.
+
 Supported vector formats: any that GeoPandas/Fiona can read (e.g., Shapefile, GeoPackage, GeoJSON, etc.).
 """
 
 import argparse
+import math
+import os
 import sys
-from typing import List
+from typing import List, Optional
 
-import geopandas as gpd
-from shapely.geometry import base as shapely_base
+# Only light modules at import time: --help and argument errors must not wait
+# for geopandas/shapely/pyproj, which the functions below import when they run.
+from pipeline_options import (
+    GEOMETRY_MODES,
+    JOIN_TIE_POLICIES,
+    JOIN_UNMATCHED_POLICIES,
+    OUTPUT_EXTENSIONS,
+    OUTPUT_FORMATS,
+    REPROJECT_MODES,
+    SUPPORTED_PREDICATES,
+    check_output_format,
+    parse_columns,
+)
 
 
 def parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Export points that fall inside a named polygon to CSV."
+        description="Export points that fall inside a named polygon to CSV, Parquet, Feather, GeoPackage or GeoJSON Sequence."
     )
     parser.add_argument(
         "--points",
         required=True,
-        help="Path to the point layer (e.g., .shp, .gpkg, .geojson)",
+        help="Path to the point layer (e.g., .shp, .gpkg, .geojson) or to a store built with 'index'",
     )
     parser.add_argument(
         "--points-layer",
@@ -53,102 +129,540 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         required=True,
         help="Attribute/field name in the polygon layer that contains the names (e.g., NAME)",
     )
-    parser.add_argument(
+    names_group = parser.add_mutually_exclusive_group(required=True)
+    names_group.add_argument(
         "--name-value",
-        required=True,
         help="Name to match in the polygon layer (e.g., bankura)",
     )
+    names_group.add_argument(
+        "--name-values-file",
+        help="Batch mode: text file with one name per line; one CSV is written per name",
+    )
+    names_group.add_argument(
+        "--all-names",
+        action="store_true",
+        help="Batch mode: write one CSV for every distinct name in --name-column",
+    )
+    names_group.add_argument(
+        "--join",
+        action="store_true",
+        help="Join mode: write every point with the --name-column value of the polygon it falls in",
+    )
+    parser.add_argument(
+        "--columns",
+        type=parse_columns,
+        default=None,
+        metavar="NAME[,NAME...]",
+        help="Optional: comma-separated point attributes to keep (default: all); the others are never "
+             "read from the layer",
+    )
+    parser.add_argument(
+        "--polygon-columns",
+        type=parse_columns,
+        default=None,
+        metavar="NAME[,NAME...]",
+        help="Join mode: comma-separated polygon attributes to add to each point besides --name-column "
+             "(only --name-column and these are read from the polygon layer)",
+    )
     parser.add_argument(
         "--output",
         required=True,
-        help="Path to the output CSV file",
+        help="Path to the output file (batch mode: output directory)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output file format (default: csv; parquet and feather need pyarrow)",
+    )
+    parser.add_argument(
+        "--geometry",
+        choices=GEOMETRY_MODES,
+        default="none",
+        help="Keep the point geometry in csv/parquet/feather output as WKB or x/y columns "
+             "(default: none; gpkg and geojsonseq always keep it)",
     )
     parser.add_argument(
         "--predicate",
-        choices=["within", "intersects"],
+        choices=SUPPORTED_PREDICATES,
         default="within",
         help="Spatial predicate to use for selection (default: within)",
     )
+    parser.add_argument(
+        "--distance",
+        type=float,
+        default=None,
+        metavar="METRES",
+        help="With --name-value: select the points within this many metres of the named polygon(s) instead "
+             "of using --predicate (measured in the polygon's UTM zone, whatever the layers' CRSs)",
+    )
+    parser.add_argument(
+        "--reproject",
+        choices=REPROJECT_MODES,
+        default="points",
+        help="When the CRSs differ, reproject the points to the polygons' CRS (default) or the polygons "
+             "to the points' CRS (much faster for large point layers; results may differ for points "
+             "within millimetres of a boundary)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Optional: read and process the point layer in chunks of this many rows to bound memory use",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Optional: with --name-value, number of worker processes for the point-in-polygon test "
+             "(default: 1, no pool; not used by --join, batch mode or --distance)",
+    )
+    parser.add_argument(
+        "--ties",
+        choices=JOIN_TIE_POLICIES,
+        default="first",
+        help="Join mode: for points in several polygons keep the first polygon in layer order, "
+             "or write the point once per polygon (default: first)",
+    )
+    parser.add_argument(
+        "--unmatched",
+        choices=JOIN_UNMATCHED_POLICIES,
+        default="drop",
+        help="Join mode: drop points that fall in no polygon, or keep them with an empty name (default: drop)",
+    )
     parser.add_argument(
         "--case-sensitive",
         action="store_true",
         help="Make the name match case-sensitive (default: case-insensitive)",
     )
-    return parser.parse_args(argv)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="With --name-value: only process points added since the last --incremental run and append "
+             "them to --output (state kept in <output>.state.json; falls back to a full rebuild when "
+             "the settings or inputs changed)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Log per-stage timings, row counts and memory to stderr as JSON lines",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Optional: write cProfile stats of the run to FILE (view with snakeviz or pstats)",
+    )
+    args = parser.parse_args(argv)
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        parser.error("--chunk-size must be a positive number of rows")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.workers > 1 and (args.join or args.name_value is None):
+        parser.error("--workers works with --name-value only (--join and batch mode run in one process)")
+    if args.workers > 1 and args.distance is not None:
+        parser.error("--workers does not apply to --distance (the distance test runs in one process)")
+    if args.incremental and args.name_value is None:
+        parser.error("--incremental works with --name-value only")
+    if args.polygon_columns and not args.join:
+        parser.error("--polygon-columns works with --join only")
+    if args.distance is not None and args.name_value is None:
+        parser.error("--distance works with --name-value only")
+    if args.distance is not None and not (math.isfinite(args.distance) and args.distance >= 0):
+        parser.error("--distance must be a number of metres, zero or more")
+    try:
+        check_output_format(args.output_format, args.geometry)
+    except ValueError as exc:
+        parser.error(str(exc))
+    return args
+
+
+def parse_index_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="extract_points_in_polygon.py index",
+        description="Convert a point layer into a memory-mapped points store that --points can read directly.",
+    )
+    parser.add_argument(
+        "--points",
+        required=True,
+        help="Path to the point layer (e.g., .shp, .gpkg, .geojson)",
+    )
+    parser.add_argument(
+        "--points-layer",
+        required=False,
+        default=None,
+        help="Optional: layer name inside a multi-layer file (e.g., GeoPackage) for points",
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Store directory to create (an existing store there is replaced)",
+    )
+    parser.add_argument(
+        "--page-rows",
+        type=int,
+        default=65536,
+        help="Points per page; a query loads every page that overlaps the target's bounds (default: 65536)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=500000,
+        help="Rows read from the point layer at a time while building (default: 500000)",
+    )
+    args = parser.parse_args(argv)
+    if args.page_rows <= 0:
+        parser.error("--page-rows must be a positive number of rows")
+    if args.chunk_size <= 0:
+        parser.error("--chunk-size must be a positive number of rows")
+    return args
+
+
+def build_index(argv: List[str]) -> int:
+    args = parse_index_args(argv)
 
+    import time
 
-def ensure_crs_compatible(points: gpd.GeoDataFrame, polygons: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    if polygons.crs is None and points.crs is None:
-        raise ValueError("Both layers are missing CRS. Please define CRS for your data.")
-    if polygons.crs is None:
-        raise ValueError("Polygon layer CRS is missing. Please define it before running.")
-    if points.crs is None:
-        raise ValueError("Point layer CRS is missing. Please define it before running.")
-    if points.crs != polygons.crs:
-        points = points.to_crs(polygons.crs)
-    return points
+    from points_store import build_store
+
+    print(f"Indexing point layer {args.points} into {args.output}...")
+    start = time.perf_counter()
+    try:
+        manifest = build_store(args.points, args.output, args.points_layer, args.page_rows, args.chunk_size)
+    except (ImportError, ValueError) as exc:
+        print(f"Cannot build the points store: {exc}")
+        return 2
+    print(f"Stored {manifest['rows']} points in {manifest['pages']} pages of {manifest['page_rows']} "
+          f"[{time.perf_counter() - start:.1f}s]")
+    print("Done.")
+    return 0
 
 
-def filter_polygons_by_name(polygons: gpd.GeoDataFrame, name_column: str, name_value: str, case_sensitive: bool) -> gpd.GeoDataFrame:
-    if name_column not in polygons.columns:
-        raise KeyError(
-            f"Column '{name_column}' not found in polygons. Available columns: {list(polygons.columns)}"
-        )
-    if case_sensitive:
-        mask = polygons[name_column] == name_value
+def read_name_values(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as fh:
+        names = [line.strip() for line in fh]
+    # Drop blanks and duplicates but keep the file order
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def build_name_unions(polygons, name_column: str, name_values: Optional[List[str]], case_sensitive: bool):
+    """Union the polygons of each requested name into one row per name (a GeoDataFrame).
+
+    Names are matched exactly like :func:`extraction.filter_polygons_by_name`.
+    With ``name_values=None`` every distinct name in ``name_column`` is used,
+    labelled by its first spelling in the layer. Requested names without a
+    match are left out of the result.
+    """
+    import geopandas as gpd
+
+    from polygon_catalog import PolygonCatalog, name_key
+
+    catalog = PolygonCatalog(polygons, name_column)
+    if name_values is None:
+        labels = catalog.labels(case_sensitive)
     else:
-        mask = polygons[name_column].astype(str).str.lower() == str(name_value).lower()
-    return polygons[mask]
+        labels = {}
+        for name_value in name_values:
+            labels.setdefault(name_key(name_value, case_sensitive), name_value)
 
+    rows = []
+    for label in labels.values():
+        if len(catalog.positions(label, case_sensitive)) == 0:
+            continue
+        rows.append({"name": label, "geometry": catalog.union(label, case_sensitive)})
+    return gpd.GeoDataFrame(rows, columns=["name", "geometry"], geometry="geometry", crs=polygons.crs)
 
-def build_union_geometry(polygons: gpd.GeoDataFrame) -> shapely_base.BaseGeometry:
-    if polygons.empty:
-        raise ValueError("No polygons matched the given name.")
-    # unary_union returns a single (possibly multi-) geometry
-    return polygons.unary_union
 
+def safe_output_name(name_value) -> str:
+    return "".join(c for c in str(name_value) if c.isalnum() or c in (" ", "-", "_")).rstrip()
+
+
+def _batch_output_paths(output_dir: str, name_values, extension: str = ".csv") -> List[str]:
+    paths = []
+    used_names = set()
+    for name_value in name_values:
+        base_name = safe_output_name(name_value) or "unnamed"
+        file_name = f"{base_name}_points{extension}"
+        suffix = 2
+        while file_name.lower() in used_names:
+            file_name = f"{base_name}_{suffix}_points{extension}"
+            suffix += 1
+        used_names.add(file_name.lower())
+        paths.append(os.path.join(output_dir, file_name))
+    return paths
+
+
+def open_points(args: argparse.Namespace, chunk_size: Optional[int] = None, fid_range=None):
+    """A point source for --points: a points store directory or a vector file (optionally an id range of it)."""
+    from extraction import file_point_source
+    from points_store import PointsStore, StorePointSource, is_points_store
+
+    if is_points_store(args.points):
+        return StorePointSource(PointsStore(args.points), chunk_size, args.columns)
+    return file_point_source(args.points, args.points_layer, chunk_size, fid_range, args.columns)
+
+
+def point_source(args: argparse.Namespace, fid_range=None):
+    from chunked_io import check_layer_columns
+    from points_store import StorePointSource
+
+    source = open_points(args, args.chunk_size, fid_range)
+    if not isinstance(source, StorePointSource):
+        check_layer_columns(source.read_file, args.columns, "the point layer")
+    if isinstance(source, StorePointSource):
+        store = source.store
+        print(f"Reading points from the store built {store.manifest['created']} ({len(store)} points)...")
+        if store.is_stale():
+            print(f"Warning: {store.manifest['source']['path']} changed since the store was built; "
+                  "re-run 'index' to pick up the changes.")
+    elif args.chunk_size:
+        print(f"Reading points in chunks of {args.chunk_size} rows...")
+    else:
+        print("Reading point layer...")
+    return source
+
+
+def polygons_in_points_crs(args: argparse.Namespace, polygons):
+    """The polygon layer moved into the points' CRS (unchanged if either CRS is unknown)."""
+    from reprojection import reproject_polygons
+
+    points_crs = open_points(args).crs
+    if polygons.crs is None or points_crs is None or polygons.crs == points_crs:
+        return polygons
+    print(f"Reprojecting {len(polygons)} polygons to the points CRS ({points_crs.to_string()})...")
+    return reproject_polygons(polygons, points_crs)
 
-def select_points(points: gpd.GeoDataFrame, geom: shapely_base.BaseGeometry, predicate: str) -> gpd.GeoDataFrame:
-    if predicate == "within":
-        mask = points.within(geom)
-    elif predicate == "intersects":
-        mask = points.intersects(geom)
+
+def incremental_settings(args: argparse.Namespace, union_geom, polygons_crs, points_crs):
+    """Everything an incremental output depends on; a change in any of them forces a full rebuild."""
+    from incremental import geometry_digest
+
+    return {
+        "points": os.path.abspath(args.points),
+        "points_layer": args.points_layer,
+        "polygons": os.path.abspath(args.polygons),
+        "polygons_layer": args.polygons_layer,
+        "name_column": args.name_column,
+        "name_value": args.name_value,
+        "case_sensitive": args.case_sensitive,
+        "columns": args.columns,
+        "target_geometry": geometry_digest(union_geom),
+        "predicate": args.predicate,
+        "distance": args.distance,
+        "reproject": args.reproject,
+        "output_format": args.output_format,
+        "geometry": args.geometry,
+        "points_crs": points_crs.to_wkt() if points_crs is not None else None,
+        "polygons_crs": polygons_crs.to_wkt() if polygons_crs is not None else None,
+    }
+
+
+def run_batch(args: argparse.Namespace, polygons, output_crs=None, profile=None) -> int:
+    import shapely
+
+    from extraction import aligned_chunks
+    from instrumentation import Profile
+    from output_writers import PointsWriter
+    from point_selection import merge_stats, select_points_by_geometries
+
+    profile = profile or Profile()
+    name_values = read_name_values(args.name_values_file) if args.name_values_file else None
+    if name_values is not None:
+        print(f"Batch mode: {len(name_values)} names from {args.name_values_file}")
     else:
-        raise ValueError(f"Unsupported predicate: {predicate}")
-    return points[mask]
+        print(f"Batch mode: all distinct values of {args.name_column}")
+
+    with profile.stage("union", rows_in=len(polygons)) as stage:
+        unions = build_name_unions(polygons, args.name_column, name_values, args.case_sensitive)
+        stage.rows_out = len(unions)
+    if name_values is not None and len(unions) < len(name_values):
+        print(f"Warning: {len(name_values) - len(unions)} name(s) matched no polygon and will be skipped.")
+    if unions.empty:
+        print("No polygon matched the given names. Exiting.")
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    output_paths = _batch_output_paths(args.output, unions["name"], OUTPUT_EXTENSIONS[args.output_format])
+    writers = [PointsWriter(output_path, args.output_format, args.geometry, crs=output_crs) for output_path in output_paths]
+
+    print(f"Joining points against {len(unions)} polygon(s) using '{args.predicate}'...")
+    total_stats = {}
+    try:
+        extent = shapely.box(*unions.total_bounds)
+        for points in aligned_chunks(point_source(args), extent, polygons.crs, polygons.crs, profile):
+            join_stats = {}
+            with profile.stage("join", rows_in=len(points)) as stage:
+                positions_per_name = select_points_by_geometries(points, unions.geometry, args.predicate, stats=join_stats)
+                stage.rows_out = int(join_stats["matches"])
+            merge_stats(total_stats, join_stats)
+            with profile.stage("write", rows_in=int(join_stats["matches"])):
+                for writer, positions in zip(writers, positions_per_name):
+                    writer.write(points.iloc[positions])
+        with profile.stage("write"):
+            for writer in writers:
+                writer.flush()
+    finally:
+        for writer in writers:
+            writer.close()
+    print(f"Join: {total_stats['total']} points x {len(unions)} polygons -> {total_stats['matches']} matches "
+          f"[index {total_stats['index_seconds']:.3f}s, join {total_stats['join_seconds']:.3f}s]")
+    print(f"Wrote {len(unions)} {args.output_format} files to: {args.output}")
+
+    print("Done.")
+    return 0
+
+
+def run_join(args: argparse.Namespace, polygons, output_crs=None, profile=None) -> int:
+    import shapely
+
+    from extraction import aligned_chunks
+    from instrumentation import Profile
+    from output_writers import PointsWriter
+    from point_selection import merge_stats, tag_points_with_names
+    from polygon_catalog import check_name_column
+
+    profile = profile or Profile()
+    check_name_column(polygons, args.name_column)
+    polygon_columns = [column for column in args.polygon_columns or [] if column != args.name_column]
+    if polygons.empty:
+        print("The polygon layer is empty. Exiting.")
+        return 2
+
+    # Unmatched points are only needed when they are kept
+    read_extent = shapely.box(*polygons.total_bounds) if args.unmatched == "drop" else None
+    print(f"Tagging points with the {args.name_column} of the polygon they {args.predicate} "
+          f"(ties: {args.ties}, unmatched: {args.unmatched})...")
+    total_stats = {}
+    rows_written = 0
+    with PointsWriter(args.output, args.output_format, args.geometry, crs=output_crs) as writer:
+        for points in aligned_chunks(point_source(args), read_extent, polygons.crs, polygons.crs, profile):
+            # Don't overwrite a points column of the same name
+            fields = {column: column if column not in points.columns else f"polygon_{column}"
+                      for column in [args.name_column] + polygon_columns}
+            name_field = fields.pop(args.name_column)
+            join_stats = {}
+            with profile.stage("join", rows_in=len(points)) as stage:
+                tagged = tag_points_with_names(points, polygons, args.name_column, args.predicate,
+                                               ties=args.ties, unmatched=args.unmatched,
+                                               name_field=name_field, stats=join_stats, extra_fields=fields)
+                stage.rows_out = len(tagged)
+            merge_stats(total_stats, join_stats)
+            with profile.stage("write", rows_in=len(tagged)):
+                writer.write(tagged)
+            rows_written += len(tagged)
+        with profile.stage("write"):
+            writer.flush()
+    print(f"Join: {total_stats['total']} points x {len(polygons)} polygons -> {total_stats['matched_points']} points matched "
+          f"({total_stats['tied_points']} in several polygons, {total_stats['total'] - total_stats['matched_points']} in none) "
+          f"[index {total_stats['index_seconds']:.3f}s, join {total_stats['join_seconds']:.3f}s]")
+    print(f"Wrote {rows_written} records to {args.output_format}: {args.output}")
+
+    print("Done.")
+    return 0
 
 
 def main(argv: List[str]) -> int:
+    if argv[:1] == ["index"]:
+        return build_index(argv[1:])
     args = parse_args(argv)
 
-    print("Reading layers...")
-    read_points_kwargs = {"layer": args.points_layer} if args.points_layer else {}
-    read_polygons_kwargs = {"layer": args.polygons_layer} if args.polygons_layer else {}
-    points = gpd.read_file(args.points, **read_points_kwargs)
-    polygons = gpd.read_file(args.polygons, **read_polygons_kwargs)
+    from instrumentation import Profile, cprofile_to, json_log
 
-    print("Checking and aligning CRS...")
-    points = ensure_crs_compatible(points, polygons)
+    profile = Profile(log=json_log() if args.profile else None)
+    with cprofile_to(args.cprofile):
+        status = extract(args, profile)
+    if args.profile:
+        profile.log(profile.summary())
+    return status
 
-    print(f"Filtering polygons where {args.name_column} == '{args.name_value}' (case {'sensitive' if args.case_sensitive else 'insensitive'})...")
-    matched_polygons = filter_polygons_by_name(
-        polygons, args.name_column, args.name_value, args.case_sensitive
-    )
 
-    if matched_polygons.empty:
+def extract(args: argparse.Namespace, profile) -> int:
+    from chunked_io import MissingColumnsError
+
+    try:
+        return run_extract(args, profile)
+    except MissingColumnsError as exc:
+        print(f"{exc}. Exiting.")
+        return 2
+
+
+def run_extract(args: argparse.Namespace, profile) -> int:
+    from chunked_io import check_layer_columns, layer_reader
+    from extraction import NoPolygonMatchError, extract_points, union_for_name
+    from output_writers import PointsWriter
+    from parallel_selection import ParallelPredicatePool
+    from point_selection import format_selection_stats
+    from polygon_catalog import PolygonCatalog
+
+    # Only the name (and, in join mode, the requested attributes) of each polygon is needed
+    polygon_columns = list(dict.fromkeys([args.name_column] + (args.polygon_columns or [])))
+    print(f"Reading polygon layer (columns: {', '.join(polygon_columns)})...")
+    read_polygons = layer_reader(args.polygons, args.polygons_layer, polygon_columns)
+    with profile.stage("read_polygons") as stage:
+        check_layer_columns(read_polygons, polygon_columns, "polygons")
+        polygons = read_polygons()
+        stage.rows_out = len(polygons)
+    # Output geometry stays in the polygon layer's CRS in either reprojection mode
+    output_crs = polygons.crs
+
+    if args.join or args.name_value is None:
+        if args.reproject == "polygons":
+            with profile.stage("reproject_polygons", rows_in=len(polygons)) as stage:
+                polygons = polygons_in_points_crs(args, polygons)
+                stage.rows_out = len(polygons)
+        if args.join:
+            return run_join(args, polygons, output_crs, profile)
+        return run_batch(args, polygons, output_crs, profile)
+
+    print(f"Filtering polygons where {args.name_column} == '{args.name_value}' (case {'sensitive' if args.case_sensitive else 'insensitive'})...")
+    try:
+        _, union_geom = union_for_name(PolygonCatalog(polygons, args.name_column), args.name_value,
+                                       args.case_sensitive, profile)
+    except NoPolygonMatchError:
         print("No polygon matched the given name. Exiting.")
         return 2
 
-    union_geom = build_union_geometry(matched_polygons)
+    plan = None
+    if args.incremental:
+        from chunked_io import read_fids
+        from incremental import plan_run, state_path
+        from points_store import is_points_store
 
-    print(f"Selecting points that {args.predicate} the target polygon geometry...")
-    selected_points = select_points(points, union_geom, args.predicate)
+        if is_points_store(args.points):
+            print("--incremental needs the point layer itself, not a points store. Exiting.")
+            return 2
+        points = open_points(args)
+        settings = incremental_settings(args, union_geom, polygons.crs, points.crs)
+        with profile.stage("list_point_ids") as stage:
+            fids = read_fids(points.read_file)
+            stage.rows_out = len(fids)
+        plan = plan_run(state_path(args.output), settings, args.output, fids)
+        print(plan.describe())
 
-    # Prepare output DataFrame without geometry
-    print(f"Writing {len(selected_points)} records to CSV: {args.output}")
-    df_out = selected_points.drop(columns=["geometry"], errors="ignore")
-    # Ensure index not written
-    df_out.to_csv(args.output, index=False, encoding="utf-8")
+    if args.distance is not None:
+        print(f"Selecting points within {args.distance:g} m of the target polygon geometry...")
+    else:
+        print(f"Selecting points that {args.predicate} the target polygon geometry...")
+    pool = ParallelPredicatePool(args.workers) if args.workers > 1 else None
+    try:
+        with PointsWriter(args.output, args.output_format, args.geometry, crs=output_crs,
+                          append=plan is not None and not plan.full) as writer:
+            source = point_source(args, plan.fid_range if plan is not None else None)
+            total_stats = extract_points(source, union_geom, polygons.crs, writer, args.predicate,
+                                         reproject=args.reproject, pool=pool, profile=profile,
+                                         distance=args.distance)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(format_selection_stats(total_stats))
+    if plan is not None:
+        from incremental import save_state
+
+        save_state(state_path(args.output), settings, plan, args.output)
+        print(f"Incremental: {plan.skipped_rows} rows skipped, {plan.new_rows} rows processed, "
+              f"{int(total_stats['selected'])} records {'written' if plan.full else 'appended'} to "
+              f"{args.output_format}: {args.output}")
+    else:
+        print(f"Wrote {int(total_stats['selected'])} records to {args.output_format}: {args.output}")
 
     print("Done.")
     return 0
@@ -156,4 +670,3 @@ def main(argv: List[str]) -> int:
 
 if __name__ == "__main__":
     sys.exit(main(sys.argv[1:]))
-
@@ -0,0 +1,279 @@
+"""
+Extraction engine shared by the CLI and the web app.
+
+One pipeline: match the polygons by name, union them, stream the points
+through the spatial predicate and hand the selected rows to a writer. It has
+three extension points:
+
+- Readers: a :class:`PointSource` knows the points' CRS and yields them in
+  chunks restricted to a bounding box. :class:`ReaderPointSource` wraps any
+  ``read_file(**kwargs)`` callable (``gpd.read_file``, the web app's upload
+  reader); ``layer_cache.CachedPointSource`` serves the web app's cached
+  GeoParquet copies, including reprojected ones.
+- Predicates: selection strategies registered by name with
+  :func:`register_predicate`; ``within`` and ``intersects`` use
+  :func:`point_selection.select_points`. With a ``distance`` the points
+  within that many metres of the target are selected instead
+  (:class:`distance_selection.DistanceSelector`).
+- Writers: anything with ``write(points)`` and ``flush()``, such as
+  :class:`output_writers.PointsWriter`.
+
+Stages are recorded in an optional :class:`instrumentation.Profile` and
+reported through an optional ``progress(stage, **counters)`` callback (the web
+app passes ``Job.update``).
+"""
+
+import functools
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import geopandas as gpd
+from pyproj import CRS
+from shapely.geometry import base as shapely_base
+
+from chunked_io import BBox, FidRange, iter_chunks, layer_reader, make_rows_reader, points_read_bbox, read_layer_crs
+from distance_selection import DistanceSelector
+from instrumentation import Profile
+from parallel_selection import ParallelPredicatePool
+from pipeline_options import REPROJECT_MODES, SUPPORTED_PREDICATES
+from point_selection import merge_stats, select_points
+from polygon_catalog import PolygonCatalog, check_name_column, name_key, name_keys, prepare_geometry
+from reprojection import reproject_geometry, reproject_points
+
+PredicateStrategy = Callable[..., gpd.GeoDataFrame]
+
+
+class NoPolygonMatchError(ValueError):
+    """No polygon in the layer has the requested name."""
+
+
+def ensure_crs_compatible(points: gpd.GeoDataFrame, polygons: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    return align_crs(points, polygons.crs)
+
+
+def align_crs(points: gpd.GeoDataFrame, crs) -> gpd.GeoDataFrame:
+    """``points`` in ``crs`` (the polygons' CRS); both CRSs must be defined."""
+    if crs is None and points.crs is None:
+        raise ValueError("Both layers are missing CRS. Please define CRS for your data.")
+    if crs is None:
+        raise ValueError("Polygon layer CRS is missing. Please define it before running.")
+    if points.crs is None:
+        raise ValueError("Point layer CRS is missing. Please define it before running.")
+    if points.crs != crs:
+        points = reproject_points(points, crs)
+    return points
+
+
+def filter_polygons_by_name(polygons: gpd.GeoDataFrame, name_column: str, name_value: str, case_sensitive: bool) -> gpd.GeoDataFrame:
+    check_name_column(polygons, name_column)
+    mask = name_keys(polygons, name_column, case_sensitive) == name_key(name_value, case_sensitive)
+    return polygons[mask]
+
+
+def build_union_geometry(polygons: gpd.GeoDataFrame) -> shapely_base.BaseGeometry:
+    if polygons.empty:
+        raise NoPolygonMatchError("No polygons matched the given name.")
+    if hasattr(polygons, "union_all"):
+        return polygons.union_all()
+    # geopandas < 1.0; unary_union returns a single (possibly multi-) geometry
+    return polygons.unary_union
+
+
+def union_for_name(catalog: PolygonCatalog, name_value, case_sensitive: bool,
+                   profile: Optional[Profile] = None) -> Tuple[gpd.GeoDataFrame, shapely_base.BaseGeometry]:
+    """The polygons named ``name_value`` and their prepared union.
+
+    Raises :class:`NoPolygonMatchError` if there are none.
+    """
+    profile = profile or Profile()
+    with profile.stage("filter_polygons", rows_in=len(catalog.polygons)) as stage:
+        matched = catalog.matched(name_value, case_sensitive)
+        stage.rows_out = len(matched)
+    if matched.empty:
+        raise NoPolygonMatchError(
+            f"No polygon matched the name '{name_value}' in column '{catalog.name_column}'. "
+            "Try a different value or check spelling."
+        )
+    with profile.stage("union", rows_in=len(matched)) as stage:
+        union_geom = catalog.union(name_value, case_sensitive)
+        stage.rows_out = 1
+    return matched, union_geom
+
+
+# Readers
+
+_UNREAD = object()
+
+
+class PointSource:
+    """A point layer read chunk by chunk. Subclasses implement :attr:`crs` and :meth:`chunks`."""
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        raise NotImplementedError
+
+    def chunks(self, bbox: Optional[BBox] = None) -> Iterator[gpd.GeoDataFrame]:
+        """Yield the points (at least one, possibly empty, chunk), only those inside ``bbox`` if given."""
+        raise NotImplementedError
+
+    def reprojected(self, crs) -> "PointSource":
+        """A source already in ``crs``, or ``self`` to have each chunk reprojected as it is read."""
+        return self
+
+
+class ReaderPointSource(PointSource):
+    """Points read with ``read_file(**kwargs)`` in chunks of ``chunk_size`` rows (None: all at once).
+
+    With ``fid_range`` only the features in that id range are read (see
+    :func:`chunked_io.make_rows_reader`).
+    """
+
+    def __init__(self, read_file: Callable[..., gpd.GeoDataFrame], chunk_size: Optional[int] = None,
+                 fid_range: Optional[FidRange] = None):
+        self.read_file = read_file
+        self.chunk_size = chunk_size
+        self.fid_range = fid_range
+        self._crs = _UNREAD
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        if self._crs is _UNREAD:
+            self._crs = read_layer_crs(make_rows_reader(self.read_file))
+        return self._crs
+
+    def chunks(self, bbox: Optional[BBox] = None) -> Iterator[gpd.GeoDataFrame]:
+        return iter_chunks(make_rows_reader(self.read_file, bbox, self.fid_range), self.chunk_size)
+
+
+def file_point_source(path: str, layer: Optional[str] = None, chunk_size: Optional[int] = None,
+                      fid_range: Optional[FidRange] = None,
+                      columns: Optional[Sequence[str]] = None) -> ReaderPointSource:
+    """Points read from a vector file, with only ``columns`` of the attributes (None: all)."""
+    return ReaderPointSource(layer_reader(path, layer, columns), chunk_size, fid_range)
+
+
+# Predicates
+
+_PREDICATES: Dict[str, PredicateStrategy] = {}
+
+
+def register_predicate(name: str, strategy: PredicateStrategy) -> None:
+    """Make ``strategy(points, geom, stats=None, pool=None)`` available as predicate ``name``.
+
+    The strategy returns the selected rows of ``points`` in their original
+    order and may fill ``stats`` like :func:`point_selection.select_points`.
+    """
+    _PREDICATES[name] = strategy
+
+
+def predicate_strategy(name: str) -> PredicateStrategy:
+    try:
+        return _PREDICATES[name]
+    except KeyError:
+        raise ValueError(f"Unsupported predicate: {name}") from None
+
+
+def _select_points_with(predicate: str, points: gpd.GeoDataFrame, geom: shapely_base.BaseGeometry,
+                        stats: Optional[Dict[str, float]] = None,
+                        pool: Optional[ParallelPredicatePool] = None) -> gpd.GeoDataFrame:
+    return select_points(points, geom, predicate, stats=stats, pool=pool)
+
+
+for _predicate in SUPPORTED_PREDICATES:
+    register_predicate(_predicate, functools.partial(_select_points_with, _predicate))
+
+
+# Pipeline
+
+def aligned_chunks(source: PointSource, extent: Optional[shapely_base.BaseGeometry], extent_crs, crs,
+                   profile: Optional[Profile] = None, align: bool = True) -> Iterator[gpd.GeoDataFrame]:
+    """Yield the points of ``source`` inside the bounding box of ``extent``, in ``crs``.
+
+    With ``align=False`` the chunks are left in the source's CRS.
+    """
+    profile = profile or Profile()
+    bbox = points_read_bbox(extent, extent_crs, source.crs) if extent is not None else None
+    if bbox is not None:
+        print(f"Reading only points inside bbox ({bbox[0]:.6f}, {bbox[1]:.6f}, {bbox[2]:.6f}, {bbox[3]:.6f}) in the points CRS")
+    for points in profile.iter_stage("read_points", source.chunks(bbox)):
+        if align:
+            with profile.stage("reproject_points", rows_in=len(points)) as stage:
+                points = align_crs(points, crs)
+                stage.rows_out = len(points)
+        yield points
+
+
+def extract_points(
+    source: PointSource,
+    union_geom: shapely_base.BaseGeometry,
+    polygons_crs,
+    writer,
+    predicate: str = "within",
+    reproject: str = "points",
+    pool: Optional[ParallelPredicatePool] = None,
+    profile: Optional[Profile] = None,
+    progress: Optional[Callable[..., None]] = None,
+    distance: Optional[float] = None,
+) -> Dict[str, float]:
+    """Write the points of ``source`` that satisfy ``predicate`` against ``union_geom`` to ``writer``.
+
+    ``union_geom`` is in ``polygons_crs``. When the points are in another CRS,
+    ``reproject="points"`` moves them to ``polygons_crs`` (through
+    :meth:`PointSource.reprojected`), ``"polygons"`` moves ``union_geom`` to
+    theirs instead. With ``distance`` (metres) the points within that distance
+    of ``union_geom`` are written instead, whatever ``predicate`` and
+    ``reproject`` say. The writer is flushed but not closed. Returns the
+    summed selection stats (see :func:`point_selection.format_selection_stats`).
+    """
+    if reproject not in REPROJECT_MODES:
+        raise ValueError(f"Unsupported reprojection mode: {reproject}")
+    select = predicate_strategy(predicate)
+    profile = profile or Profile()
+    progress = progress or (lambda stage=None, **counters: None)
+
+    points_crs = source.crs
+    crs_differ = points_crs is not None and polygons_crs is not None and points_crs != polygons_crs
+    reproject_union = crs_differ and reproject == "polygons"
+    align = not reproject_union
+    if distance is not None:
+        with profile.stage("prepare_distance", rows_in=1) as stage:
+            selector = DistanceSelector(union_geom, polygons_crs, distance)
+            stage.rows_out = 1
+        print(f"Measuring distances in {selector.metric_crs.name}")
+        # Read the target's bounds grown by the distance; chunks go straight from the points' CRS to the metric one
+        union_geom, extent_crs, align = selector.extent, selector.metric_crs, False
+
+        def select_within_distance(points, geom, stats=None, pool=None):
+            return selector.select(points, stats=stats)
+        select = select_within_distance
+    elif reproject_union:
+        # Test the points in their own CRS; the writer moves output geometry back
+        print(f"Reprojecting the target polygons to the points CRS ({points_crs.to_string()})")
+        with profile.stage("reproject_polygons", rows_in=1) as stage:
+            union_geom = prepare_geometry(reproject_geometry(union_geom, polygons_crs, points_crs))
+            stage.rows_out = 1
+        extent_crs = points_crs
+    else:
+        if crs_differ:
+            with profile.stage("reproject_source"):
+                source = source.reprojected(polygons_crs)
+        extent_crs = polygons_crs
+
+    total_stats: Dict[str, float] = {}
+    chunks = aligned_chunks(source, union_geom, extent_crs, polygons_crs, profile, align=align)
+    for chunk_number, points in enumerate(chunks):
+        progress("selecting")
+        selection_stats: Dict[str, float] = {}
+        with profile.stage("select", rows_in=len(points)) as stage:
+            selected_points = select(points, union_geom, stats=selection_stats, pool=pool)
+            stage.rows_out = len(selected_points)
+        merge_stats(total_stats, selection_stats)
+        progress("writing")
+        # Selected rows are buffered and written in batches
+        with profile.stage("write", rows_in=len(selected_points)):
+            writer.write(selected_points)
+        progress("reading", chunks=chunk_number + 1, rows_read=int(total_stats.get("total", 0)),
+                 rows_selected=int(total_stats.get("selected", 0)))
+    progress("writing")
+    with profile.stage("write"):
+        writer.flush()
+    return total_stats
@@ -0,0 +1,125 @@
+"""
+Sidecar state for incremental extractions.
+
+An incremental run records next to its output, in ``<output>.state.json``:
+
+- the watermark: the highest point feature id it has processed, and how many
+  features the layer had up to it;
+- the settings the output depends on (points and polygon layers, a hash of the
+  target geometry, name, predicate, CRSs, output format);
+- the output file's size and modification time after the run.
+
+The next run reads only the features with a higher id and appends what it
+selects to the output. It rebuilds the output from scratch instead when there
+is no state, a setting differs, the output was changed or removed since, or
+the features up to the watermark are no longer the ones processed (the layer
+was rewritten rather than appended to).
+
+Feature ids are read with pyogrio; append-only layers (GeoPackage, Shapefile,
+...) give new features higher ids.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import shapely
+from shapely.geometry import base as shapely_base
+
+from chunked_io import FidRange
+
+STATE_VERSION = 1
+STATE_SUFFIX = ".state.json"
+
+
+def state_path(output: str) -> str:
+    return output + STATE_SUFFIX
+
+
+def geometry_digest(geom: shapely_base.BaseGeometry) -> str:
+    """SHA-256 of the geometry's WKB, to notice when the target polygon changes."""
+    return hashlib.sha256(shapely.to_wkb(geom)).hexdigest()
+
+
+def output_signature(path: str) -> Optional[Dict[str, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_state(path: str) -> Optional[Dict[str, object]]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+class IncrementalPlan:
+    """What an incremental run reads: everything (``full``) or the features after the watermark."""
+
+    def __init__(self, full: bool, reason: Optional[str], after_fid: Optional[int], upto_fid: Optional[int],
+                 skipped_rows: int, new_rows: int):
+        self.full = full
+        self.reason = reason
+        self.after_fid = after_fid
+        self.upto_fid = upto_fid
+        self.skipped_rows = skipped_rows
+        self.new_rows = new_rows
+
+    @property
+    def fid_range(self) -> FidRange:
+        # Features appended while this run reads are left for the next one
+        return (self.after_fid, self.upto_fid)
+
+    def describe(self) -> str:
+        if self.full:
+            return f"Incremental: full rebuild ({self.reason}); processing {self.new_rows} rows"
+        return (f"Incremental: skipping {self.skipped_rows} rows up to feature id {self.after_fid}; "
+                f"processing {self.new_rows} new rows")
+
+
+def plan_run(state_file: str, settings: Dict[str, object], output: str, fids: np.ndarray) -> IncrementalPlan:
+    """Plan a run over a layer whose sorted feature ids are ``fids``, given the recorded state."""
+    upto = int(fids[-1]) if len(fids) else None
+    state = load_state(state_file)
+    reason = None
+    if state is None:
+        reason = "no previous state"
+    elif state.get("version") != STATE_VERSION:
+        reason = "state written by another version"
+    else:
+        recorded = state.get("settings", {})
+        changed = sorted(key for key in set(recorded) | set(settings) if recorded.get(key) != settings.get(key))
+        watermark = state.get("watermark")
+        if changed:
+            reason = f"{', '.join(changed)} changed"
+        elif output_signature(output) != state.get("output"):
+            reason = "the output was changed or removed"
+        elif watermark is not None and int(np.count_nonzero(fids <= watermark)) != state.get("rows"):
+            reason = "features up to the last processed id were removed or rewritten"
+    if reason is not None:
+        return IncrementalPlan(True, reason, None, upto, 0, len(fids))
+    after = state["watermark"]
+    skipped = int(np.count_nonzero(fids <= after)) if after is not None else 0
+    return IncrementalPlan(False, None, after, upto, skipped, len(fids) - skipped)
+
+
+def save_state(state_file: str, settings: Dict[str, object], plan: IncrementalPlan, output: str) -> None:
+    """Record a finished run; written to a temporary file first so a crash leaves the old state."""
+    watermark = plan.upto_fid if plan.upto_fid is not None else (None if plan.full else plan.after_fid)
+    state = {
+        "version": STATE_VERSION,
+        "watermark": watermark,
+        "rows": plan.skipped_rows + plan.new_rows,
+        "settings": settings,
+        "output": output_signature(output),
+    }
+    temp_path = state_file + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(temp_path, state_file)
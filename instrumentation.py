@@ -0,0 +1,269 @@
+"""
+Per-stage timing and memory instrumentation for the extraction pipeline.
+
+A :class:`Profile` records, for every pipeline stage (read, reprojection,
+union, predicate evaluation, write, ...), its wall time, the rows that went in
+and came out, and the process memory: the resident set size after the stage
+and how much the stage raised the process' peak RSS. Stages that run once per
+chunk are recorded once per chunk and summed in :meth:`Profile.summary`.
+
+Each record can be passed to a ``log`` callable (the CLI's ``--profile``
+prints them as JSON lines) and to a :class:`StageMetrics` registry, which
+keeps Prometheus-style histograms across requests for the web app's
+``/metrics`` endpoint.
+
+Peak RSS is the process-wide high-water mark, so with concurrent web jobs the
+growth is attributed to whichever stage was running when it happened.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds of the histogram buckets
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+ROWS_BUCKETS = (0, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+BYTES_BUCKETS = tuple(1024 * 1024 * size for size in (0, 1, 16, 64, 256, 1024, 4096))
+
+
+def _status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water mark of the process' resident memory, or None if unknown."""
+    # VmHWM is reset by exec, unlike ru_maxrss on Linux
+    peak_kb = _status_kb("VmHWM:")
+    if peak_kb is not None:
+        return peak_kb * 1024
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident memory of the process (Linux only), or None."""
+    rss_kb = _status_kb("VmRSS:")
+    return rss_kb * 1024 if rss_kb is not None else None
+
+
+class StageRecord:
+    """One run of a stage. Set ``rows_out`` (and ``rows_in``) inside the ``with`` block."""
+
+    def __init__(self, name: str, rows_in: Optional[int] = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self.seconds = 0.0
+        self.rss_bytes: Optional[int] = None
+        self.peak_rss_bytes: Optional[int] = None
+        self.peak_rss_growth_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "stage": self.name,
+            "seconds": round(self.seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rss_bytes": self.rss_bytes,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_rss_growth_bytes": self.peak_rss_growth_bytes,
+        }
+
+
+class Profile:
+    """Stage records of one run (a CLI invocation or a web job)."""
+
+    def __init__(self, log: Optional[Callable[[Dict[str, object]], None]] = None,
+                 metrics: Optional["StageMetrics"] = None):
+        self.log = log
+        self.metrics = metrics
+        self.records: List[StageRecord] = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageRecord]:
+        record = StageRecord(name, rows_in)
+        peak_before = peak_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            record.rss_bytes = rss_bytes()
+            record.peak_rss_bytes = peak_rss_bytes()
+            if peak_before is not None and record.peak_rss_bytes is not None:
+                record.peak_rss_growth_bytes = record.peak_rss_bytes - peak_before
+            self._record(record)
+
+    def iter_stage(self, name: str, chunks: Iterable) -> Iterator:
+        """Yield from ``chunks``, recording the time to produce each one as stage ``name``."""
+        iterator = iter(chunks)
+        while True:
+            with self.stage(name) as record:
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    record.rows_out = 0
+                    return
+                record.rows_out = len(chunk)
+            yield chunk
+
+    def _record(self, record: StageRecord) -> None:
+        self.records.append(record)
+        if self.log is not None:
+            self.log(dict(record.to_dict(), event="stage"))
+        if self.metrics is not None:
+            self.metrics.observe(record)
+
+    def summary(self) -> Dict[str, object]:
+        """Records summed per stage, in the order the stages first ran."""
+        stages: Dict[str, Dict[str, object]] = {}
+        for record in self.records:
+            totals = stages.setdefault(record.name, {"calls": 0, "seconds": 0.0, "rows_in": None,
+                                                     "rows_out": None, "peak_rss_growth_bytes": None})
+            totals["calls"] += 1
+            totals["seconds"] = round(totals["seconds"] + record.seconds, 6)
+            for key in ("rows_in", "rows_out", "peak_rss_growth_bytes"):
+                value = getattr(record, key)
+                if value is not None:
+                    totals[key] = (totals[key] or 0) + value
+        return {
+            "event": "summary",
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": stages,
+        }
+
+
+def json_log(stream=None) -> Callable[[Dict[str, object]], None]:
+    """A ``log`` for :class:`Profile` that writes one JSON object per line (default: stderr)."""
+    def log(entry: Dict[str, object]) -> None:
+        print(json.dumps(entry), file=stream or sys.stderr, flush=True)
+    return log
+
+
+@contextmanager
+def cprofile_to(path: Optional[str]) -> Iterator[None]:
+    """Run the block under cProfile and dump the stats to ``path`` (no-op when None)."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as exc:
+        # Python 3.12+ allows one active profiler per process (e.g. concurrent jobs)
+        print(f"cProfile skipped: {exc}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        profiler.dump_stats(path)
+        print(f"cProfile stats written to: {path}")
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class StageMetrics:
+    """Thread-safe per-stage histograms, rendered in the Prometheus text format."""
+
+    _HISTOGRAMS = (
+        ("seconds", "gis_stage_duration_seconds", "Wall time of one run of a pipeline stage.", SECONDS_BUCKETS),
+        ("rows_out", "gis_stage_rows_out", "Rows produced by one run of a pipeline stage.", ROWS_BUCKETS),
+        ("peak_rss_growth_bytes", "gis_stage_peak_rss_growth_bytes",
+         "Increase of the process' peak resident memory during one run of a pipeline stage.", BYTES_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], _Histogram] = {}
+        self._rows_in: Dict[str, int] = {}
+
+    def observe(self, record: StageRecord) -> None:
+        with self._lock:
+            for attribute, _, _, buckets in self._HISTOGRAMS:
+                value = getattr(record, attribute)
+                if value is None:
+                    continue
+                key = (attribute, record.name)
+                if key not in self._histograms:
+                    self._histograms[key] = _Histogram(buckets)
+                self._histograms[key].observe(value)
+            if record.rows_in is not None:
+                self._rows_in[record.name] = self._rows_in.get(record.name, 0) + record.rows_in
+
+    def render(self, extra: Optional[Dict[str, Tuple[str, str, float]]] = None) -> str:
+        """The metrics as Prometheus text, plus ``extra`` given as ``{name: (type, help, value)}``.
+
+        ``type`` is ``"gauge"`` or ``"counter"``; entries with a None value are skipped.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for attribute, metric, help_text, _ in self._HISTOGRAMS:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (key_attribute, stage), histogram in sorted(self._histograms.items()):
+                    if key_attribute != attribute:
+                        continue
+                    stage_label = _label(stage)
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{stage="{stage_label}",le="{_format_number(bound)}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{stage="{stage_label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage_label}"}} {_format_number(histogram.sum)}')
+                    lines.append(f'{metric}_count{{stage="{stage_label}"}} {histogram.count}')
+            lines.append("# HELP gis_stage_rows_in_total Rows passed into pipeline stages.")
+            lines.append("# TYPE gis_stage_rows_in_total counter")
+            for stage, rows in sorted(self._rows_in.items()):
+                lines.append(f'gis_stage_rows_in_total{{stage="{_label(stage)}"}} {rows}')
+        for name, (metric_type, help_text, value) in (extra or {}).items():
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
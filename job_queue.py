@@ -0,0 +1,184 @@
+"""
+Bounded background job queue for long-running web requests.
+
+Jobs run on a fixed number of worker threads. At most ``max_queued`` jobs may
+wait for a free worker and, optionally, each client may only have
+``max_jobs_per_client`` jobs queued or running at once; further submissions
+are rejected with :class:`QueueFullError` instead of piling up, so one huge
+upload cannot starve everyone else. Jobs report their current stage and
+progress counters, which clients poll by job id. Finished jobs (and their
+result files) are forgotten after ``result_ttl`` seconds.
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue (or the client's share) is full."""
+
+
+class Job:
+    """State of one submitted job, updated by the worker and read by status requests."""
+
+    def __init__(self, job_id: str, client: Optional[str] = None):
+        self.id = job_id
+        self.client = client
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress: Dict[str, int] = {}
+        self.error: Optional[str] = None
+        self.result_path: Optional[str] = None
+        self.result_mimetype: Optional[str] = None
+        self.download_name: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: Optional[str] = None, **progress: int) -> None:
+        """Set the current stage and/or progress counters (e.g. ``rows_read=...``)."""
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            self.progress.update(progress)
+
+    def to_dict(self) -> Dict[str, object]:
+        with self._lock:
+            now = self.finished or time.time()
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "queued_seconds": round((self.started or now) - self.created, 3),
+                "run_seconds": round(now - self.started, 3) if self.started else 0.0,
+            }
+
+
+class JobQueue:
+    """Run jobs on ``max_workers`` threads with at most ``max_queued`` waiting."""
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_queued: int,
+        max_jobs_per_client: Optional[int] = None,
+        result_ttl: float = 3600,
+    ):
+        if max_workers < 1:
+            raise ValueError("The number of job workers must be at least 1.")
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_jobs_per_client = max_jobs_per_client
+        self.result_ttl = result_ttl
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, run: Callable[[Job], None], client: Optional[str] = None) -> Job:
+        """Queue ``run(job)`` and return the job; raises :class:`QueueFullError` when full.
+
+        ``run`` reports progress through ``job.update`` and sets
+        ``job.result_path`` / ``job.result_mimetype`` / ``job.download_name``
+        when it produces a file.
+        """
+        self.expire()
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.status in (QUEUED, RUNNING)]
+            if sum(job.status == QUEUED for job in active) >= self.max_queued:
+                self.rejected += 1
+                raise QueueFullError("The server is busy. Please try again in a few minutes.")
+            if (
+                client is not None
+                and self.max_jobs_per_client is not None
+                and sum(job.client == client for job in active) >= self.max_jobs_per_client
+            ):
+                self.rejected += 1
+                raise QueueFullError("You already have the maximum number of jobs running. Wait for one to finish.")
+            job = Job(uuid.uuid4().hex, client)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, run)
+        return job
+
+    def _run(self, job: Job, run: Callable[[Job], None]) -> None:
+        with job._lock:
+            job.status = RUNNING
+            job.started = time.time()
+        try:
+            run(job)
+        except Exception as exc:
+            print(f"Job {job.id} failed: {str(exc)}")
+            traceback.print_exc()
+            with job._lock:
+                job.status = FAILED
+                job.error = str(exc)
+                job.finished = time.time()
+            with self._lock:
+                self.failed += 1
+        else:
+            with job._lock:
+                job.status = DONE
+                job.stage = DONE
+                job.finished = time.time()
+            with self._lock:
+                self.completed += 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> int:
+        """Number of queued jobs submitted before ``job`` (0 when it is not queued)."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            return sum(
+                other.status == QUEUED and other.created < job.created for other in self._jobs.values()
+            )
+
+    def expire(self) -> None:
+        """Forget finished jobs older than ``result_ttl`` and delete their result files."""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished is not None and job.finished <= cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.result_path is not None:
+                try:
+                    os.remove(job.result_path)
+                except OSError:
+                    pass  # Already removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "queued": statuses.count(QUEUED),
+                "running": statuses.count(RUNNING),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,308 @@
+"""
+Content-addressed on-disk cache of parsed vector layers for the web app.
+
+Uploads are keyed by the SHA-256 of their bytes (plus the layer name), and the
+parsed layer is stored as GeoParquet parts, one part per read chunk. Repeat
+uploads of the same file skip parsing entirely and are read back chunk by
+chunk, optionally restricted to a bounding box. The cache directory is capped
+in size and evicts the least recently used entries.
+
+GeoParquet support needs ``pyarrow``; without it :data:`CACHE_AVAILABLE` is
+False and the web app reads uploads directly.
+"""
+
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+import weakref
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import pandas as pd
+from pyproj import CRS
+
+from chunked_io import check_columns
+from extraction import PointSource
+from reprojection import reproject_points
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CACHE_AVAILABLE = pyarrow is not None
+
+# geopandas >= 1.0 can filter GeoParquet reads by the covering bbox column
+_PARQUET_BBOX = "bbox" in inspect.signature(gpd.read_parquet).parameters
+
+BBox = Tuple[float, float, float, float]
+
+_PART_PREFIX = "part-"
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def save_stream_with_hash(stream: BinaryIO, path: str) -> str:
+    """Copy ``stream`` to ``path`` and return the SHA-256 hex digest of its bytes."""
+    digest = hashlib.sha256()
+    with open(path, "wb") as out:
+        while True:
+            block = stream.read(_HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+def cache_key(content_hash: str, layer_name: Optional[str] = None, crs=None) -> str:
+    """Key of an upload's layer; with ``crs``, of that layer reprojected to ``crs``."""
+    key = content_hash
+    if layer_name:
+        key += "_" + hashlib.sha256(layer_name.encode("utf-8")).hexdigest()[:16]
+    if crs is not None:
+        key += "_crs" + hashlib.sha256(CRS.from_user_input(crs).to_wkt().encode("utf-8")).hexdigest()[:16]
+    return key
+
+
+# What cache_key returns: a SHA-256 hex digest, then 16-hex-digit layer and CRS suffixes
+_CACHE_KEY_PATTERN = re.compile(r"[0-9a-f]{64}(?:_(?:crs)?[0-9a-f]{16})*")
+
+
+def is_cache_key(key: str) -> bool:
+    """Whether ``key`` is shaped like a :func:`cache_key`, so it is safe to look up (client-supplied ids)."""
+    return isinstance(key, str) and _CACHE_KEY_PATTERN.fullmatch(key) is not None
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+class LayerCache:
+    """Parsed layers stored as GeoParquet parts under ``cache_dir``, capped at ``max_bytes``."""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        if not CACHE_AVAILABLE:
+            raise ImportError("The layer cache needs 'pyarrow' for GeoParquet support.")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Entries in use (pinned by callers or being read by iter_chunks), with their counts: never evicted
+        self._pins: Dict[str, int] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _pin_locked(self, entry: str) -> None:
+        name = os.path.basename(entry)
+        self._pins[name] = self._pins.get(name, 0) + 1
+
+    def unpin(self, entry: str) -> None:
+        """Release a pin taken with ``pin=True`` (or by :meth:`iter_chunks`)."""
+        name = os.path.basename(entry)
+        with self._lock:
+            self._pins[name] -= 1
+            if not self._pins[name]:
+                del self._pins[name]
+
+    def lookup(self, key: str, pin: bool = False) -> Optional[str]:
+        """Return the entry directory for ``key``, or None on a miss (also for an entry without parts).
+
+        With ``pin=True`` a hit is pinned against eviction before it is
+        returned; the caller must :meth:`unpin` it when done.
+        """
+        entry = self._entry_path(key)
+        with self._lock:
+            if os.path.isdir(entry) and self._part_paths(entry):
+                self.hits += 1
+                # The directory mtime is the LRU clock
+                os.utime(entry)
+                if pin:
+                    self._pin_locked(entry)
+                return entry
+            self.misses += 1
+            return None
+
+    def store(self, key: str, chunks: Iterable[gpd.GeoDataFrame], pin: bool = False) -> str:
+        """Write ``chunks`` as the entry for ``key`` and return its directory (pinned with ``pin=True``)."""
+        entry = self._entry_path(key)
+        staging = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            for part_number, chunk in enumerate(chunks):
+                part_path = os.path.join(staging, f"{_PART_PREFIX}{part_number:06d}.parquet")
+                if _PARQUET_BBOX:
+                    chunk.to_parquet(part_path, index=False, write_covering_bbox=True)
+                else:
+                    chunk.to_parquet(part_path, index=False)
+            with self._lock:
+                if os.path.isdir(entry) and self._part_paths(entry):
+                    # Another request cached the same upload meanwhile
+                    shutil.rmtree(staging, ignore_errors=True)
+                else:
+                    shutil.rmtree(entry, ignore_errors=True)  # Left without parts
+                    os.replace(staging, entry)
+                if pin:
+                    self._pin_locked(entry)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        return entry
+
+    def get_or_store(self, key: str, read_chunks: Callable[[], Iterable[gpd.GeoDataFrame]], pin: bool = False) -> str:
+        entry = self.lookup(key, pin=pin)
+        if entry is None:
+            entry = self.store(key, read_chunks(), pin=pin)
+        return entry
+
+    @contextlib.contextmanager
+    def pinned(self, key: str, read_chunks: Callable[[], Iterable[gpd.GeoDataFrame]]) -> Iterator[str]:
+        """:meth:`get_or_store`, with the entry pinned against eviction for the ``with`` block."""
+        entry = self.get_or_store(key, read_chunks, pin=True)
+        try:
+            yield entry
+        finally:
+            self.unpin(entry)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove least recently used entries until the cache fits in ``max_bytes``.
+
+        ``keep`` and entries still being read are skipped, even if the cache stays over budget.
+        """
+        with self._lock:
+            entries = []
+            for item in os.scandir(self.cache_dir):
+                if item.is_dir() and not item.name.startswith(".tmp-"):
+                    entries.append((item.stat().st_mtime, item.name, _dir_size(item.path)))
+            total = sum(size for _, _, size in entries)
+            for _, name, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == keep or name in self._pins:
+                    continue
+                shutil.rmtree(self._entry_path(name), ignore_errors=True)
+                total -= size
+                self.evictions += 1
+
+    @staticmethod
+    def _part_paths(entry: str):
+        parts = sorted(name for name in os.listdir(entry) if name.startswith(_PART_PREFIX))
+        return [os.path.join(entry, name) for name in parts]
+
+    def _geo_metadata(self, entry: str) -> Tuple[List[str], dict]:
+        schema = pyarrow.parquet.read_schema(self._part_paths(entry)[0])
+        return schema.names, json.loads(schema.metadata[b"geo"])
+
+    def layer_columns(self, entry: str) -> List[str]:
+        """Attribute columns of a cached layer (without the geometry and its bbox covering)."""
+        names, geo = self._geo_metadata(entry)
+        hidden = {geo["primary_column"]}
+        for column in geo["columns"].values():
+            covering = column.get("covering", {}).get("bbox", {})
+            hidden.update(path[0] for path in covering.values())
+        return [name for name in names if name not in hidden]
+
+    def layer_crs(self, entry: str) -> Optional[CRS]:
+        """CRS of a cached layer, read from the GeoParquet metadata without loading any rows."""
+        _, geo = self._geo_metadata(entry)
+        column = geo["columns"][geo["primary_column"]]
+        if "crs" not in column:
+            return CRS.from_user_input("OGC:CRS84")  # GeoParquet default
+        if column["crs"] is None:
+            return None
+        return CRS.from_user_input(column["crs"])
+
+    def iter_chunks(self, entry: str, bbox: Optional[BBox] = None,
+                    columns: Optional[Sequence[str]] = None) -> Iterator[gpd.GeoDataFrame]:
+        """Yield the cached layer part by part, keeping only features that intersect ``bbox``.
+
+        With ``columns`` only those attributes (and the geometry) are read.
+        Parts are opened one by one, so the entry is also pinned against
+        :meth:`evict` until the iteration ends; callers that look the entry
+        up first should hold their own pin from then on (``pin=True``).
+        """
+        with self._lock:
+            self._pin_locked(entry)
+        try:
+            read_kwargs = {}
+            if columns is not None:
+                read_kwargs["columns"] = list(columns) + [self._geo_metadata(entry)[1]["primary_column"]]
+            for part_path in self._part_paths(entry):
+                if bbox is not None and _PARQUET_BBOX:
+                    yield gpd.read_parquet(part_path, bbox=bbox, **read_kwargs)
+                elif bbox is not None:
+                    yield gpd.read_parquet(part_path, **read_kwargs).cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+                else:
+                    yield gpd.read_parquet(part_path, **read_kwargs)
+        finally:
+            self.unpin(entry)
+
+    def read_layer(self, entry: str, columns: Optional[Sequence[str]] = None) -> Optional[gpd.GeoDataFrame]:
+        """The whole cached layer, or None if the entry holds no parts (treated as a miss)."""
+        if not self._part_paths(entry):
+            return None
+        chunks = list(self.iter_chunks(entry, columns=columns))
+        if len(chunks) == 1:
+            return chunks[0]
+        return gpd.GeoDataFrame(pd.concat(chunks, ignore_index=True), crs=chunks[0].crs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class CachedPointSource(PointSource):
+    """A point layer served from ``cache``, stored from ``read_chunks()`` on first use.
+
+    :meth:`reprojected` returns a source for a second cache entry holding the
+    layer in another CRS, so the transform runs once per upload and CRS.
+    Entries hold every attribute; with ``columns`` only those are read back.
+    The entry stays pinned against eviction until :meth:`close` is called or
+    the source is garbage collected.
+    """
+
+    def __init__(self, cache: LayerCache, content_hash: str, layer_name: Optional[str],
+                 read_chunks: Callable[[], Iterable[gpd.GeoDataFrame]], target_crs=None,
+                 columns: Optional[Sequence[str]] = None):
+        self.cache = cache
+        self.content_hash = content_hash
+        self.layer_name = layer_name
+        self.entry = cache.get_or_store(cache_key(content_hash, layer_name, target_crs), read_chunks, pin=True)
+        self._release = weakref.finalize(self, cache.unpin, self.entry)
+        check_columns(cache.layer_columns(self.entry), columns, "the point layer")
+        self.columns = columns
+
+    def close(self) -> None:
+        """Unpin the entry (once; later calls do nothing)."""
+        self._release()
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        return self.cache.layer_crs(self.entry)
+
+    def chunks(self, bbox: Optional[BBox] = None) -> Iterator[gpd.GeoDataFrame]:
+        return self.cache.iter_chunks(self.entry, bbox, self.columns)
+
+    def reprojected(self, crs) -> "CachedPointSource":
+        if self.crs is None or crs is None or self.crs == crs:
+            return self
+        return CachedPointSource(
+            self.cache, self.content_hash, self.layer_name,
+            lambda: (reproject_points(chunk, crs) for chunk in self.cache.iter_chunks(self.entry)),
+            target_crs=crs, columns=self.columns,
+        )
@@ -0,0 +1,214 @@
+"""
+Batched writers for the selected points in CSV, Parquet, Feather, GeoPackage
+and GeoJSON Sequence format.
+
+Chunks passed to :meth:`PointsWriter.write` are buffered and written out in
+batches of ``batch_rows`` rows: one row group for Parquet, one record batch
+for Feather, one append for the GDAL formats. Parquet and Feather keep the
+column types and are zstd-compressed.
+
+The geometry is either dropped (``"none"``, the CSV default so far), written
+as ``"wkb"`` (a WKB column named ``geometry``, hex-encoded in CSV, with
+GeoParquet metadata in Parquet/Feather so ``gpd.read_parquet`` /
+``gpd.read_feather`` load it as a GeoDataFrame), or as ``"xy"`` columns
+(``x``/``y``; empty for non-point geometries). GeoPackage and GeoJSON Sequence
+always store the geometry natively. With ``crs`` set, kept geometry is
+written in that CRS whatever CRS the chunks arrive in.
+
+Parquet and Feather need ``pyarrow``.
+"""
+
+import json
+import os
+from typing import List, Optional
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from chunked_io import write_points_csv
+from pipeline_options import (  # noqa: F401 (re-exported)
+    ARROW_FORMATS,
+    GEOMETRY_MODES,
+    OUTPUT_EXTENSIONS,
+    OUTPUT_FORMATS,
+    OUTPUT_MIMETYPES,
+    check_output_format,
+)
+from reprojection import reproject_points
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_GDAL_DRIVERS = {"gpkg": "GPKG", "geojsonseq": "GeoJSONSeq"}
+
+DEFAULT_BATCH_ROWS = 100000
+
+
+def points_table(points: gpd.GeoDataFrame, geometry: str, hex_wkb: bool = False) -> pd.DataFrame:
+    """Attributes of ``points`` with the geometry dropped or encoded as ``geometry``."""
+    geometry_name = points.geometry.name if isinstance(points, gpd.GeoDataFrame) else "geometry"
+    df_out = pd.DataFrame(points.drop(columns=[geometry_name], errors="ignore"))
+    if geometry == "none" or not isinstance(points, gpd.GeoDataFrame):
+        return df_out
+    values = points.geometry.array
+    if geometry == "wkb":
+        df_out["geometry"] = shapely.to_wkb(values, hex=hex_wkb)
+        return df_out
+    for column in ("x", "y"):
+        if column in df_out.columns:
+            raise ValueError(f"The points already have a '{column}' column; use --geometry wkb instead.")
+    df_out["x"] = shapely.get_x(values)
+    df_out["y"] = shapely.get_y(values)
+    return df_out
+
+
+def _geo_metadata(crs) -> bytes:
+    column = {"encoding": "WKB", "geometry_types": []}
+    column["crs"] = crs.to_json_dict() if crs is not None else None
+    return json.dumps({"version": "1.0.0", "primary_column": "geometry", "columns": {"geometry": column}}).encode("utf-8")
+
+
+class PointsWriter:
+    """Write selected points to ``path`` in ``output_format``, ``batch_rows`` rows at a time.
+
+    Use as a context manager or call :meth:`close`; the file is only complete
+    once closed. An output with no rows still gets its header/schema.
+
+    With ``append=True`` the rows are added to an existing output of the same
+    format and columns. CSV and the GDAL formats are appended in place;
+    Parquet and Feather are rewritten (old rows first) into a temporary file
+    that replaces ``path`` on close.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        output_format: str = "csv",
+        geometry: str = "none",
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+        crs=None,
+        append: bool = False,
+    ):
+        check_output_format(output_format, geometry)
+        self.path = path
+        self.append = append and os.path.exists(path)
+        self.output_format = output_format
+        self.geometry = geometry
+        self.batch_rows = batch_rows
+        self.crs = crs
+        self.rows_written = 0
+        self._pending: List[gpd.GeoDataFrame] = []
+        self._pending_rows = 0
+        self._schema_frame: Optional[gpd.GeoDataFrame] = None
+        # Appended text and GDAL outputs already have their header/layer
+        self._started = self.append and self.output_format not in ARROW_FORMATS
+        self._writer = None
+        self._write_path = path + ".tmp" if self.append and self.output_format in ARROW_FORMATS else path
+        self._schema = None
+
+    @property
+    def keeps_geometry(self) -> bool:
+        return self.geometry != "none" or self.output_format in _GDAL_DRIVERS
+
+    def __enter__(self) -> "PointsWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._writer is not None:
+            # Don't write pending rows after a failure; just release the file
+            self._writer.close()
+            self._writer = None
+            if self._write_path != self.path:
+                os.remove(self._write_path)  # The output being appended to stays as it was
+
+    def write(self, points: gpd.GeoDataFrame) -> None:
+        if self._schema_frame is None:
+            self._schema_frame = points.iloc[:0]
+        if len(points) == 0:
+            return
+        self._pending.append(points)
+        self._pending_rows += len(points)
+        if self._pending_rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        if len(self._pending) == 1:
+            batch = self._pending[0]
+        else:
+            batch = gpd.GeoDataFrame(pd.concat(self._pending), crs=self._pending[0].crs)
+        self._pending = []
+        self._pending_rows = 0
+        self._write_batch(batch)
+        self.rows_written += len(batch)
+
+    def close(self) -> None:
+        self.flush()
+        if not self._started and self._schema_frame is not None:
+            # No rows at all: still create the file with its columns
+            self._write_batch(self._schema_frame)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._write_path != self.path:
+                os.replace(self._write_path, self.path)
+
+    def _write_batch(self, batch: gpd.GeoDataFrame) -> None:
+        if self.crs is not None and self.keeps_geometry and batch.crs is not None and batch.crs != self.crs:
+            batch = reproject_points(batch, self.crs)
+        if self.output_format == "csv" and self.geometry == "none":
+            write_points_csv(batch, self.path, append=self._started)
+        elif self.output_format == "csv":
+            table = points_table(batch, self.geometry, hex_wkb=True)
+            table.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False, encoding="utf-8")
+        elif self.output_format in _GDAL_DRIVERS:
+            batch.to_file(self.path, driver=_GDAL_DRIVERS[self.output_format], mode="a" if self._started else "w")
+        else:
+            self._write_arrow(batch)
+        self._started = True
+
+    def _write_arrow(self, batch: gpd.GeoDataFrame) -> None:
+        table = pyarrow.Table.from_pandas(points_table(batch, self.geometry), preserve_index=False)
+        if self._writer is None:
+            existing = None
+            if self.append:
+                if self.output_format == "parquet":
+                    existing = pyarrow.parquet.read_table(self.path)
+                else:
+                    with pyarrow.OSFile(self.path) as source:
+                        existing = pyarrow.ipc.open_file(source).read_all()
+                schema = existing.schema
+            else:
+                # Columns that are all missing in the first batch are typed as strings
+                schema = pyarrow.schema([
+                    field.with_type(pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+                    for field in table.schema
+                ], metadata=table.schema.metadata)
+                if self.geometry == "wkb":
+                    metadata = dict(schema.metadata or {})
+                    metadata[b"geo"] = _geo_metadata(batch.crs)
+                    schema = schema.with_metadata(metadata)
+            self._schema = schema
+            if self.output_format == "parquet":
+                self._writer = pyarrow.parquet.ParquetWriter(self._write_path, schema, compression="zstd")
+            else:
+                options = pyarrow.ipc.IpcWriteOptions(compression="zstd")
+                self._writer = pyarrow.ipc.new_file(self._write_path, schema, options=options)
+            if existing is not None:
+                self._write_table(existing)
+        self._write_table(table.replace_schema_metadata(self._schema.metadata).cast(self._schema))
+
+    def _write_table(self, table) -> None:
+        if self.output_format == "parquet":
+            self._writer.write_table(table)
+        else:
+            for record_batch in table.to_batches():
+                self._writer.write_batch(record_batch)
@@ -0,0 +1,196 @@
+"""
+Exact point predicate, serially or in a process pool across CPU cores.
+
+Simple points are tested straight from their x/y coordinate arrays with
+``shapely.contains_xy`` / ``intersects_xy``, without building point objects.
+
+The candidate geometries are split into chunks and tested against the target
+geometry in worker processes; the per-chunk masks come back in order and are
+concatenated, so the result is identical to the serial test. Point layers are
+shipped as plain x/y coordinate arrays, anything else as WKB.
+
+The target geometry is shipped once per worker, not once per chunk: it is
+written to a temporary WKB file named by the SHA-256 of its WKB, and tasks
+only carry that digest and the path. The same geometry (e.g. one union tested
+chunk after chunk) keeps its file, and each worker loads and prepares a
+geometry the first time it sees its digest and keeps the most recent ones, so
+one long-lived pool can serve many different geometries (e.g. in the web app).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import base as shapely_base
+
+# Below this many candidates the pool overhead outweighs the parallel speed-up
+DEFAULT_MIN_PARALLEL_ROWS = 50000
+
+_WORKER_CACHE_SIZE = 4
+# Geometry files a pool keeps for reuse (files still used by running tasks are never removed)
+_GEOMETRY_FILES = 16
+_worker_geometries: "OrderedDict[str, shapely_base.BaseGeometry]" = OrderedDict()
+
+
+def _worker_geometry(digest: str, geom_path: str) -> shapely_base.BaseGeometry:
+    geom = _worker_geometries.get(digest)
+    if geom is None:
+        with open(geom_path, "rb") as fh:
+            geom = shapely.from_wkb(fh.read())
+        shapely.prepare(geom)
+        _worker_geometries[digest] = geom
+        while len(_worker_geometries) > _WORKER_CACHE_SIZE:
+            _worker_geometries.popitem(last=False)
+    else:
+        _worker_geometries.move_to_end(digest)
+    return geom
+
+
+def predicate_mask(geometries: np.ndarray, geom: shapely_base.BaseGeometry, predicate: str) -> np.ndarray:
+    """``geometries within geom`` / ``geometries intersect geom`` as a boolean array.
+
+    Evaluated from the target's side (``within`` as ``contains``) so a prepared
+    ``geom`` is actually used; the results are the same.
+    """
+    if predicate == "within":
+        return shapely.contains(geom, geometries)
+    return shapely.intersects(geom, geometries)
+
+
+def predicate_mask_xy(x: np.ndarray, y: np.ndarray, geom: shapely_base.BaseGeometry, predicate: str) -> np.ndarray:
+    """:func:`predicate_mask` for points given as coordinate arrays."""
+    if predicate == "within":
+        return shapely.contains_xy(geom, x, y)
+    return shapely.intersects_xy(geom, x, y)
+
+
+def point_coordinates(geometries: np.ndarray) -> Optional[np.ndarray]:
+    """The (n, 2) x/y array of ``geometries`` if all are non-empty single points, else None.
+
+    Multi-points, other geometry types, empty and missing geometries have no
+    one-to-one coordinate pair and need the general geometry path.
+    """
+    if len(geometries) == 0:
+        return None
+    type_ids = shapely.get_type_id(geometries)
+    if not np.all(type_ids == 0) or np.any(shapely.is_empty(geometries)):
+        return None
+    return shapely.get_coordinates(geometries)
+
+
+def _evaluate_chunk(task: Tuple[str, str, str, str, tuple]) -> np.ndarray:
+    digest, geom_path, predicate, kind, payload = task
+    geom = _worker_geometry(digest, geom_path)
+    if kind == "xy":
+        return predicate_mask_xy(payload[0], payload[1], geom, predicate)
+    return predicate_mask(shapely.from_wkb(payload[0]), geom, predicate)
+
+
+class ParallelPredicatePool:
+    """Persistent process pool for ``within`` / ``intersects`` masks.
+
+    Use as a context manager or call :meth:`shutdown` when done.
+    """
+
+    def __init__(self, workers: int, min_parallel_rows: int = DEFAULT_MIN_PARALLEL_ROWS, chunks_per_worker: int = 4):
+        if workers < 1:
+            raise ValueError("The number of workers must be at least 1.")
+        self.workers = workers
+        self.min_parallel_rows = min_parallel_rows
+        self.chunks_per_worker = chunks_per_worker
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Geometry files by WKB digest, oldest first, and how many running maps use each
+        self._token = uuid.uuid4().hex
+        self._files_lock = threading.Lock()
+        self._geometry_files: "OrderedDict[str, str]" = OrderedDict()
+        self._files_in_use: Dict[str, int] = {}
+
+    def __enter__(self) -> "ParallelPredicatePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._files_lock:
+            for geom_path in self._geometry_files.values():
+                _remove_file(geom_path)
+            self._geometry_files.clear()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _chunk_bounds(self, rows: int) -> List[Tuple[int, int]]:
+        chunk_count = min(self.workers * self.chunks_per_worker, rows)
+        bounds = np.linspace(0, rows, chunk_count + 1).astype(int)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def mask(self, geometries: np.ndarray, geom: shapely_base.BaseGeometry, predicate: str) -> np.ndarray:
+        """Boolean mask of ``geometries`` satisfying ``predicate`` against ``geom``."""
+        geometries = np.asarray(geometries, dtype=object)
+        if len(geometries) < max(self.min_parallel_rows, 1):
+            return predicate_mask(geometries, geom, predicate)
+
+        coords = point_coordinates(geometries)
+        if coords is not None:
+            return self.mask_xy(coords[:, 0], coords[:, 1], geom, predicate)
+        wkb = shapely.to_wkb(geometries)
+        return self._map(geom, predicate, [("wkb", (wkb[a:b],)) for a, b in self._chunk_bounds(len(wkb))])
+
+    def mask_xy(self, x: np.ndarray, y: np.ndarray, geom: shapely_base.BaseGeometry, predicate: str) -> np.ndarray:
+        """Boolean mask of the points ``(x, y)`` satisfying ``predicate`` against ``geom``."""
+        if len(x) < max(self.min_parallel_rows, 1):
+            return predicate_mask_xy(x, y, geom, predicate)
+        return self._map(geom, predicate, [("xy", (x[a:b], y[a:b])) for a, b in self._chunk_bounds(len(x))])
+
+    def _acquire_geometry_file(self, geom: shapely_base.BaseGeometry) -> Tuple[str, str]:
+        """Digest and path of the WKB file of ``geom``, written only if this pool has none yet."""
+        wkb = shapely.to_wkb(geom)
+        digest = hashlib.sha256(wkb).hexdigest()
+        with self._files_lock:
+            geom_path = self._geometry_files.get(digest)
+            if geom_path is None:
+                geom_path = os.path.join(tempfile.gettempdir(), f"gis_points_geom_{self._token}_{digest}.wkb")
+                with open(geom_path, "wb") as fh:
+                    fh.write(wkb)
+                self._geometry_files[digest] = geom_path
+            self._geometry_files.move_to_end(digest)
+            self._files_in_use[digest] = self._files_in_use.get(digest, 0) + 1
+        return digest, geom_path
+
+    def _release_geometry_file(self, digest: str) -> None:
+        with self._files_lock:
+            self._files_in_use[digest] -= 1
+            if not self._files_in_use[digest]:
+                del self._files_in_use[digest]
+            idle = [key for key in self._geometry_files if key not in self._files_in_use]
+            for key in idle[:max(len(self._geometry_files) - _GEOMETRY_FILES, 0)]:
+                _remove_file(self._geometry_files.pop(key))
+
+    def _map(self, geom: shapely_base.BaseGeometry, predicate: str, payloads: List[Tuple[str, tuple]]) -> np.ndarray:
+        digest, geom_path = self._acquire_geometry_file(geom)
+        try:
+            tasks = [(digest, geom_path, predicate, kind, payload) for kind, payload in payloads]
+            masks = list(self._pool().map(_evaluate_chunk, tasks))
+        finally:
+            self._release_geometry_file(digest)
+        return np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
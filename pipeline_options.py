@@ -0,0 +1,56 @@
+"""
+Option values shared by the CLI, the web app and the extraction engine.
+
+Only the standard library is imported here, so the CLI can build its argument
+parser - and answer ``--help`` or report a bad argument - without loading
+geopandas, shapely or pyproj. The modules that implement each option import
+these names from here.
+"""
+
+import importlib.util
+from typing import List, Optional
+
+SUPPORTED_PREDICATES = ("within", "intersects")
+# Points matching several polygons: keep the first polygon in layer order, or one row per polygon
+JOIN_TIE_POLICIES = ("first", "all")
+# Points matching no polygon: leave them out, or keep them with an empty name
+JOIN_UNMATCHED_POLICIES = ("drop", "keep")
+# Layers in different CRSs: move the points to the polygons' CRS, or the polygons to the points'
+REPROJECT_MODES = ("points", "polygons")
+
+OUTPUT_FORMATS = ("csv", "parquet", "feather", "gpkg", "geojsonseq")
+GEOMETRY_MODES = ("none", "wkb", "xy")
+ARROW_FORMATS = ("parquet", "feather")
+
+OUTPUT_EXTENSIONS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "gpkg": ".gpkg",
+    "geojsonseq": ".geojsonl",
+}
+
+OUTPUT_MIMETYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "gpkg": "application/geopackage+sqlite3",
+    "geojsonseq": "application/geo+json-seq",
+}
+
+
+def check_output_format(output_format: str, geometry: str = "none") -> None:
+    """Raise ValueError for an unknown format/geometry mode, or if pyarrow is needed but missing."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    if geometry not in GEOMETRY_MODES:
+        raise ValueError(f"Unsupported geometry mode: {geometry}")
+    if output_format in ARROW_FORMATS and importlib.util.find_spec("pyarrow") is None:
+        raise ValueError(f"Writing {output_format} needs 'pyarrow'. Install it or use another output format.")
+
+
+def parse_columns(value: Optional[str]) -> Optional[List[str]]:
+    """Column names from a comma-separated list, in order without repeats (None stays None: all columns)."""
+    if value is None:
+        return None
+    return list(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
@@ -0,0 +1,277 @@
+"""
+Spatial-index backed point selection shared by the CLI and the web app.
+
+Instead of evaluating the predicate against every point in the layer, the
+points' STRtree (``GeoDataFrame.sindex``) is queried with the union geometry's
+bounds first, and the exact ``within`` / ``intersects`` test only runs on the
+surviving candidates. The result is identical to ``points.within(geom)`` /
+``points.intersects(geom)``, in the original row order. The exact test can be
+spread over a :class:`parallel_selection.ParallelPredicatePool`.
+
+Layers of simple points take a fast path: their coordinates are pulled into
+NumPy arrays, pruned with a vectorized bounding-box comparison and tested with
+``shapely.contains_xy`` / ``intersects_xy``, so neither an STRtree nor point
+objects are needed. Multi-points, empty or missing geometries and other types
+use the STRtree path, as do layers whose index is already built (the dataset
+registry's), so a query does not pay for the whole layer's coordinates;
+simple-point candidates then still take the x/y test. Against polygons with many vertices the fast path tests
+the points cell by cell of a :class:`polygon_tiles.TiledGeometry`, so only
+points near the boundary meet (a clipped piece of) the polygon's edges, once
+enough points have been tested against the polygon to repay building it.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import base as shapely_base
+
+from parallel_selection import ParallelPredicatePool, point_coordinates, predicate_mask, predicate_mask_xy
+from pipeline_options import JOIN_TIE_POLICIES, JOIN_UNMATCHED_POLICIES, SUPPORTED_PREDICATES  # noqa: F401 (re-exported)
+from polygon_tiles import tiled_geometry
+
+# Fewer candidates than this are tested against the polygon directly
+MIN_TILED_CANDIDATES = 10000
+
+
+def select_points(
+    points: gpd.GeoDataFrame,
+    geom: shapely_base.BaseGeometry,
+    predicate: str,
+    stats: Optional[Dict[str, float]] = None,
+    pool: Optional[ParallelPredicatePool] = None,
+) -> gpd.GeoDataFrame:
+    """Return the rows of ``points`` that satisfy ``predicate`` against ``geom``.
+
+    If ``stats`` is given it is filled with the candidate counts and per-stage
+    timings (see :func:`format_selection_stats`). With a ``pool`` the exact
+    test runs in its worker processes.
+    """
+    if predicate not in SUPPORTED_PREDICATES:
+        raise ValueError(f"Unsupported predicate: {predicate}")
+
+    total = len(points)
+    start = time.perf_counter()
+
+    # Stage 1: a spatial index built ahead of time (e.g. by the dataset registry), coordinate
+    # arrays for simple points, otherwise a new spatial index
+    coords = None if points.has_sindex else point_coordinates(np.asarray(points.geometry.array))
+    sindex = points.sindex if coords is None else None
+    index_done = time.perf_counter()
+
+    # Stage 2: bounding-box candidates
+    if coords is not None:
+        minx, miny, maxx, maxy = geom.bounds
+        x, y = coords[:, 0], coords[:, 1]
+        candidate_positions = np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+    else:
+        # Multi-part unions are queried part by part so the gaps between parts are pruned as well
+        parts = shapely.get_parts(geom)
+        if len(parts) > 1:
+            candidate_positions = np.unique(sindex.query(parts)[1])
+        else:
+            candidate_positions = np.sort(sindex.query(geom))
+    bbox_done = time.perf_counter()
+
+    # Stage 3: exact predicate on the survivors only
+    if coords is not None:
+        candidates = None
+        candidate_x, candidate_y = x[candidate_positions], y[candidate_positions]
+    else:
+        candidates = np.asarray(points.geometry.array)[candidate_positions]
+        # Simple-point candidates found through the index still take the x/y test
+        candidate_coords = point_coordinates(candidates)
+        if candidate_coords is not None:
+            candidates = None
+            candidate_x, candidate_y = candidate_coords[:, 0], candidate_coords[:, 1]
+    if candidates is None:
+        tiles = (tiled_geometry(geom, len(candidate_positions))
+                 if pool is None and len(candidate_positions) >= MIN_TILED_CANDIDATES else None)
+        if pool is not None:
+            exact = pool.mask_xy(candidate_x, candidate_y, geom, predicate)
+        elif tiles is not None:
+            exact = tiles.mask_xy(candidate_x, candidate_y, predicate)
+        else:
+            exact = predicate_mask_xy(candidate_x, candidate_y, geom, predicate)
+    elif pool is not None:
+        exact = pool.mask(candidates, geom, predicate)
+    else:
+        exact = predicate_mask(candidates, geom, predicate)
+    selected_positions = candidate_positions[exact]
+    exact_done = time.perf_counter()
+
+    if stats is not None:
+        stats.update(
+            total=total,
+            candidates=len(candidate_positions),
+            selected=len(selected_positions),
+            index_seconds=index_done - start,
+            bbox_seconds=bbox_done - index_done,
+            exact_seconds=exact_done - bbox_done,
+        )
+    return points.iloc[selected_positions]
+
+
+def merge_stats(total: Dict[str, float], stats: Dict[str, float]) -> Dict[str, float]:
+    """Add the counters and timings in ``stats`` to ``total`` (e.g. across chunks)."""
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def format_selection_stats(stats: Dict[str, float]) -> str:
+    total = int(stats.get("total", 0))
+    candidates = int(stats.get("candidates", 0))
+    selected = int(stats.get("selected", 0))
+    pruned = 100.0 * (1 - candidates / total) if total else 0.0
+    return (
+        f"Selection: {total} points -> {candidates} bbox candidates ({pruned:.1f}% pruned) -> {selected} selected "
+        f"[index {stats.get('index_seconds', 0.0):.3f}s, bbox {stats.get('bbox_seconds', 0.0):.3f}s, "
+        f"exact {stats.get('exact_seconds', 0.0):.3f}s]"
+    )
+
+
+def select_points_by_geometries(
+    points: gpd.GeoDataFrame,
+    geoms: gpd.GeoSeries,
+    predicate: str,
+    stats: Optional[Dict[str, float]] = None,
+) -> List[np.ndarray]:
+    """Spatially join ``points`` against many geometries in one bulk STRtree query.
+
+    Returns, for every geometry in ``geoms``, the sorted row positions of the
+    points that satisfy ``predicate`` against it. Each array matches what
+    :func:`select_points` would select for that geometry on its own.
+    """
+    if predicate not in SUPPORTED_PREDICATES:
+        raise ValueError(f"Unsupported predicate: {predicate}")
+
+    start = time.perf_counter()
+    sindex = points.sindex
+    index_done = time.perf_counter()
+
+    # "point within polygon" is "polygon contains point" from the tree's side
+    tree_predicate = "contains" if predicate == "within" else "intersects"
+    geom_idx, point_idx = sindex.query(np.asarray(geoms), predicate=tree_predicate)
+    order = np.lexsort((point_idx, geom_idx))
+    geom_idx, point_idx = geom_idx[order], point_idx[order]
+    splits = np.searchsorted(geom_idx, np.arange(1, len(geoms)))
+    query_done = time.perf_counter()
+
+    if stats is not None:
+        stats.update(
+            total=len(points),
+            geometries=len(geoms),
+            matches=len(point_idx),
+            index_seconds=index_done - start,
+            join_seconds=query_done - index_done,
+        )
+    if len(geoms) == 0:
+        return []
+    return np.split(point_idx, splits)
+
+
+def join_points_to_polygons(
+    points: gpd.GeoDataFrame,
+    polygons: gpd.GeoDataFrame,
+    predicate: str,
+    stats: Optional[Dict[str, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Match every point against all polygons in one bulk query of the polygons' STRtree.
+
+    Returns the ``(point_positions, polygon_positions)`` of all matching pairs,
+    sorted by point and then by polygon (layer order). The polygons' index is
+    built once and reused for later chunks of points.
+    """
+    if predicate not in SUPPORTED_PREDICATES:
+        raise ValueError(f"Unsupported predicate: {predicate}")
+
+    start = time.perf_counter()
+    sindex = polygons.sindex
+    index_done = time.perf_counter()
+
+    point_idx, polygon_idx = sindex.query(np.asarray(points.geometry.array), predicate=predicate)
+    order = np.lexsort((polygon_idx, point_idx))
+    point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+    query_done = time.perf_counter()
+
+    if stats is not None:
+        repeated = point_idx[1:] == point_idx[:-1]
+        stats.update(
+            total=len(points),
+            geometries=len(polygons),
+            matches=len(point_idx),
+            matched_points=len(point_idx) - int(np.count_nonzero(repeated)),
+            # Count each point with several matches once (the start of each run of repeats)
+            tied_points=int(np.count_nonzero(repeated & ~np.r_[False, repeated[:-1]])),
+            index_seconds=index_done - start,
+            join_seconds=query_done - index_done,
+        )
+    return point_idx, polygon_idx
+
+
+def tag_points_with_names(
+    points: gpd.GeoDataFrame,
+    polygons: gpd.GeoDataFrame,
+    name_column: str,
+    predicate: str,
+    ties: str = "first",
+    unmatched: str = "drop",
+    name_field: Optional[str] = None,
+    stats: Optional[Dict[str, float]] = None,
+    extra_fields: Optional[Dict[str, str]] = None,
+) -> gpd.GeoDataFrame:
+    """Add the ``name_column`` value of the polygon each point falls in, as ``name_field``.
+
+    ``ties`` decides what happens to points matching several polygons
+    (overlaps, or shared boundaries with ``intersects``): ``"first"`` keeps
+    the first polygon in layer order, ``"all"`` repeats the point once per
+    polygon. ``unmatched`` drops points outside every polygon or keeps them
+    with an empty name. Points stay in their original order.
+    ``extra_fields`` (``{polygon column: field}``) copies further polygon
+    attributes the same way.
+    """
+    if ties not in JOIN_TIE_POLICIES:
+        raise ValueError(f"Unsupported tie policy: {ties}")
+    if unmatched not in JOIN_UNMATCHED_POLICIES:
+        raise ValueError(f"Unsupported unmatched policy: {unmatched}")
+
+    point_idx, polygon_idx = join_points_to_polygons(points, polygons, predicate, stats=stats)
+    if ties == "first" and len(point_idx):
+        first = np.r_[True, point_idx[1:] != point_idx[:-1]]
+        point_idx, polygon_idx = point_idx[first], polygon_idx[first]
+    if unmatched == "keep":
+        matched = np.zeros(len(points), dtype=bool)
+        matched[point_idx] = True
+        missing = np.flatnonzero(~matched)
+        point_idx = np.concatenate([point_idx, missing])
+        polygon_idx = np.concatenate([polygon_idx, np.full(len(missing), -1, dtype=polygon_idx.dtype)])
+        # Stable, so the polygons of one point stay in layer order
+        order = np.argsort(point_idx, kind="stable")
+        point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+
+    tagged = points.iloc[point_idx].copy()
+    fields = {name_column: name_field or name_column}
+    fields.update(extra_fields or {})
+    for column, field in fields.items():
+        values = polygons[column]
+        if unmatched == "keep":
+            values = _nullable(values)
+        # -1 (no polygon) becomes a missing value of the column's type
+        tagged[field] = pd.api.extensions.take(values.array, polygon_idx, allow_fill=True)
+    return tagged
+
+
+def _nullable(values: pd.Series) -> pd.Series:
+    # NumPy integer and bool columns would become float64 (or object) once
+    # missing values are filled in: cast them to the pandas nullable dtypes
+    # (every chunk, so they all share one schema).
+    dtype = values.dtype
+    if not isinstance(dtype, np.dtype) or dtype.kind not in "iub":
+        return values
+    if dtype.kind == "b":
+        return values.astype("boolean")
+    return values.astype(f"{'U' if dtype.kind == 'u' else ''}Int{dtype.itemsize * 8}")
@@ -0,0 +1,317 @@
+"""
+On-disk, memory-mapped store of a point layer for repeated CLI extractions.
+
+``extract_points_in_polygon.py index`` converts a point layer once into a
+directory holding:
+
+- ``x.npy`` / ``y.npy``: the coordinates, sorted along a Hilbert curve over
+  the layer's extent so that nearby points sit in the same pages;
+- ``row_ids.npy``: each stored point's row number in the source layer;
+- ``pages.npy``: the bounding box of every page of ``page_rows`` consecutive
+  points;
+- ``attributes.arrow``: the attribute table as an uncompressed Arrow IPC file
+  with one record batch per page;
+- ``store.json``: the manifest (row count, page size, CRS, source file).
+
+Everything is memory-mapped, so a query only loads the pages whose bounding
+box overlaps the target polygon's bounds; the rows it returns are put back in
+the source layer's order, so the output matches a direct read of the file.
+Only layers of single, non-empty points can be stored.
+
+Building and reading a store needs ``pyarrow``; without it
+:data:`STORE_AVAILABLE` is False.
+"""
+
+import datetime
+import json
+import os
+import shutil
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import geopandas as gpd
+import numpy as np
+from pyproj import CRS
+
+from chunked_io import check_columns, iter_file_chunks
+from extraction import PointSource
+from parallel_selection import point_coordinates
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+STORE_AVAILABLE = pyarrow is not None
+
+BBox = Tuple[float, float, float, float]
+
+STORE_VERSION = 1
+MANIFEST_NAME = "store.json"
+DEFAULT_PAGE_ROWS = 65536
+# Cells per axis of the Hilbert curve: 2**16 x 2**16 over the layer's extent
+HILBERT_LEVEL = 16
+
+_ATTRIBUTES_NAME = "attributes.arrow"
+
+
+def is_points_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def hilbert_keys(x: np.ndarray, y: np.ndarray, bounds: BBox, level: int = HILBERT_LEVEL) -> np.ndarray:
+    """Distance along a Hilbert curve of each point, on a ``2**level`` grid over ``bounds``."""
+    side = 1 << level
+    minx, miny, maxx, maxy = bounds
+    width = (maxx - minx) or 1.0
+    height = (maxy - miny) or 1.0
+    ix = np.clip(((x - minx) / width * (side - 1)).astype(np.int64), 0, side - 1)
+    iy = np.clip(((y - miny) / height * (side - 1)).astype(np.int64), 0, side - 1)
+    keys = np.zeros(len(ix), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx = (ix & s) > 0
+        ry = (iy & s) > 0
+        keys += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve stays continuous
+        flip = rx & ~ry
+        ix = np.where(flip, side - 1 - ix, ix)
+        iy = np.where(flip, side - 1 - iy, iy)
+        ix, iy = np.where(ry, ix, iy), np.where(ry, iy, ix)
+        s //= 2
+    return keys
+
+
+def _attribute_table(chunk: gpd.GeoDataFrame, schema=None):
+    table = pyarrow.Table.from_pandas(chunk.drop(columns=[chunk.geometry.name]), preserve_index=False)
+    if schema is None:
+        # Columns that are all missing in the first chunk are typed as strings
+        return table.cast(pyarrow.schema([
+            field.with_type(pyarrow.string()) if pyarrow.types.is_null(field.type) else field
+            for field in table.schema
+        ], metadata=table.schema.metadata))
+    return table.replace_schema_metadata(schema.metadata).cast(schema)
+
+
+def _source_info(path: str) -> Dict[str, object]:
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_store(points_path: str, store_dir: str, layer: Optional[str] = None,
+                page_rows: int = DEFAULT_PAGE_ROWS, chunk_size: Optional[int] = 500000) -> Dict[str, object]:
+    """Convert the point layer at ``points_path`` into a store at ``store_dir`` and return its manifest.
+
+    The layer is read in chunks of ``chunk_size`` rows; only the coordinates
+    are held in memory for the Hilbert sort, the attributes are spooled to
+    disk. An existing store at ``store_dir`` is replaced once the new one is
+    complete.
+    """
+    if not STORE_AVAILABLE:
+        raise ImportError("The points store needs 'pyarrow'. Install it to use 'index'.")
+    if page_rows <= 0:
+        raise ValueError("Page size must be a positive number of rows.")
+
+    parent = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(staging)
+    try:
+        # Pass 1: coordinates in memory, attributes spooled in file order
+        spool_path = os.path.join(staging, "spool.arrow")
+        xs, ys = [], []
+        crs = None
+        geometry_name = "geometry"
+        schema = None
+        spool = None
+        try:
+            for chunk in iter_file_chunks(points_path, chunk_size, layer):
+                if schema is None:
+                    crs = chunk.crs
+                    geometry_name = chunk.geometry.name
+                if len(chunk):
+                    coords = point_coordinates(np.asarray(chunk.geometry.array))
+                    if coords is None:
+                        raise ValueError("The points store holds single points only; this layer has "
+                                         "multi-part, empty or missing geometries.")
+                    xs.append(coords[:, 0])
+                    ys.append(coords[:, 1])
+                table = _attribute_table(chunk, schema)
+                if spool is None:
+                    schema = table.schema
+                    spool = pyarrow.ipc.new_file(spool_path, schema)
+                spool.write_table(table)
+        finally:
+            if spool is not None:
+                spool.close()
+
+        x = np.concatenate(xs) if xs else np.empty(0)
+        y = np.concatenate(ys) if ys else np.empty(0)
+        rows = len(x)
+        bounds = (float(x.min()), float(y.min()), float(x.max()), float(y.max())) if rows else None
+        row_ids = (np.argsort(hilbert_keys(x, y, bounds), kind="stable") if rows
+                   else np.empty(0, dtype=np.int64))
+        np.save(os.path.join(staging, "x.npy"), x[row_ids])
+        np.save(os.path.join(staging, "y.npy"), y[row_ids])
+        np.save(os.path.join(staging, "row_ids.npy"), row_ids)
+        del xs, ys, x, y
+
+        x = np.load(os.path.join(staging, "x.npy"), mmap_mode="r")
+        y = np.load(os.path.join(staging, "y.npy"), mmap_mode="r")
+        starts = np.arange(0, rows, page_rows)
+        if rows:
+            pages = np.column_stack([
+                np.minimum.reduceat(x, starts), np.minimum.reduceat(y, starts),
+                np.maximum.reduceat(x, starts), np.maximum.reduceat(y, starts),
+            ])
+        else:
+            pages = np.empty((0, 4))
+        np.save(os.path.join(staging, "pages.npy"), pages)
+
+        # Pass 2: the attributes in Hilbert order, one record batch per page
+        with pyarrow.memory_map(spool_path) as source:
+            spooled = pyarrow.ipc.open_file(source).read_all()
+            with pyarrow.ipc.new_file(os.path.join(staging, _ATTRIBUTES_NAME), schema) as writer:
+                for start in starts:
+                    page = spooled.take(row_ids[start:start + page_rows]).combine_chunks()
+                    writer.write_batch(page.to_batches()[0])
+            del spooled
+        os.remove(spool_path)
+
+        manifest = {
+            "version": STORE_VERSION,
+            "rows": rows,
+            "page_rows": page_rows,
+            "pages": len(starts),
+            "bounds": bounds,
+            "crs": crs.to_wkt() if crs is not None else None,
+            "geometry_column": geometry_name,
+            "source": dict(_source_info(points_path), layer=layer),
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, indent=2)
+
+        if os.path.isdir(store_dir):
+            shutil.rmtree(store_dir)
+        os.replace(staging, store_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+class PointsStore:
+    """A store written by :func:`build_store`, opened memory-mapped."""
+
+    def __init__(self, store_dir: str):
+        if not STORE_AVAILABLE:
+            raise ImportError("The points store needs 'pyarrow'. Install it or pass the point layer itself.")
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, MANIFEST_NAME), "r", encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        if self.manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported points store version {self.manifest.get('version')} in {store_dir}; "
+                             "rebuild it with 'index'.")
+        self.page_rows = self.manifest["page_rows"]
+        self.x = np.load(os.path.join(store_dir, "x.npy"), mmap_mode="r")
+        self.y = np.load(os.path.join(store_dir, "y.npy"), mmap_mode="r")
+        self.row_ids = np.load(os.path.join(store_dir, "row_ids.npy"), mmap_mode="r")
+        self.pages = np.load(os.path.join(store_dir, "pages.npy"))
+        self._attributes = pyarrow.ipc.open_file(pyarrow.memory_map(os.path.join(store_dir, _ATTRIBUTES_NAME)))
+        self.crs = CRS.from_wkt(self.manifest["crs"]) if self.manifest["crs"] else None
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def is_stale(self) -> bool:
+        """True if the source layer changed (or moved) since the store was built."""
+        source = self.manifest["source"]
+        try:
+            current = _source_info(source["path"])
+        except OSError:
+            return False  # Source not available here; nothing to compare with
+        return current["size"] != source["size"] or current["mtime"] != source["mtime"]
+
+    def pages_in(self, bbox: Optional[BBox]) -> np.ndarray:
+        """Numbers of the pages whose bounding box intersects ``bbox`` (all pages for None)."""
+        if bbox is None:
+            return np.arange(len(self.pages))
+        minx, miny, maxx, maxy = bbox
+        pages = self.pages
+        return np.flatnonzero((pages[:, 0] <= maxx) & (pages[:, 2] >= minx)
+                              & (pages[:, 1] <= maxy) & (pages[:, 3] >= miny))
+
+    def positions_in(self, bbox: Optional[BBox]) -> np.ndarray:
+        """Store positions of the points inside ``bbox``, in source layer order."""
+        if bbox is None:
+            return np.argsort(self.row_ids)
+        minx, miny, maxx, maxy = bbox
+        found = []
+        for page in self.pages_in(bbox):
+            start = page * self.page_rows
+            x = self.x[start:start + self.page_rows]
+            y = self.y[start:start + self.page_rows]
+            found.append(start + np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy)))
+        positions = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+        return positions[np.argsort(self.row_ids[positions], kind="stable")]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._attributes.schema.names)
+
+    def read(self, positions: np.ndarray, columns: Optional[Sequence[str]] = None) -> gpd.GeoDataFrame:
+        """The points at store ``positions``, in that order, indexed by their source row number.
+
+        Only the attribute ``columns`` are read (None: all).
+        """
+        # Take from each touched page in turn, then restore the requested order
+        by_position = np.argsort(positions, kind="stable")
+        sorted_positions = positions[by_position]
+        page_numbers = sorted_positions // self.page_rows
+        bounds = np.flatnonzero(np.diff(page_numbers)) + 1
+        parts = []
+        for page_positions in np.split(sorted_positions, bounds) if len(positions) else []:
+            page = int(page_positions[0] // self.page_rows)
+            batch = self._attributes.get_batch(page)
+            if columns is not None:
+                batch = batch.select(list(columns))
+            parts.append(batch.take(pyarrow.array(page_positions - page * self.page_rows)))
+        if parts:
+            table = pyarrow.Table.from_batches(parts)
+            inverse = np.empty_like(by_position)
+            inverse[by_position] = np.arange(len(by_position))
+            table = table.take(pyarrow.array(inverse))
+        else:
+            table = self._attributes.schema.empty_table()
+            if columns is not None:
+                table = table.select(list(columns))
+        frame = table.to_pandas()
+        frame.index = np.asarray(self.row_ids[positions])
+        frame[self.manifest["geometry_column"]] = gpd.points_from_xy(self.x[positions], self.y[positions], crs=self.crs)
+        return gpd.GeoDataFrame(frame, geometry=self.manifest["geometry_column"], crs=self.crs)
+
+
+class StorePointSource(PointSource):
+    """Points served from a :class:`PointsStore`, ``chunk_size`` rows at a time (None: all at once).
+
+    With ``columns`` only those attributes are read from the store.
+    """
+
+    def __init__(self, store: PointsStore, chunk_size: Optional[int] = None,
+                 columns: Optional[Sequence[str]] = None):
+        check_columns(store.columns, columns, "the points store")
+        self.store = store
+        self.chunk_size = chunk_size
+        self.columns = columns
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        return self.store.crs
+
+    def chunks(self, bbox: Optional[BBox] = None) -> Iterator[gpd.GeoDataFrame]:
+        positions = self.store.positions_in(bbox)
+        step = self.chunk_size or max(len(positions), 1)
+        for start in range(0, max(len(positions), 1), step):
+            yield self.store.read(positions[start:start + step], self.columns)
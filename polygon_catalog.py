@@ -0,0 +1,145 @@
+"""
+Name index over a polygon layer with memoized, prepared union geometries.
+
+A :class:`PolygonCatalog` is built once per polygon layer and name column. It
+maps normalized names to row positions, so lookups no longer lower-case the
+whole column, and keeps the unioned geometry of recently used names (prepared
+with ``shapely.prepare`` for fast predicates) in an LRU cache, so repeated
+lookups of the same district skip the union.
+
+Name matching follows ``filter_polygons_by_name``: exact comparison when case
+sensitive, otherwise ``str(value).lower()`` on both sides.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import base as shapely_base
+
+
+def name_key(name_value, case_sensitive: bool) -> Hashable:
+    return name_value if case_sensitive else str(name_value).lower()
+
+
+def name_keys(polygons: gpd.GeoDataFrame, name_column: str, case_sensitive: bool) -> pd.Series:
+    if case_sensitive:
+        return polygons[name_column]
+    return polygons[name_column].astype(str).str.lower()
+
+
+def check_name_column(polygons: gpd.GeoDataFrame, name_column: str) -> None:
+    if name_column not in polygons.columns:
+        raise KeyError(
+            f"Column '{name_column}' not found in polygons. Available columns: {list(polygons.columns)}"
+        )
+
+
+def prepare_geometry(geom: shapely_base.BaseGeometry) -> shapely_base.BaseGeometry:
+    """Prepare ``geom`` in place and build its lazy GEOS structures up front.
+
+    The warm-up calls mean concurrent requests sharing a cached geometry only
+    ever read the prepared structures.
+    """
+    shapely.prepare(geom)
+    if not geom.is_empty:
+        probe = geom.representative_point()
+        shapely.contains(geom, probe)
+        shapely.intersects(geom, probe)
+    return geom
+
+
+class PolygonCatalog:
+    """Lookup of polygons by name with an LRU cache of at most ``max_unions`` unions."""
+
+    def __init__(self, polygons: gpd.GeoDataFrame, name_column: str, max_unions: int = 256):
+        check_name_column(polygons, name_column)
+        self.polygons = polygons
+        self.name_column = name_column
+        self.max_unions = max_unions
+        self.union_hits = 0
+        self.union_misses = 0
+        self._positions: Dict[bool, Dict[Hashable, np.ndarray]] = {}
+        self._unions: "OrderedDict[tuple, shapely_base.BaseGeometry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _positions_by_key(self, case_sensitive: bool) -> Dict[Hashable, np.ndarray]:
+        with self._lock:
+            if case_sensitive not in self._positions:
+                keys = name_keys(self.polygons, self.name_column, case_sensitive)
+                # groupby drops missing keys, which never compare equal anyway
+                self._positions[case_sensitive] = self.polygons.groupby(keys.to_numpy(), sort=False).indices
+            return self._positions[case_sensitive]
+
+    def positions(self, name_value, case_sensitive: bool) -> np.ndarray:
+        """Row positions of the polygons matching ``name_value``, in layer order."""
+        empty = np.empty(0, dtype=np.intp)
+        return self._positions_by_key(case_sensitive).get(name_key(name_value, case_sensitive), empty)
+
+    def matched(self, name_value, case_sensitive: bool) -> gpd.GeoDataFrame:
+        """Same rows as ``filter_polygons_by_name`` for this layer and column."""
+        return self.polygons.iloc[self.positions(name_value, case_sensitive)]
+
+    def labels(self, case_sensitive: bool) -> Dict[Hashable, object]:
+        """Map each distinct (normalized) name to its first spelling in the layer."""
+        named = self.polygons[self.polygons[self.name_column].notna()]
+        labels = {}
+        for key, label in zip(name_keys(named, self.name_column, case_sensitive), named[self.name_column]):
+            labels.setdefault(key, label)
+        return labels
+
+    def union(self, name_value, case_sensitive: bool) -> shapely_base.BaseGeometry:
+        """Prepared union of the polygons matching ``name_value``.
+
+        The returned geometry is shared between callers and must not be modified.
+        """
+        key = (case_sensitive, name_key(name_value, case_sensitive))
+        with self._lock:
+            if key in self._unions:
+                self._unions.move_to_end(key)
+                self.union_hits += 1
+                return self._unions[key]
+            self.union_misses += 1
+
+        positions = self.positions(name_value, case_sensitive)
+        if len(positions) == 0:
+            raise ValueError("No polygons matched the given name.")
+        geom = prepare_geometry(shapely.union_all(np.asarray(self.polygons.geometry.iloc[positions])))
+
+        with self._lock:
+            self._unions[key] = geom
+            self._unions.move_to_end(key)
+            while len(self._unions) > self.max_unions:
+                self._unions.popitem(last=False)
+        return geom
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cached_unions": len(self._unions), "union_hits": self.union_hits, "union_misses": self.union_misses}
+
+
+class CatalogCache:
+    """Small LRU of catalogs keyed by (layer id, name column), for long-running processes."""
+
+    def __init__(self, max_catalogs: int = 16):
+        self.max_catalogs = max_catalogs
+        self._catalogs: "OrderedDict[tuple, PolygonCatalog]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, layer_id: str, name_column: str, load_polygons: Callable[[], gpd.GeoDataFrame]) -> PolygonCatalog:
+        """Catalog for ``layer_id``; ``load_polygons`` is only called when it is not cached."""
+        key = (layer_id, name_column)
+        with self._lock:
+            if key in self._catalogs:
+                self._catalogs.move_to_end(key)
+                return self._catalogs[key]
+        catalog = PolygonCatalog(load_polygons(), name_column)
+        with self._lock:
+            self._catalogs[key] = catalog
+            while len(self._catalogs) > self.max_catalogs:
+                self._catalogs.popitem(last=False)
+        return catalog
@@ -0,0 +1,269 @@
+"""
+Grid-tiled decomposition of large polygons for the point-in-polygon test.
+
+A polygon with hundreds of thousands of vertices (a coastline, a river
+boundary) makes every ``contains_xy`` call expensive, even for points deep
+inside it. :class:`TiledGeometry` lays a grid over the polygon's bounds and
+classifies each cell as inside, outside or on the boundary. Points in inside
+and outside cells are resolved by a cell lookup; points in boundary cells are
+tested against the polygon clipped to a slightly padded cell, a piece with a
+few hundred vertices at most.
+
+Results are identical to testing the whole polygon. The clipped pieces are
+built by recursive bisection (each level clips the previous level's piece), so
+the clip boxes' edges are the only place where computed vertices appear. The
+piece segments that end on a clip box edge ("seams") may deviate from the
+original edges by rounding, so points within a hair of a seam are tested
+against the whole polygon, and a cell near a seam is never classified inside
+or outside.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import base as shapely_base
+
+from parallel_selection import predicate_mask_xy
+
+# Polygons with fewer vertices are fast enough to test directly
+MIN_TILED_VERTICES = 10000
+# Grid cells per axis: about one per thousand vertices, within these bounds
+MIN_CELLS = 16
+MAX_CELLS = 512
+# Decompositions kept for reuse across chunks and requests
+_CACHE_SIZE = 8
+# A decomposition is built once this many point tests per vertex have been asked for its polygon
+TESTS_PER_VERTEX = 4
+# Geometries whose point tests are counted towards that
+_TESTS_CACHE_SIZE = 64
+# Size of the point x seam matrices compared at once
+_PAIRS_PER_BLOCK = 1 << 20
+# Clip boxes extend this fraction of a cell beyond the cell
+_PAD_FRACTION = 0.01
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+
+BBox = Tuple[float, float, float, float]
+
+
+def _cells_for(vertices: int) -> int:
+    return int(np.clip(vertices // 1000, MIN_CELLS, MAX_CELLS))
+
+
+class TiledGeometry:
+    """``geom`` decomposed over a ``cells`` x ``cells`` grid (default: sized by its vertex count)."""
+
+    def __init__(self, geom: shapely_base.BaseGeometry, cells: Optional[int] = None):
+        self.geom = geom
+        self.cells = cells or _cells_for(shapely.get_num_coordinates(geom))
+        minx, miny, maxx, maxy = geom.bounds
+        self.xs = np.linspace(minx, maxx, self.cells + 1)
+        self.ys = np.linspace(miny, maxy, self.cells + 1)
+        self.pad = _PAD_FRACTION * max((maxx - minx) / self.cells, (maxy - miny) / self.cells)
+        # Rounding of computed clip vertices is far below this distance
+        self.tolerance = 1e-9 * max(max(abs(value) for value in geom.bounds), maxx - minx, maxy - miny)
+        self.classes = np.full((self.cells, self.cells), OUTSIDE, dtype=np.int8)
+        self.pieces: Dict[Tuple[int, int], Tuple[shapely_base.BaseGeometry, np.ndarray]] = {}
+        if not geom.is_empty:
+            self._split(geom, 0, self.cells, 0, self.cells)
+
+    def _bounds(self, ix0: int, ix1: int, iy0: int, iy1: int, pad: float = 0.0) -> BBox:
+        return (self.xs[ix0] - pad, self.ys[iy0] - pad, self.xs[ix1] + pad, self.ys[iy1] + pad)
+
+    def _seams(self, piece: shapely_base.BaseGeometry, clip_bounds: BBox) -> np.ndarray:
+        """The segments (rows of x0, y0, x1, y1) of ``piece`` with an end on the edge of ``clip_bounds``."""
+        parts = shapely.get_parts(piece)
+        polygonal = shapely.get_type_id(parts) == 3
+        # Lines and points only come from touching the clip box; all their segments count as seams
+        lines = np.concatenate([shapely.get_rings(parts[polygonal]), parts[~polygonal]])
+        coords, line_index = shapely.get_coordinates(lines, return_index=True)
+        if len(coords) == 0:
+            return np.empty((0, 4))
+        bxmin, bymin, bxmax, bymax = clip_bounds
+        x, y = coords[:, 0], coords[:, 1]
+        on_edge = ((np.abs(x - bxmin) <= self.tolerance) | (np.abs(x - bxmax) <= self.tolerance)
+                   | (np.abs(y - bymin) <= self.tolerance) | (np.abs(y - bymax) <= self.tolerance))
+        seam_lines = np.zeros(len(lines), dtype=bool)
+        seam_lines[len(lines) - np.count_nonzero(~polygonal):] = True
+        same_line = line_index[:-1] == line_index[1:]
+        starts = np.flatnonzero(same_line & (on_edge[:-1] | on_edge[1:] | seam_lines[line_index[:-1]]))
+        segments = np.column_stack([coords[starts], coords[starts + 1]])
+        # A point part has no segment; keep it as a zero-length one
+        single = np.flatnonzero(np.bincount(line_index, minlength=len(lines)) == 1)
+        if len(single):
+            points = coords[np.isin(line_index, single)]
+            segments = np.concatenate([segments, np.column_stack([points, points])])
+        return segments
+
+    def _seams_near(self, seams: np.ndarray, bounds: BBox) -> np.ndarray:
+        """Mask of the seams that pass within the tolerance of the box ``bounds``."""
+        xmin, ymin, xmax, ymax = (bounds[0] - self.tolerance, bounds[1] - self.tolerance,
+                                  bounds[2] + self.tolerance, bounds[3] + self.tolerance)
+        x0, y0 = seams[:, 0], seams[:, 1]
+        dx, dy = seams[:, 2] - x0, seams[:, 3] - y0
+        # Liang-Barsky: clip each segment's parameter range [0, 1] to the box
+        t0 = np.zeros(len(seams))
+        t1 = np.ones(len(seams))
+        hit = np.ones(len(seams), dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+                hit &= (p != 0) | (q >= 0)
+                ratio = q / p
+                t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+                t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+        return hit & (t0 <= t1)
+
+    def _near_seams(self, x: np.ndarray, y: np.ndarray, seams: np.ndarray) -> np.ndarray:
+        """Mask of the points within the tolerance of any of ``seams``."""
+        near = np.zeros(len(x), dtype=bool)
+        x0, y0, x1, y1 = seams.T
+        lo_x, hi_x = np.minimum(x0, x1) - self.tolerance, np.maximum(x0, x1) + self.tolerance
+        lo_y, hi_y = np.minimum(y0, y1) - self.tolerance, np.maximum(y0, y1) + self.tolerance
+        # Blocks of points keep the point x seam comparison matrix small
+        block = max(1, _PAIRS_PER_BLOCK // len(seams))
+        for start in range(0, len(x), block):
+            bx, by = x[start:start + block, None], y[start:start + block, None]
+            point_index, seam_index = np.nonzero((bx >= lo_x) & (bx <= hi_x) & (by >= lo_y) & (by <= hi_y))
+            if len(point_index) == 0:
+                continue
+            px, py = bx[point_index, 0], by[point_index, 0]
+            sx, sy = x0[seam_index], y0[seam_index]
+            dx, dy = x1[seam_index] - sx, y1[seam_index] - sy
+            length2 = dx * dx + dy * dy
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(length2 > 0, np.clip(((px - sx) * dx + (py - sy) * dy) / length2, 0.0, 1.0), 0.0)
+            close = np.hypot(px - (sx + t * dx), py - (sy + t * dy)) <= self.tolerance
+            near[start + point_index[close]] = True
+        return near
+
+    def _split(self, piece: shapely_base.BaseGeometry, ix0: int, ix1: int, iy0: int, iy1: int) -> None:
+        """Classify the cells of the range, given ``piece``: the polygon clipped to the range's padded box."""
+        if piece.is_empty:
+            return  # All outside
+        clip_bounds = self._bounds(ix0, ix1, iy0, iy1, self.pad)
+        cells_bounds = self._bounds(ix0, ix1, iy0, iy1)
+        seams = self._seams(piece, clip_bounds)
+        # Seams elsewhere in the padding can't affect the cells
+        seams = seams[self._seams_near(seams, cells_bounds)]
+        if len(seams) == 0:
+            cells_box = shapely.box(*cells_bounds)
+            if shapely.contains_properly(piece, cells_box):
+                self.classes[ix0:ix1, iy0:iy1] = INSIDE
+                return
+            if shapely.disjoint(piece, cells_box):
+                return
+        if ix1 - ix0 == 1 and iy1 - iy0 == 1:
+            shapely.prepare(piece)
+            self.classes[ix0, iy0] = BOUNDARY
+            self.pieces[(ix0, iy0)] = (piece, seams)
+            return
+        if ix1 - ix0 >= iy1 - iy0:
+            middle = (ix0 + ix1) // 2
+            halves = ((ix0, middle, iy0, iy1), (middle, ix1, iy0, iy1))
+        else:
+            middle = (iy0 + iy1) // 2
+            halves = ((ix0, ix1, iy0, middle), (ix0, ix1, middle, iy1))
+        for half in halves:
+            self._split(shapely.clip_by_rect(piece, *self._bounds(*half, pad=self.pad)), *half)
+
+    def cell_counts(self) -> Dict[str, int]:
+        return {name: int(np.count_nonzero(self.classes == value))
+                for name, value in (("inside", INSIDE), ("outside", OUTSIDE), ("boundary", BOUNDARY))}
+
+    def mask_xy(self, x: np.ndarray, y: np.ndarray, predicate: str) -> np.ndarray:
+        """:func:`parallel_selection.predicate_mask_xy` against the whole polygon, resolved cell by cell."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        mask = np.zeros(len(x), dtype=bool)
+        in_grid = np.flatnonzero((x >= self.xs[0]) & (x <= self.xs[-1]) & (y >= self.ys[0]) & (y <= self.ys[-1]))
+        # Located against the same edges the cells were built from, so each point is in its cell's closed box
+        ix = np.clip(np.searchsorted(self.xs, x[in_grid], side="right") - 1, 0, self.cells - 1)
+        iy = np.clip(np.searchsorted(self.ys, y[in_grid], side="right") - 1, 0, self.cells - 1)
+        classes = self.classes[ix, iy]
+        mask[in_grid[classes == INSIDE]] = True
+
+        on_boundary = classes == BOUNDARY
+        positions = in_grid[on_boundary]
+        cell_ids = ix[on_boundary] * self.cells + iy[on_boundary]
+        order = np.argsort(cell_ids, kind="stable")
+        positions, cell_ids = positions[order], cell_ids[order]
+        splits = np.flatnonzero(np.diff(cell_ids)) + 1
+        for cell_positions, cell_id in zip(np.split(positions, splits), cell_ids[np.r_[0, splits]] if len(cell_ids) else []):
+            piece, seams = self.pieces[divmod(int(cell_id), self.cells)]
+            cell_x, cell_y = x[cell_positions], y[cell_positions]
+            cell_mask = predicate_mask_xy(cell_x, cell_y, piece, predicate)
+            if len(seams):
+                near = self._near_seams(cell_x, cell_y, seams)
+                if near.any():
+                    cell_mask[near] = predicate_mask_xy(cell_x[near], cell_y[near], self.geom, predicate)
+            mask[cell_positions] = cell_mask
+        return mask
+
+
+_cache_lock = threading.Lock()
+_tiled: "OrderedDict[int, TiledGeometry]" = OrderedDict()
+# Point tests run against each recent geometry without a decomposition: id -> (geometry, tests)
+_tests: "OrderedDict[int, Tuple[shapely_base.BaseGeometry, int]]" = OrderedDict()
+# One lock per geometry being decomposed: id -> (geometry, lock)
+_build_locks: Dict[int, Tuple[shapely_base.BaseGeometry, threading.Lock]] = {}
+
+
+def tiled_geometry(geom: shapely_base.BaseGeometry, tests: Optional[int] = None) -> Optional[TiledGeometry]:
+    """The decomposition of ``geom``, or None if it is not worth building.
+
+    ``tests`` is the number of points the caller is about to test. A
+    decomposition costs about as much to build as a few point tests per
+    vertex against the whole polygon, so it is only built once the tests
+    counted for ``geom`` (this call's and earlier ones') reach
+    :data:`TESTS_PER_VERTEX` per vertex; until then the caller tests the
+    polygon directly. ``tests=None`` builds it regardless. Polygons with
+    fewer than :data:`MIN_TILED_VERTICES` vertices are never decomposed.
+
+    The most recent decompositions are kept (each holds its geometry, so an
+    ``id`` is never reused while cached), so the chunks of one extraction and
+    repeated queries for a union cached by
+    :class:`polygon_catalog.PolygonCatalog` share one decomposition.
+    """
+    vertices = shapely.get_num_coordinates(geom)
+    if vertices < MIN_TILED_VERTICES:
+        return None
+    key = id(geom)
+    with _cache_lock:
+        tiles = _tiled.get(key)
+        if tiles is not None and tiles.geom is geom:
+            _tiled.move_to_end(key)
+            return tiles
+        if tests is not None:
+            counted_geom, counted = _tests.pop(key, (geom, 0))
+            counted = (counted if counted_geom is geom else 0) + tests
+            if counted < TESTS_PER_VERTEX * vertices:
+                _tests[key] = (geom, counted)
+                while len(_tests) > _TESTS_CACHE_SIZE:
+                    _tests.popitem(last=False)
+                return None
+        locked_geom, build_lock = _build_locks.get(key, (None, None))
+        if locked_geom is not geom:
+            build_lock = threading.Lock()
+            _build_locks[key] = (geom, build_lock)
+
+    # Concurrent chunks of the same geometry build it once; other geometries are not held up
+    with build_lock:
+        with _cache_lock:
+            tiles = _tiled.get(key)
+            if tiles is not None and tiles.geom is geom:
+                return tiles
+        try:
+            tiles = TiledGeometry(geom)
+            with _cache_lock:
+                _tiled[key] = tiles
+                while len(_tiled) > _CACHE_SIZE:
+                    _tiled.popitem(last=False)
+                _tests.pop(key, None)
+        finally:
+            with _cache_lock:
+                if _build_locks.get(key, (None,))[0] is geom:
+                    del _build_locks[key]
+        return tiles
@@ -0,0 +1,87 @@
+"""
+Reprojection between the points' and the polygons' CRS.
+
+By default the points are moved into the polygons' CRS, as before. The
+polygons can be moved into the points' CRS instead (``"polygons"`` mode),
+which transforms one union geometry instead of millions of points. Polygon
+edges are densified first so that straight edges stay close to their true
+shape after the transform; points within a few millimetres of a boundary may
+still be classified differently than in ``"points"`` mode.
+
+Either way, output geometry is written in the polygon layer's CRS (see
+``output_writers.PointsWriter``).
+
+``pyproj`` transformers are pooled per thread and per CRS pair. Simple point
+layers are transformed from their raw coordinate arrays.
+"""
+
+import threading
+from typing import Dict, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+from shapely.geometry import base as shapely_base
+
+from pipeline_options import REPROJECT_MODES  # noqa: F401 (re-exported)
+
+# Densified polygon edges are at most this fraction of the geometry's extent
+_DENSIFY_FRACTION = 1e-3
+
+_local = threading.local()
+
+
+def get_transformer(src_crs, dst_crs) -> Transformer:
+    """An ``always_xy`` transformer from ``src_crs`` to ``dst_crs``, reused within the thread."""
+    transformers: Dict[Tuple[str, str], Transformer] = getattr(_local, "transformers", None)
+    if transformers is None:
+        transformers = _local.transformers = {}
+    key = (CRS.from_user_input(src_crs).to_wkt(), CRS.from_user_input(dst_crs).to_wkt())
+    if key not in transformers:
+        transformers[key] = Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+    return transformers[key]
+
+
+def reproject_points(points: gpd.GeoDataFrame, crs) -> gpd.GeoDataFrame:
+    """Same result as ``points.to_crs(crs)``, using the pooled transformer.
+
+    Layers of non-empty 2D single points are transformed as coordinate
+    arrays; anything else goes through ``to_crs``.
+    """
+    if points.crs is not None and points.crs == crs:
+        return points
+    geometries = np.asarray(points.geometry.array)
+    if (
+        points.crs is None
+        or len(geometries) == 0
+        or not np.all(shapely.get_type_id(geometries) == 0)
+        or np.any(shapely.is_empty(geometries))
+        or np.any(shapely.has_z(geometries))
+    ):
+        return points.to_crs(crs)
+    coords = shapely.get_coordinates(geometries)
+    x, y = get_transformer(points.crs, crs).transform(coords[:, 0], coords[:, 1])
+    geometry = gpd.GeoSeries(shapely.points(x, y), index=points.index, crs=crs)
+    return points.set_geometry(geometry.rename(points.geometry.name))
+
+
+def reproject_geometry(geom: shapely_base.BaseGeometry, src_crs, dst_crs) -> shapely_base.BaseGeometry:
+    """Transform a (polygon) geometry with densified edges from ``src_crs`` to ``dst_crs``."""
+    if geom.is_empty or CRS.from_user_input(src_crs) == CRS.from_user_input(dst_crs):
+        return geom
+    minx, miny, maxx, maxy = geom.bounds
+    extent = max(maxx - minx, maxy - miny)
+    if extent > 0:
+        geom = shapely.segmentize(geom, extent * _DENSIFY_FRACTION)
+    return shapely.transform(geom, lambda coords: np.column_stack(
+        get_transformer(src_crs, dst_crs).transform(coords[:, 0], coords[:, 1])
+    ))
+
+
+def reproject_polygons(polygons: gpd.GeoDataFrame, crs) -> gpd.GeoDataFrame:
+    """``polygons`` in ``crs``, with each geometry densified as in :func:`reproject_geometry`."""
+    if polygons.crs is None or polygons.crs == crs:
+        return polygons
+    geometry = [reproject_geometry(geom, polygons.crs, crs) if geom is not None else None for geom in polygons.geometry]
+    return polygons.set_geometry(gpd.GeoSeries(geometry, index=polygons.index, crs=crs).rename(polygons.geometry.name))
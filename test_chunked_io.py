@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Check that chunked reading and appending reproduces the whole-layer CSV
+"""
+
+import sys
+sys.path.append('.')
+
+import gzip
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point, box
+
+from chunked_io import (
+    MissingColumnsError,
+    check_layer_columns,
+    gzip_chunks,
+    iter_chunks,
+    iter_file_chunks,
+    iter_points_csv,
+    layer_reader,
+    points_read_bbox,
+    write_points_csv,
+)
+
+
+def _write_points(path, n=25):
+    gdf = gpd.GeoDataFrame(
+        {"id": range(n), "label": [f"p{i}" for i in range(n)]},
+        geometry=[Point(i, i) for i in range(n)],
+        crs="EPSG:4326",
+    )
+    gdf.to_file(path)
+    return gdf
+
+
+def test_iter_chunks_covers_all_rows_once():
+    rows = list(range(10))
+    chunks = list(iter_chunks(lambda s: rows[s] if s else rows, 4))
+    assert chunks == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    # Exact multiples must not yield a trailing empty chunk, but an empty layer yields one
+    assert list(iter_chunks(lambda s: rows[:8][s], 4)) == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert list(iter_chunks(lambda s: [], 4)) == [[]]
+
+
+def test_chunked_csv_matches_single_write(tmp_path):
+    source = str(tmp_path / "points.gpkg")
+    _write_points(source)
+
+    whole = str(tmp_path / "whole.csv")
+    write_points_csv(gpd.read_file(source), whole)
+
+    chunked = str(tmp_path / "chunked.csv")
+    for chunk_number, chunk in enumerate(iter_file_chunks(source, 7)):
+        write_points_csv(chunk, chunked, append=chunk_number > 0)
+
+    with open(whole, encoding="utf-8") as a, open(chunked, encoding="utf-8") as b:
+        assert a.read() == b.read()
+
+
+def test_points_read_bbox_covers_reprojected_polygon():
+    polygon = box(500000, 0, 600000, 100000)
+    assert points_read_bbox(polygon, "EPSG:32631", "EPSG:32631") == polygon.bounds
+    assert points_read_bbox(polygon, None, "EPSG:4326") is None
+
+    minx, miny, maxx, maxy = points_read_bbox(polygon, "EPSG:32631", "EPSG:4326")
+    corners = gpd.GeoSeries([Point(x, y) for x, y in polygon.exterior.coords], crs="EPSG:32631").to_crs("EPSG:4326")
+    assert (corners.x >= minx).all() and (corners.x <= maxx).all()
+    assert (corners.y >= miny).all() and (corners.y <= maxy).all()
+
+
+def test_bbox_chunks_keep_file_order(tmp_path):
+    source = str(tmp_path / "points.gpkg")
+    gdf = _write_points(source, n=50)
+    bbox = (10.5, 10.5, 40.5, 40.5)
+    expected = list(gdf.cx[10.5:40.5, 10.5:40.5]["id"])
+
+    chunks = list(iter_file_chunks(source, 7, bbox=bbox))
+    assert [i for chunk in chunks for i in chunk["id"]] == expected
+    assert list(next(iter_file_chunks(source, None, bbox=bbox))["id"]) == expected
+
+    empty = list(iter_file_chunks(source, 7, bbox=(1000, 1000, 1001, 1001)))
+    assert len(empty) == 1 and empty[0].empty and "id" in empty[0].columns
+
+
+def test_shapefile_bbox_chunks_list_every_feature(tmp_path):
+    # Shapefiles are read through OGR SQL, which caps fids= lists at a few thousand ids
+    source = str(tmp_path / "points.shp")
+    gdf = _write_points(source, n=6000)
+    expected = list(gdf.cx[10.5:5990.5, 10.5:5990.5]["id"])
+
+    chunks = list(iter_file_chunks(source, 5500, bbox=(10.5, 10.5, 5990.5, 5990.5), columns=["id"]))
+    assert [len(chunk) for chunk in chunks] == [5500, 480]
+    assert [i for chunk in chunks for i in chunk["id"]] == expected
+    assert [i for chunk in iter_file_chunks(source, 5500, fid_range=(5899, None)) for i in chunk["id"]] == list(range(5900, 6000))
+
+
+def test_projected_reads_keep_only_the_requested_columns(tmp_path):
+    source = str(tmp_path / "points.gpkg")
+    gdf = _write_points(source, n=50)
+    gdf["value"] = gdf["id"] * 0.5
+    gdf.to_file(source)
+
+    chunks = list(iter_file_chunks(source, 7, bbox=(10.5, 10.5, 40.5, 40.5), columns=["value", "id"]))
+    assert all(list(chunk.columns) == ["value", "id", "geometry"] for chunk in chunks)
+    projected = gpd.pd.concat(chunks)
+    assert list(projected["id"]) == list(range(11, 41))
+    assert list(projected["value"]) == [i * 0.5 for i in range(11, 41)]
+
+    read_file = layer_reader(source, columns=["id", "nope"])
+    with pytest.raises(MissingColumnsError, match="nope"):
+        check_layer_columns(read_file, ["id", "nope"], "the point layer")
+
+
+def test_streamed_csv_matches_file(tmp_path):
+    gdf = _write_points(str(tmp_path / "points.gpkg"))
+    output = tmp_path / "points.csv"
+    write_points_csv(gdf, str(output))
+
+    streamed = list(iter_points_csv(gdf, rows_per_chunk=7))
+    assert len(streamed) == 4
+    assert b"".join(streamed) == output.read_bytes()
+    assert gzip.decompress(b"".join(gzip_chunks(streamed))) == output.read_bytes()
+    assert b"".join(iter_points_csv(gdf.iloc[:0])) == b"id,label\n"
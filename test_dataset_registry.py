@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Check the in-memory dataset registry behind the /datasets and /query endpoints
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+from shapely.geometry import Point
+
+from dataset_registry import DatasetRegistry, estimate_layer_bytes, layer_summary
+
+
+def _layer(n=10):
+    return gpd.GeoDataFrame({"id": range(n)}, geometry=[Point(i, i) for i in range(n)], crs="EPSG:4326")
+
+
+def test_registry_evicts_least_recently_used():
+    size = estimate_layer_bytes(_layer())
+    registry = DatasetRegistry(memory_budget=2 * size)
+    registry.add("a", _layer())
+    registry.add("b", _layer())
+    registry.get("a")
+    registry.add("c", _layer())
+    assert registry.get("b") is None
+    assert registry.get("a") is not None and registry.get("c") is not None
+    assert registry.stats()["evictions"] == 1
+
+
+def test_registry_reloads_and_keeps_reprojected_copies():
+    loads = []
+    registry = DatasetRegistry(memory_budget=10 ** 9, loader=lambda dataset_id: loads.append(dataset_id) or _layer())
+    assert len(registry.get("points")) == 10
+    assert loads == ["points"]
+
+    projected = registry.get("points", crs="EPSG:3857")
+    assert projected.crs.to_epsg() == 3857
+    assert registry.get("points", crs="EPSG:3857") is projected
+    assert layer_summary(projected)["columns"] == ["id"]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Check that distance selection matches an exact dwithin test in the metric CRS
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import extract_points_in_polygon as cli
+from distance_selection import ALL, MIXED, DistanceSelector
+
+
+def _star(vertices, center=(88.0, 23.0), radius=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = radius * (0.8 + 0.2 * rng.random(vertices))
+    return shapely.Polygon(np.column_stack([center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)]))
+
+
+def _points(n=5000, seed=1):
+    rng = np.random.default_rng(seed)
+    return gpd.GeoDataFrame(
+        {"pid": range(n)},
+        geometry=gpd.points_from_xy(rng.uniform(87.4, 88.6, n), rng.uniform(22.4, 23.6, n)),
+        crs="EPSG:4326",
+    )
+
+
+def _expected(points, selector):
+    metric = np.asarray(points.to_crs(selector.metric_crs).geometry.array)
+    return list(points["pid"][shapely.dwithin(selector.geom, metric, selector.distance)])
+
+
+def test_selector_matches_dwithin():
+    geom = shapely.Polygon(_star(2000).exterior, [_star(300, radius=0.1, seed=1).exterior])
+    points = _points()
+    for distance in (0, 250, 5000):
+        selector = DistanceSelector(geom, "EPSG:4326", distance)
+        assert selector.metric_crs.to_epsg() == 32645
+        stats = {}
+        selected = selector.select(points, stats)
+        assert list(selected["pid"]) == _expected(points, selector)
+        assert int(stats["selected"]) == len(selected) and stats["candidates"] <= len(points)
+
+    # Multi-points take the general geometry path
+    mixed = points.iloc[:500].copy()
+    mixed.loc[0, "geometry"] = shapely.MultiPoint([(80.0, 10.0), (88.0, 23.0)])
+    assert list(selector.select(mixed)["pid"]) == _expected(mixed, selector)
+
+
+def test_cli_distance_reads_points_outside_the_polygon(tmp_path, capsys):
+    points = _points()
+    points.to_file(tmp_path / "points.gpkg")
+    polygons = gpd.GeoDataFrame({"NAME": ["star"]}, geometry=[_star(500)], crs="EPSG:4326").to_crs("EPSG:32645")
+    polygons.to_file(tmp_path / "districts.gpkg")
+    argv = ["--points", str(tmp_path / "points.gpkg"), "--polygons", str(tmp_path / "districts.gpkg"),
+            "--name-column", "NAME", "--name-value", "star", "--distance", "10000",
+            "--chunk-size", "1000", "--output", str(tmp_path / "out.csv")]
+    assert cli.main(argv) == 0
+    assert "within 10000 m" in capsys.readouterr().out
+
+    selector = DistanceSelector(polygons.geometry.iloc[0], polygons.crs, 10000)
+    expected = _expected(points, selector)
+    inside = points.to_crs(polygons.crs).within(polygons.geometry.iloc[0]).sum()
+    assert len(expected) > inside  # Points outside the polygon were read and selected
+    assert list(pd.read_csv(tmp_path / "out.csv")["pid"]) == expected
+
+
+def test_grid_keeps_points_at_exactly_the_distance():
+    # Enough points for the grid; many lie exactly (or a hair beyond) the distance from the box's right edge
+    box = shapely.box(500000, 2500000, 520000, 2520000)
+    rng = np.random.default_rng(2)
+    x = np.concatenate([rng.uniform(490000, 530000, 20000), np.full(2000, 525000.0), np.full(2000, 525000.001)])
+    y = np.concatenate([rng.uniform(2490000, 2530000, 20000), rng.uniform(2500000, 2520000, 4000)])
+    points = gpd.GeoDataFrame({"pid": range(len(x))}, geometry=gpd.points_from_xy(x, y), crs="EPSG:32645")
+    for distance in (0, 5000):
+        selector = DistanceSelector(box, "EPSG:32645", distance)
+        assert list(selector.select(points)["pid"]) == _expected(points, selector)
+        assert {ALL, MIXED} <= set(np.unique(selector.grid.classes).tolist())
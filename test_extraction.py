@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Check the shared extraction pipeline with a custom reader, predicate and writer
+"""
+
+import subprocess
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point, box
+
+import extract_points_in_polygon as cli
+from extraction import PointSource, extract_points, predicate_strategy, register_predicate
+
+
+class FramePointSource(PointSource):
+    """Points served from an in-memory GeoDataFrame in fixed-size chunks."""
+
+    def __init__(self, points, chunk_size):
+        self.points = points
+        self.chunk_size = chunk_size
+        self.bboxes = []
+
+    @property
+    def crs(self):
+        return self.points.crs
+
+    def chunks(self, bbox=None):
+        self.bboxes.append(bbox)
+        points = self.points if bbox is None else self.points.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+        for start in range(0, max(len(points), 1), self.chunk_size):
+            yield points.iloc[start:start + self.chunk_size]
+
+
+class ListWriter:
+    def __init__(self):
+        self.chunks = []
+        self.flushed = False
+
+    def write(self, points):
+        self.chunks.append(points)
+
+    def flush(self):
+        self.flushed = True
+
+
+def _points(n=300):
+    rng = np.random.default_rng(5)
+    return gpd.GeoDataFrame(
+        {"pid": range(n)},
+        geometry=[Point(x, y) for x, y in zip(rng.uniform(2.0, 4.0, n), rng.uniform(48.0, 50.0, n))],
+        crs="EPSG:4326",
+    )
+
+
+def _selected_ids(writer):
+    return [pid for chunk in writer.chunks for pid in chunk["pid"]]
+
+
+@pytest.mark.parametrize("reproject", ["points", "polygons"])
+def test_extract_points_matches_within(reproject):
+    points = _points()
+    square = box(450000, 5350000, 550000, 5450000)  # EPSG:32631
+    expected = list(points[points.to_crs("EPSG:32631").within(square)]["pid"])
+
+    source = FramePointSource(points, chunk_size=64)
+    writer = ListWriter()
+    stats = extract_points(source, square, "EPSG:32631", writer, "within", reproject=reproject)
+
+    assert _selected_ids(writer) == expected
+    assert writer.flushed
+    assert int(stats["selected"]) == len(expected)
+    assert source.bboxes[0] is not None  # Read restricted to the target's bounding box
+
+
+def test_custom_predicate_strategy():
+    def outside(points, geom, stats=None, pool=None):
+        return points[~points.within(geom)]
+
+    register_predicate("outside", outside)
+    assert predicate_strategy("outside") is outside
+    with pytest.raises(ValueError):
+        predicate_strategy("touches-ish")
+
+    points = _points(50).to_crs("EPSG:32631")
+    square = box(450000, 5350000, 550000, 5450000)
+    writer = ListWriter()
+    extract_points(FramePointSource(points, chunk_size=1000), square, points.crs, writer, "outside")
+    # Only the bounding box is read, so every point read here is inside the square
+    assert _selected_ids(writer) == []
+
+
+@pytest.mark.parametrize("points_file, chunking", [("points.gpkg", []), ("points.shp", ["--chunk-size", "7"])])
+def test_cli_join_reads_only_the_requested_columns(tmp_path, capsys, points_file, chunking):
+    points = _points(50)
+    points["label"] = [f"p{pid}" for pid in points["pid"]]
+    points.to_file(tmp_path / points_file)
+    gpd.GeoDataFrame({"NAME": ["west", "east"], "CODE": [1, 2], "AREA": [3.0, 4.0]},
+                     geometry=[box(2, 48, 3, 50), box(3, 48, 4, 50)], crs="EPSG:4326").to_file(tmp_path / "districts.gpkg")
+    argv = ["--points", str(tmp_path / points_file), "--polygons", str(tmp_path / "districts.gpkg"),
+            "--name-column", "NAME", "--join", "--output", str(tmp_path / "out.csv"), *chunking,
+            "--columns", "label,pid", "--polygon-columns", "CODE"]
+    assert cli.main(argv) == 0
+    out = gpd.pd.read_csv(tmp_path / "out.csv")
+    assert list(out.columns) == ["label", "pid", "NAME", "CODE"]
+    assert list(out["CODE"]) == [1 if x < 3 else 2 for x in points.geometry.x]
+
+    assert cli.main(argv[:-4] + ["--columns", "pid,missing"]) == 2
+    assert "['missing'] not found in the point layer" in capsys.readouterr().out
+
+
+def test_cli_rejects_workers_where_they_are_not_used(capsys):
+    base = ["--points", "points.gpkg", "--polygons", "districts.gpkg", "--name-column", "NAME", "--output", "out"]
+    assert cli.parse_args(base + ["--name-value", "x", "--workers", "2"]).workers == 2
+    for extra in (["--all-names"], ["--join"], ["--name-value", "x", "--distance", "100"]):
+        with pytest.raises(SystemExit):
+            cli.parse_args(base + extra + ["--workers", "2"])
+    assert "--workers" in capsys.readouterr().err
+
+
+def test_cli_help_does_not_import_geopandas():
+    code = "import sys, extract_points_in_polygon; print('geopandas' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
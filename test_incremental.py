@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Check that incremental runs append only new points and rebuild when the inputs change
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+import extract_points_in_polygon as cli
+
+
+def _points(start, stop):
+    rng = np.random.default_rng(start)
+    n = stop - start
+    return gpd.GeoDataFrame(
+        {"pid": range(start, stop)},
+        geometry=[Point(x, y) for x, y in zip(rng.uniform(0, 10, n), rng.uniform(0, 10, n))],
+        crs="EPSG:4326",
+    )
+
+
+def _run(tmp_path, capsys, *extra, points_file="points.gpkg"):
+    argv = ["--points", str(tmp_path / points_file), "--polygons", str(tmp_path / "districts.gpkg"),
+            "--name-column", "NAME", "--name-value", "centre", "--output", str(tmp_path / "out.csv"),
+            "--incremental", *extra]
+    assert cli.main(argv) == 0
+    return capsys.readouterr().out
+
+
+def _expected(points):
+    return sorted(points[points.within(box(3, 3, 7, 7))]["pid"])
+
+
+@pytest.mark.parametrize("points_file", ["points.gpkg", "points.shp"])
+def test_incremental_runs_append_new_points(tmp_path, capsys, points_file):
+    gpd.GeoDataFrame({"NAME": ["centre"]}, geometry=[box(3, 3, 7, 7)], crs="EPSG:4326").to_file(tmp_path / "districts.gpkg")
+    first = _points(0, 300)
+    first.to_file(tmp_path / points_file)
+    out = _run(tmp_path, capsys, points_file=points_file)
+    assert "full rebuild (no previous state)" in out
+    assert list(pd.read_csv(tmp_path / "out.csv")["pid"]) == _expected(first)
+
+    second = _points(300, 450)
+    second.to_file(tmp_path / points_file, mode="a")
+    out = _run(tmp_path, capsys, "--chunk-size", "40", points_file=points_file)
+    assert "300 rows skipped, 150 rows processed" in out
+    all_points = pd.concat([first, second])
+    assert list(pd.read_csv(tmp_path / "out.csv")["pid"]) == _expected(all_points)
+
+    # A different predicate needs every point again
+    out = _run(tmp_path, capsys, "--predicate", "intersects", points_file=points_file)
+    assert "full rebuild (predicate changed)" in out
+    assert list(pd.read_csv(tmp_path / "out.csv")["pid"]) == _expected(all_points)
+
+
+def test_incremental_rebuilds_when_points_are_rewritten(tmp_path, capsys):
+    gpd.GeoDataFrame({"NAME": ["centre"]}, geometry=[box(3, 3, 7, 7)], crs="EPSG:4326").to_file(tmp_path / "districts.gpkg")
+    _points(0, 300).to_file(tmp_path / "points.gpkg")
+    _run(tmp_path, capsys)
+
+    replaced = _points(1000, 1200)
+    replaced.to_file(tmp_path / "points.gpkg")  # Overwritten, not appended: fewer features than the watermark
+    out = _run(tmp_path, capsys)
+    assert "full rebuild" in out
+    assert list(pd.read_csv(tmp_path / "out.csv")["pid"]) == _expected(replaced)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Check stage records, their summary and the Prometheus rendering
+"""
+
+import sys
+sys.path.append('.')
+
+import pstats
+
+from instrumentation import Profile, StageMetrics, cprofile_to
+
+
+def test_stages_are_recorded_and_summed():
+    logged = []
+    metrics = StageMetrics()
+    profile = Profile(log=logged.append, metrics=metrics)
+    for chunk in profile.iter_stage("read_points", [[1, 2, 3], [4, 5]]):
+        with profile.stage("select", rows_in=len(chunk)) as stage:
+            stage.rows_out = len(chunk) - 1
+
+    assert [entry["stage"] for entry in logged] == ["read_points", "select", "read_points", "select", "read_points"]
+    assert all(entry["event"] == "stage" and entry["seconds"] >= 0 for entry in logged)
+    summary = profile.summary()
+    assert summary["stages"]["read_points"]["calls"] == 3
+    assert summary["stages"]["read_points"]["rows_out"] == 5
+    assert summary["stages"]["select"]["rows_in"] == 5
+    assert summary["stages"]["select"]["rows_out"] == 3
+
+    text = metrics.render({"gis_jobs_queued": ("gauge", "Queued jobs.", 2)})
+    assert 'gis_stage_duration_seconds_count{stage="select"} 2' in text
+    assert 'gis_stage_duration_seconds_bucket{stage="read_points",le="+Inf"} 3' in text
+    assert 'gis_stage_rows_out_sum{stage="select"} 3.0' in text
+    assert 'gis_stage_rows_in_total{stage="select"} 5' in text
+    assert "# TYPE gis_jobs_queued gauge\ngis_jobs_queued 2\n" in text
+
+
+def test_stage_is_recorded_on_error():
+    profile = Profile()
+    try:
+        with profile.stage("union"):
+            raise ValueError("no polygons")
+    except ValueError:
+        pass
+    assert [record.name for record in profile.records] == ["union"]
+
+
+def test_cprofile_dump(tmp_path):
+    path = tmp_path / "profiles" / "run.prof"
+    with cprofile_to(str(path)):
+        sum(range(1000))
+    assert pstats.Stats(str(path)).total_calls > 0
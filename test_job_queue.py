@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Check the background job queue behind /run
+"""
+
+import sys
+sys.path.append('.')
+
+import os
+import threading
+
+import pytest
+
+from job_queue import DONE, FAILED, JobQueue, QueueFullError
+
+
+def _wait(queue, job):
+    for _ in range(500):
+        if queue.get(job.id).status in (DONE, FAILED):
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_reports_progress_and_failures():
+    queue = JobQueue(max_workers=1, max_queued=4)
+
+    def run(job):
+        job.update("selecting", rows_read=10)
+        job.result_path = "result.csv"
+
+    def fail(job):
+        job.update("reading")
+        raise ValueError("bad layer")
+
+    done, failed = queue.submit(run), queue.submit(fail)
+    _wait(queue, done)
+    _wait(queue, failed)
+    assert done.to_dict()["status"] == DONE and done.progress == {"rows_read": 10}
+    assert failed.status == FAILED and failed.error == "bad layer" and failed.stage == "reading"
+    assert queue.stats()["completed"] == 1 and queue.stats()["failed"] == 1
+    queue.shutdown()
+
+
+def test_queue_rejects_when_full_or_client_over_limit():
+    queue = JobQueue(max_workers=1, max_queued=1, max_jobs_per_client=2)
+    release = threading.Event()
+    running = queue.submit(lambda job: release.wait(5), client="a")
+    while running.status != "running":
+        threading.Event().wait(0.01)
+
+    queued = queue.submit(lambda job: None, client="a")
+    assert queue.queue_position(queued) == 0
+    with pytest.raises(QueueFullError):
+        queue.submit(lambda job: None, client="b")
+    queue.max_queued = 5
+    with pytest.raises(QueueFullError):
+        queue.submit(lambda job: None, client="a")
+    queue.submit(lambda job: None, client="b")
+    assert queue.stats()["rejected"] == 2 and queue.stats()["queued"] == 2
+
+    release.set()
+    queue.shutdown()
+
+
+def test_expired_jobs_remove_their_results(tmp_path):
+    queue = JobQueue(max_workers=1, max_queued=1, result_ttl=0)
+    result_path = str(tmp_path / "result.csv")
+
+    def run(job):
+        open(result_path, "w").close()
+        job.result_path = result_path
+
+    job = queue.submit(run)
+    queue.shutdown()
+    assert os.path.exists(result_path)
+    assert queue.get(job.id) is None
+    assert not os.path.exists(result_path)
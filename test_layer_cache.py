@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Check the content-addressed GeoParquet layer cache used by the web app
+"""
+
+import io
+import os
+import sys
+sys.path.append('.')
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import geopandas as gpd
+from shapely.geometry import Point
+
+from layer_cache import CachedPointSource, LayerCache, cache_key, is_cache_key, save_stream_with_hash
+
+
+def _chunks(n=20, size=8):
+    gdf = gpd.GeoDataFrame({"id": range(n)}, geometry=[Point(i, i) for i in range(n)], crs="EPSG:4326")
+    return [gdf.iloc[start:start + size] for start in range(0, n, size)]
+
+
+def test_save_stream_with_hash(tmp_path):
+    path = str(tmp_path / "upload.bin")
+    digest = save_stream_with_hash(io.BytesIO(b"abc"), path)
+    assert digest == "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    assert open(path, "rb").read() == b"abc"
+    assert cache_key(digest, "points") != cache_key(digest)
+    assert all(is_cache_key(key) for key in (digest, cache_key(digest, "points"), cache_key(digest, "points", 4326)))
+    assert not any(is_cache_key(key) for key in ("..", "../victim", digest + "/..", digest.upper(), None))
+
+
+def test_cache_round_trip_and_counters(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    entry = cache.get_or_store("key", _chunks)
+    assert cache.get_or_store("key", lambda: pytest.fail("cache hit must not re-parse")) == entry
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
+
+    assert list(cache.read_layer(entry)["id"]) == list(range(20))
+    assert cache.layer_crs(entry).to_epsg() == 4326
+    in_box = [i for chunk in cache.iter_chunks(entry, bbox=(2.5, 2.5, 12.5, 12.5)) for i in chunk["id"]]
+    assert in_box == list(range(3, 13))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"), max_bytes=0)
+    cache.store("first", _chunks())
+    cache.store("second", _chunks())
+    assert cache.lookup("first") is None
+    assert cache.lookup("second") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_being_read_are_not_evicted(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"), max_bytes=0)
+    reading = cache.iter_chunks(cache.store("first", _chunks()))
+    assert list(next(reading)["id"]) == list(range(8))
+    cache.store("second", _chunks())
+    assert [i for chunk in reading for i in chunk["id"]] == list(range(8, 20))
+
+    cache.store("third", _chunks())
+    assert cache.lookup("first") is None and cache.lookup("second") is None
+
+
+def test_looked_up_entries_stay_pinned_until_released(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"), max_bytes=0)
+    with cache.pinned("first", _chunks) as entry:
+        cache.store("second", _chunks())  # Would evict "first" if it were not pinned
+        assert cache.layer_crs(entry).to_epsg() == 4326
+    assert cache.lookup("first") is not None  # Only evicted by a later store
+    cache.store("third", _chunks())
+    assert cache.lookup("first") is None
+
+    source = CachedPointSource(cache, "a" * 64, None, _chunks)
+    cache.store("fourth", _chunks())
+    assert source.crs.to_epsg() == 4326 and len(gpd.pd.concat(source.chunks())) == 20
+    source.close()
+    cache.store("fifth", _chunks())
+    assert cache.lookup(os.path.basename(source.entry)) is None
+
+
+def test_entry_without_parts_is_a_miss(tmp_path):
+    cache = LayerCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    (tmp_path / "cache" / "key").mkdir()
+    assert cache.lookup("key") is None
+    assert cache.read_layer(str(tmp_path / "cache" / "key")) is None
+    entry = cache.get_or_store("key", _chunks)
+    assert list(cache.read_layer(entry)["id"]) == list(range(20))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Check that every output format holds the same rows as the CSV output
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from output_writers import OUTPUT_EXTENSIONS, PointsWriter
+
+
+def _points(n=25):
+    return gpd.GeoDataFrame(
+        {"id": range(n), "label": [f"p{i}" for i in range(n)], "value": [i / 4 for i in range(n)]},
+        geometry=[Point(i, -i) for i in range(n)],
+        crs="EPSG:4326",
+    )
+
+
+def _write(path, output_format, geometry, chunks):
+    with PointsWriter(str(path), output_format, geometry, batch_rows=7) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "feather", "gpkg", "geojsonseq"])
+def test_formats_round_trip_in_batches(tmp_path, output_format):
+    pytest.importorskip("pyarrow")
+    gdf = _points()
+    chunks = [gdf.iloc[0:0], gdf.iloc[0:5], gdf.iloc[5:5], gdf.iloc[5:25]]
+    path = tmp_path / f"out{OUTPUT_EXTENSIONS[output_format]}"
+    writer = _write(path, output_format, "xy", chunks)
+    assert writer.rows_written == 25
+
+    if output_format in ("gpkg", "geojsonseq"):
+        back = gpd.read_file(path)
+        assert back.geometry.geom_equals(gdf.geometry).all()
+    else:
+        back = {"csv": pd.read_csv, "parquet": pd.read_parquet, "feather": pd.read_feather}[output_format](path)
+        assert list(back["x"]) == list(gdf.geometry.x) and list(back["y"]) == list(gdf.geometry.y)
+    assert list(back["id"]) == list(gdf["id"]) and list(back["label"]) == list(gdf["label"])
+
+
+def test_wkb_geometry_and_empty_output(tmp_path):
+    pytest.importorskip("pyarrow")
+    gdf = _points()
+    _write(tmp_path / "points.parquet", "parquet", "wkb", [gdf])
+    back = gpd.read_parquet(tmp_path / "points.parquet")
+    assert back.crs == gdf.crs and back.geometry.geom_equals(gdf.geometry).all()
+    assert str(back["id"].dtype) == "int64"
+
+    _write(tmp_path / "empty.csv", "csv", "none", [gdf.iloc[:0]])
+    assert (tmp_path / "empty.csv").read_text() == "id,label,value\n"
+
+
+def test_xy_rejects_existing_columns(tmp_path):
+    gdf = _points().assign(x=1)
+    with pytest.raises(ValueError, match="'x' column"):
+        _write(tmp_path / "points.csv", "csv", "xy", [gdf])
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Check that the spatial-index selection matches the plain GeoSeries predicates
+"""
+
+import os
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import MultiPoint, Point, Polygon
+
+import point_selection
+from parallel_selection import ParallelPredicatePool, point_coordinates
+from point_selection import format_selection_stats, select_points, select_points_by_geometries, tag_points_with_names
+
+
+def _random_points(n=2000, seed=42):
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, 100, n)
+    ys = rng.uniform(0, 100, n)
+    geoms = [Point(x, y) for x, y in zip(xs, ys)]
+    # Points exactly on the boundary separate "within" from "intersects"
+    geoms += [Point(10, 15), Point(30, 10), None]
+    return gpd.GeoDataFrame({"id": range(len(geoms))}, geometry=geoms, crs="EPSG:4326")
+
+
+def test_select_points_matches_plain_predicates():
+    points = _random_points()
+    geom = Polygon([(10, 10), (30, 10), (30, 40), (10, 40)])
+    for predicate in ("within", "intersects"):
+        expected = points[getattr(points, predicate)(geom)]
+        stats = {}
+        result = select_points(points, geom, predicate, stats=stats)
+        assert list(result["id"]) == list(expected["id"])
+        assert stats["selected"] == len(expected)
+        assert stats["candidates"] <= stats["total"]
+        assert "pruned" in format_selection_stats(stats)
+
+
+def test_prebuilt_index_is_queried_instead_of_the_layer_coordinates(monkeypatch):
+    points = _random_points().iloc[:-1]
+    points.sindex
+    sizes = []
+    coordinates = point_selection.point_coordinates
+    monkeypatch.setattr(point_selection, "point_coordinates", lambda geoms: sizes.append(len(geoms)) or coordinates(geoms))
+    geom = Polygon([(10, 10), (30, 10), (30, 40), (10, 40)])
+    for predicate in ("within", "intersects"):
+        expected = points[getattr(points, predicate)(geom)]
+        assert list(select_points(points, geom, predicate)["id"]) == list(expected["id"])
+    assert sizes and max(sizes) < len(points) / 4  # Only the candidates' coordinates
+
+
+def test_parallel_pool_matches_serial_selection():
+    points = _random_points()
+    # A multipoint makes the pool ship WKB instead of x/y coordinate arrays
+    mixed = points.copy()
+    mixed.loc[0, "geometry"] = MultiPoint([(15, 15), (16, 16)])
+    geom = Polygon([(10, 10), (30, 10), (30, 40), (10, 40)])
+    with ParallelPredicatePool(2, min_parallel_rows=0) as pool:
+        for predicate in ("within", "intersects"):
+            for layer in (points, mixed):
+                expected = layer[getattr(layer, predicate)(geom)]
+                result = select_points(layer, geom, predicate, pool=pool)
+                assert list(result["id"]) == list(expected["id"])
+
+
+def test_parallel_pool_writes_each_geometry_once():
+    points = _random_points().iloc[:-1]
+    x, y = points.geometry.x.to_numpy(), points.geometry.y.to_numpy()
+    square = Polygon([(10, 10), (30, 10), (30, 40), (10, 40)])
+    with ParallelPredicatePool(2, min_parallel_rows=0) as pool:
+        for _ in range(3):
+            # An equal geometry rebuilt for each chunk still maps to the same file
+            pool.mask_xy(x, y, Polygon(square.exterior), "within")
+        pool.mask_xy(x, y, square.buffer(1), "within")
+        paths = list(pool._geometry_files.values())
+        assert len(paths) == 2 and all(os.path.exists(path) for path in paths)
+    assert not any(os.path.exists(path) for path in paths)
+
+
+def test_point_fast_path_matches_plain_predicates():
+    # Without the missing geometry the layer is all simple points and takes the x/y path
+    points = _random_points().iloc[:-1]
+    assert point_coordinates(np.asarray(points.geometry.array)) is not None
+    assert point_coordinates(np.asarray(_random_points().geometry.array)) is None
+    holed = Polygon([(10, 10), (30, 10), (30, 40), (10, 40)], [[(15, 15), (20, 15), (20, 20), (15, 20)]])
+    geom = holed.union(Polygon([(60, 60), (90, 60), (75, 95)]))
+    with ParallelPredicatePool(2, min_parallel_rows=0) as pool:
+        for predicate in ("within", "intersects"):
+            expected = points[getattr(points, predicate)(geom)]
+            assert list(select_points(points, geom, predicate)["id"]) == list(expected["id"])
+            assert list(select_points(points, geom, predicate, pool=pool)["id"]) == list(expected["id"])
+
+
+def test_bulk_join_matches_single_selection():
+    points = _random_points()
+    geoms = gpd.GeoSeries([
+        Polygon([(10, 10), (30, 10), (30, 40), (10, 40)]),
+        Polygon([(0, 0), (100, 0), (50, 5)]),
+        Polygon([(200, 200), (201, 200), (201, 201)]),
+    ])
+    for predicate in ("within", "intersects"):
+        per_geom = select_points_by_geometries(points, geoms, predicate)
+        assert len(per_geom) == len(geoms)
+        for geom, positions in zip(geoms, per_geom):
+            expected = select_points(points, geom, predicate)
+            assert list(points.iloc[positions]["id"]) == list(expected["id"])
+
+
+def test_tag_points_with_names_policies():
+    points = gpd.GeoDataFrame({"id": range(4)}, geometry=[Point(5, 5), Point(10, 5), Point(50, 50), Point(15, 5)])
+    # The polygons share the edge x=10; the second one overlaps a third
+    polygons = gpd.GeoDataFrame(
+        {"NAME": ["West", "East", "Overlap"]},
+        geometry=[
+            Polygon([(0, 0), (10, 0), (10, 10), (0, 10)]),
+            Polygon([(10, 0), (20, 0), (20, 10), (10, 10)]),
+            Polygon([(14, 0), (16, 0), (16, 10), (14, 10)]),
+        ],
+    )
+    stats = {}
+    first = tag_points_with_names(points, polygons, "NAME", "intersects", stats=stats)
+    assert list(first["id"]) == [0, 1, 3] and list(first["NAME"]) == ["West", "West", "East"]
+    assert stats["matched_points"] == 3 and stats["tied_points"] == 2
+
+    every = tag_points_with_names(points, polygons, "NAME", "intersects", ties="all", unmatched="keep", name_field="district")
+    assert list(every["id"]) == [0, 1, 1, 2, 3, 3]
+    assert list(every["district"].fillna("-")) == ["West", "West", "East", "-", "East", "Overlap"]
+
+    # A point on the shared edge is within neither polygon
+    within = tag_points_with_names(points, polygons, "NAME", "within", unmatched="keep")
+    assert list(within["NAME"].fillna("-")) == ["West", "-", "-", "East"]
+
+
+def test_tag_points_keeps_integer_columns_integer_when_unmatched_are_kept():
+    points = gpd.GeoDataFrame({"id": range(2)}, geometry=[Point(5, 5), Point(50, 50)])
+    polygons = gpd.GeoDataFrame(
+        {"NAME": ["West"], "CODE": np.array([10], dtype=np.int32), "URBAN": [True]},
+        geometry=[Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])],
+    )
+    tagged = tag_points_with_names(points, polygons, "NAME", "intersects", unmatched="keep",
+                                   extra_fields={"CODE": "code", "URBAN": "urban"})
+    assert str(tagged["code"].dtype) == "Int32" and str(tagged["urban"].dtype) == "boolean"
+    assert tagged["code"].tolist() == [10, pd.NA] and tagged["urban"].tolist() == [True, pd.NA]
+    assert tagged.drop(columns="geometry").to_csv(index=False).splitlines()[1:] == ["0,West,10,True", "1,,,"]
+
+
+def test_select_points_rejects_unknown_predicate():
+    points = _random_points(10)
+    try:
+        select_points(points, Polygon([(0, 0), (1, 0), (1, 1)]), "touches")
+    except ValueError:
+        return
+    raise AssertionError("Expected ValueError for unsupported predicate")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Check that a points store returns the same rows, in the same order, as the layer it was built from
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import MultiPoint, Point
+
+from points_store import PointsStore, StorePointSource, build_store
+
+
+def _write_points(path, n=500):
+    rng = np.random.default_rng(11)
+    points = gpd.GeoDataFrame(
+        {"pid": range(n), "label": [f"p{i}" for i in range(n)]},
+        geometry=[Point(x, y) for x, y in zip(rng.uniform(0, 10, n), rng.uniform(0, 10, n))],
+        crs="EPSG:4326",
+    )
+    points.to_file(path, driver="GPKG")
+    return points
+
+
+def test_store_query_matches_layer(tmp_path):
+    points = _write_points(tmp_path / "points.gpkg")
+    manifest = build_store(str(tmp_path / "points.gpkg"), str(tmp_path / "store"), page_rows=32, chunk_size=128)
+    assert manifest["rows"] == 500 and manifest["pages"] == 16
+
+    store = PointsStore(str(tmp_path / "store"))
+    assert store.crs == points.crs
+    assert not store.is_stale()
+    bbox = (2.0, 3.0, 4.5, 6.0)
+    # Hilbert-sorted pages are compact, so a small box touches only some of them
+    assert len(store.pages_in(bbox)) < manifest["pages"]
+
+    chunks = list(StorePointSource(store, chunk_size=20).chunks(bbox))
+    result = pd.concat(chunks)
+    expected = points.cx[2.0:4.5, 3.0:6.0]
+    assert list(result["pid"]) == list(expected["pid"])
+    assert list(result["label"]) == list(expected["label"])
+    assert np.array_equal(result.geometry.x, expected.geometry.x)
+
+    everything = pd.concat(StorePointSource(store).chunks())
+    assert list(everything["pid"]) == list(range(500))
+
+    empty = list(StorePointSource(store).chunks((50, 50, 60, 60)))
+    assert len(empty) == 1 and len(empty[0]) == 0 and list(empty[0].columns) == ["pid", "label", "geometry"]
+
+
+def test_store_rejects_multipoints(tmp_path):
+    layer = gpd.GeoDataFrame({"pid": [1]}, geometry=[MultiPoint([(0, 0), (1, 1)])], crs="EPSG:4326")
+    layer.to_file(tmp_path / "multi.gpkg", driver="GPKG")
+    with pytest.raises(ValueError):
+        build_store(str(tmp_path / "multi.gpkg"), str(tmp_path / "store"))
+    assert not (tmp_path / "store").exists()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Check that the polygon catalog matches filter_polygons_by_name and memoizes unions
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from extraction import filter_polygons_by_name
+from polygon_catalog import CatalogCache, PolygonCatalog
+
+
+def _polygons():
+    return gpd.GeoDataFrame(
+        {"NAME": ["Bankura", "Nadia", "bankura", None, "BANKURA "]},
+        geometry=[box(0, 0, 1, 1), box(2, 2, 3, 3), box(1, 0, 2, 1), box(5, 5, 6, 6), box(9, 9, 10, 10)],
+        crs="EPSG:4326",
+    )
+
+
+def test_catalog_matches_filter_polygons_by_name():
+    polygons = _polygons()
+    catalog = PolygonCatalog(polygons, "NAME")
+    for name in ("bankura", "Bankura", "NADIA", "missing", "nan"):
+        for case_sensitive in (False, True):
+            expected = filter_polygons_by_name(polygons, "NAME", name, case_sensitive)
+            assert list(catalog.matched(name, case_sensitive).index) == list(expected.index)
+    assert list(catalog.labels(False).values()) == ["Bankura", "Nadia", "BANKURA "]
+
+
+def test_catalog_memoizes_prepared_unions():
+    catalog = PolygonCatalog(_polygons(), "NAME", max_unions=1)
+    union = catalog.union("BANKURA", case_sensitive=False)
+    assert union.equals(box(0, 0, 2, 1))
+    assert catalog.union("bankura", case_sensitive=False) is union
+    catalog.union("nadia", case_sensitive=False)
+    assert catalog.union("bankura", case_sensitive=False) is not union
+    assert catalog.stats() == {"cached_unions": 1, "union_hits": 1, "union_misses": 3}
+
+    try:
+        catalog.union("missing", case_sensitive=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError for a name without polygons")
+
+
+def test_catalog_cache_loads_layer_once():
+    loads = []
+    cache = CatalogCache(max_catalogs=2)
+    first = cache.get("layer", "NAME", lambda: loads.append(1) or _polygons())
+    assert cache.get("layer", "NAME", lambda: loads.append(1) or _polygons()) is first
+    assert len(loads) == 1
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Check that the tiled point-in-polygon test matches the whole-polygon test exactly
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from parallel_selection import predicate_mask_xy
+from point_selection import select_points
+from polygon_tiles import TESTS_PER_VERTEX, TiledGeometry, tiled_geometry
+
+
+def _jagged_polygon(vertices, seed=0, center=(0.5, 0.5), scale=1.0):
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = scale * (0.4 + 0.05 * rng.random(vertices))
+    return np.column_stack([center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)])
+
+
+def _test_points(geom, tiles, n=20000):
+    rng = np.random.default_rng(3)
+    coords = shapely.get_coordinates(geom)[::7]
+    x = np.concatenate([
+        rng.uniform(-0.1, 1.1, n),
+        coords[:, 0],  # On vertices
+        (coords[:-1, 0] + coords[1:, 0]) / 2,  # Next to edges
+        tiles.xs,  # On cell edges
+    ])
+    y = np.concatenate([
+        rng.uniform(-0.1, 1.1, n),
+        coords[:, 1],
+        (coords[:-1, 1] + coords[1:, 1]) / 2,
+        np.full(len(tiles.xs), 0.5),
+    ])
+    return x, y
+
+
+@pytest.mark.parametrize("predicate", ["within", "intersects"])
+def test_tiled_mask_matches_whole_polygon(predicate):
+    outer = shapely.Polygon(_jagged_polygon(3000), [_jagged_polygon(500, seed=1, scale=0.3)])
+    square = shapely.box(1.2, 1.2, 1.4, 1.4)  # Also a boundary on cell edges, sharing none with the polygon
+    geom = shapely.MultiPolygon([outer, square])
+    tiles = TiledGeometry(geom, cells=24)
+    counts = tiles.cell_counts()
+    assert counts["inside"] and counts["outside"] and counts["boundary"]
+
+    x, y = _test_points(geom, tiles)
+    assert np.array_equal(tiles.mask_xy(x, y, predicate), predicate_mask_xy(x, y, geom, predicate))
+
+
+def test_select_points_uses_tiles_for_large_polygons():
+    geom = shapely.Polygon(_jagged_polygon(12000))
+    tiles = tiled_geometry(geom)
+    assert tiles is not None and tiled_geometry(geom) is tiles
+    assert tiled_geometry(shapely.box(0, 0, 1, 1)) is None
+
+    rng = np.random.default_rng(4)
+    x, y = rng.random(12000), rng.random(12000)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y))
+    selected = select_points(points, geom, "within")
+    shapely.prepare(geom)
+    assert list(selected.index) == list(np.flatnonzero(shapely.contains_xy(geom, x, y)))
+
+
+def test_tiles_are_built_once_enough_points_were_tested():
+    geom = shapely.Polygon(_jagged_polygon(12000, seed=2))
+    budget = TESTS_PER_VERTEX * shapely.get_num_coordinates(geom)
+    # A few chunks are cheaper to test against the whole polygon than to decompose it for
+    assert tiled_geometry(geom, budget // 2) is None
+    assert tiled_geometry(geom, budget // 4) is None
+    tiles = tiled_geometry(geom, budget // 4)
+    assert tiles is not None and tiled_geometry(geom, 1) is tiles
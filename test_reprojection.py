@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Check that both reprojection modes select the same points as to_crs
+"""
+
+import sys
+sys.path.append('.')
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import Point, box
+
+from output_writers import PointsWriter
+from point_selection import select_points
+from reprojection import reproject_geometry, reproject_points
+
+
+def _points(n=400):
+    rng = np.random.default_rng(3)
+    lon = rng.uniform(2.0, 4.0, n)
+    lat = rng.uniform(48.0, 50.0, n)
+    return gpd.GeoDataFrame({"pid": range(n)}, geometry=[Point(x, y) for x, y in zip(lon, lat)], crs="EPSG:4326")
+
+
+def test_reproject_points_matches_to_crs():
+    points = _points()
+    expected = points.to_crs("EPSG:32631")
+    result = reproject_points(points, "EPSG:32631")
+    assert result.crs == expected.crs
+    assert result.geometry.name == "geometry"
+    assert np.allclose(result.geometry.x, expected.geometry.x)
+    assert np.allclose(result.geometry.y, expected.geometry.y)
+    assert reproject_points(result, "EPSG:32631") is result
+
+
+def test_polygon_reprojection_selects_same_points():
+    points = _points()
+    square = box(450000, 5350000, 550000, 5450000)  # EPSG:32631
+    by_points = select_points(reproject_points(points, "EPSG:32631"), square, "within")
+    by_polygon = select_points(points, reproject_geometry(square, "EPSG:32631", "EPSG:4326"), "within")
+    assert len(by_points) > 0
+    assert list(by_points["pid"]) == list(by_polygon["pid"])
+
+
+def test_writer_keeps_output_crs(tmp_path):
+    points = _points(10)
+    path = tmp_path / "out.gpkg"
+    with PointsWriter(str(path), "gpkg", crs="EPSG:32631") as writer:
+        writer.write(points)
+    result = gpd.read_file(path)
+    assert result.crs.to_epsg() == 32631
+    assert np.allclose(result.geometry.x, points.to_crs("EPSG:32631").geometry.x)
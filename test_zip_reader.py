@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Check that zipped Shapefiles are found and read in place, and bad archives fail clearly
+"""
+
+import sys
+sys.path.append('.')
+
+import os
+import zipfile
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from zip_reader import ZipLayerError, find_zipped_shapefile
+
+
+def _write_shapefile(directory, name="points", n=5):
+    gdf = gpd.GeoDataFrame({"id": range(n)}, geometry=[Point(i, i) for i in range(n)], crs="EPSG:4326")
+    gdf.to_file(os.path.join(directory, f"{name}.shp"))
+    return [os.path.join(directory, f"{name}{ext}") for ext in (".shp", ".shx", ".dbf", ".prj", ".cpg")]
+
+
+def _zip(path, files, folder="", skip=()):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("__MACOSX/._points.shp", b"junk")
+        for file_path in files:
+            if not file_path.endswith(skip):
+                archive.write(file_path, folder + os.path.basename(file_path))
+    return str(path)
+
+
+def test_reads_shapefile_in_folder_and_nested_zip(tmp_path):
+    files = _write_shapefile(str(tmp_path))
+    zip_path = _zip(tmp_path / "layer.zip", files, folder="data/layers/")
+    gdal_path, member = find_zipped_shapefile(zip_path)
+    assert member == "data/layers/points.shp"
+    assert len(gpd.read_file(gdal_path)) == 5
+
+    outer = tmp_path / "outer.zip"
+    with zipfile.ZipFile(outer, "w") as archive:
+        archive.write(zip_path, "inner.zip")
+    gdal_path, member = find_zipped_shapefile(str(outer))
+    assert member == "inner.zip/data/layers/points.shp"
+    assert len(gpd.read_file(gdal_path)) == 5
+
+
+def test_picks_layer_by_name(tmp_path):
+    files = _write_shapefile(str(tmp_path), "roads", n=2) + _write_shapefile(str(tmp_path), "wells", n=3)
+    zip_path = _zip(tmp_path / "layers.zip", files)
+    assert find_zipped_shapefile(zip_path)[1] == "roads.shp"
+    gdal_path, member = find_zipped_shapefile(zip_path, "wells")
+    assert member == "wells.shp" and len(gpd.read_file(gdal_path)) == 3
+    with pytest.raises(ZipLayerError, match="Available: roads, wells"):
+        find_zipped_shapefile(zip_path, "rivers")
+
+
+def test_bad_archives_fail_with_specific_errors(tmp_path):
+    files = _write_shapefile(str(tmp_path))
+    with pytest.raises(ZipLayerError, match="missing points.dbf"):
+        find_zipped_shapefile(_zip(tmp_path / "no_dbf.zip", files, skip=(".dbf",)))
+    with pytest.raises(ZipLayerError, match="No Shapefile"):
+        find_zipped_shapefile(_zip(tmp_path / "none.zip", files[3:]))
+    (tmp_path / "broken.zip").write_bytes(b"not a zip")
+    with pytest.raises(ZipLayerError, match="not a valid ZIP"):
+        find_zipped_shapefile(str(tmp_path / "broken.zip"))
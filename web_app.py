@@ -1,18 +1,36 @@
-import io
+import functools
+import json
+import math
 import os
 import uuid
-import zipfile
-import tempfile
-from typing import Optional
+from typing import Iterable, List, Optional
 
-from flask import Flask, render_template, request, send_file, flash, redirect, url_for
+from flask import Flask, Response, render_template, request, flash, redirect, url_for, jsonify
 from werkzeug.utils import secure_filename
 import geopandas as gpd
-from shapely.geometry import base as shapely_base
-try:
-    import fiona
-except ImportError:
-    fiona = None
+
+from chunked_io import (
+    ARROW_READ_KWARGS,
+    check_columns,
+    check_layer_columns,
+    gzip_chunks,
+    iter_chunks,
+    iter_file_blocks,
+    iter_points_csv,
+    make_rows_reader,
+    order_columns,
+)
+from dataset_registry import DatasetRegistry, layer_summary
+from extraction import ReaderPointSource, ensure_crs_compatible, extract_points, predicate_strategy, union_for_name
+from instrumentation import Profile, StageMetrics, cprofile_to, peak_rss_bytes, rss_bytes
+from job_queue import DONE, FAILED, Job, JobQueue, QueueFullError
+from output_writers import OUTPUT_EXTENSIONS, OUTPUT_MIMETYPES, PointsWriter, check_output_format
+from layer_cache import CACHE_AVAILABLE, CachedPointSource, LayerCache, cache_key, is_cache_key, save_stream_with_hash
+from parallel_selection import ParallelPredicatePool
+from pipeline_options import REPROJECT_MODES, SUPPORTED_PREDICATES, parse_columns
+from point_selection import format_selection_stats
+from polygon_catalog import CatalogCache
+from zip_reader import find_zipped_shapefile
 
 
 app = Flask(__name__)
@@ -24,6 +42,70 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Max upload size: 200 MB
 app.config["MAX_CONTENT_LENGTH"] = 200 * 1024 * 1024
+# Points are read and filtered in chunks of this many rows to bound memory use
+app.config["POINTS_CHUNK_SIZE"] = int(os.environ.get("POINTS_CHUNK_SIZE", 250000))
+# Compress CSV downloads with gzip for clients that accept it
+app.config["GZIP_DOWNLOADS"] = os.environ.get("GZIP_DOWNLOADS", "1") == "1"
+# Parsed uploads are cached as GeoParquet (needs pyarrow), keyed by file content
+app.config["LAYER_CACHE_ENABLED"] = os.environ.get("LAYER_CACHE_ENABLED", "1") == "1"
+app.config["LAYER_CACHE_DIR"] = os.environ.get("LAYER_CACHE_DIR", os.path.join(BASE_DIR, "cache"))
+app.config["LAYER_CACHE_MAX_BYTES"] = int(os.environ.get("LAYER_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+layer_cache = None
+if app.config["LAYER_CACHE_ENABLED"]:
+    if CACHE_AVAILABLE:
+        layer_cache = LayerCache(app.config["LAYER_CACHE_DIR"], app.config["LAYER_CACHE_MAX_BYTES"])
+    else:
+        print("Layer cache disabled: install 'pyarrow' to cache parsed uploads.")
+
+# Datasets uploaded through /datasets stay loaded (with spatial index) within this budget
+app.config["DATASET_MEMORY_BUDGET"] = int(os.environ.get("DATASET_MEMORY_BUDGET", 1024 * 1024 * 1024))
+
+
+def _load_cached_dataset(dataset_id: str) -> Optional[gpd.GeoDataFrame]:
+    # Datasets evicted from memory come back from the layer cache when possible
+    if layer_cache is None:
+        return None
+    entry = layer_cache.lookup(dataset_id, pin=True)
+    if entry is None:
+        return None
+    try:
+        return layer_cache.read_layer(entry)
+    finally:
+        layer_cache.unpin(entry)
+
+
+dataset_registry = DatasetRegistry(app.config["DATASET_MEMORY_BUDGET"], loader=_load_cached_dataset)
+
+# Worker processes for the exact point-in-polygon test (1 = no pool)
+app.config["SELECTION_WORKERS"] = int(os.environ.get("SELECTION_WORKERS", 1))
+selection_pool = ParallelPredicatePool(app.config["SELECTION_WORKERS"]) if app.config["SELECTION_WORKERS"] > 1 else None
+
+# Layers in different CRSs: reproject the "points" (cached per target CRS) or the "polygons"
+app.config["REPROJECT_MODE"] = os.environ.get("REPROJECT_MODE", "points")
+if app.config["REPROJECT_MODE"] not in REPROJECT_MODES:
+    raise ValueError(f"REPROJECT_MODE must be one of: {', '.join(REPROJECT_MODES)}")
+
+# Name indexes and unioned geometries of recently used polygon layers
+polygon_catalogs = CatalogCache(max_catalogs=int(os.environ.get("POLYGON_CATALOG_CACHE_SIZE", 16)))
+
+# /run jobs execute in the background: this many at once, with a bounded waiting queue
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_QUEUE_LIMIT"] = int(os.environ.get("JOB_QUEUE_LIMIT", 8))
+app.config["JOBS_PER_CLIENT"] = int(os.environ.get("JOBS_PER_CLIENT", 2))
+# Finished jobs and their result CSVs are kept this many seconds
+app.config["JOB_RESULT_TTL"] = int(os.environ.get("JOB_RESULT_TTL", 3600))
+job_queue = JobQueue(
+    app.config["JOB_WORKERS"],
+    app.config["JOB_QUEUE_LIMIT"],
+    max_jobs_per_client=app.config["JOBS_PER_CLIENT"],
+    result_ttl=app.config["JOB_RESULT_TTL"],
+)
+
+# Per-stage timing/memory histograms of /run jobs and /query requests, served at /metrics
+stage_metrics = StageMetrics()
+# Set to a directory to dump cProfile stats of every /run job there (<job id>.prof)
+app.config["CPROFILE_DIR"] = os.environ.get("CPROFILE_DIR") or None
 
 
 def _allowed_extension(filename: str) -> bool:
@@ -31,104 +113,62 @@ def _allowed_extension(filename: str) -> bool:
     return filename_lower.endswith((".gpkg", ".geojson", ".json", ".zip", ".shp"))
 
 
-def read_vector_layer(path: str, layer_name: Optional[str] = None) -> gpd.GeoDataFrame:
-    lower = path.lower()
-    if lower.endswith(".zip"):
-        # Zipped shapefile - try different approaches
-        try:
-            # Method 1: Direct zip reading
-            return gpd.read_file(f"zip://{path}")
-        except Exception as e1:
-            try:
-                # Method 2: Try without zip prefix
-                return gpd.read_file(path)
-            except Exception as e2:
-                try:
-                    # Method 3: Try with fiona listing layers first (if available)
-                    if fiona:
-                        layers = fiona.listlayers(path)
-                        if layers:
-                            # Try each layer found
-                            for layer in layers:
-                                try:
-                                    return gpd.read_file(path, layer=layer)
-                                except:
-                                    continue
-                        else:
-                            raise ValueError(f"No valid layers found in ZIP file.")
-                    else:
-                        raise ValueError(f"Could not read ZIP file. Make sure it contains a valid Shapefile (.shp, .shx, .dbf files).")
-                except Exception as e3:
-                    # Method 4: Try to extract and find .shp files manually
-                    try:
-                        with tempfile.TemporaryDirectory() as temp_dir:
-                            # Extract the ZIP file
-                            with zipfile.ZipFile(path, 'r') as zip_ref:
-                                zip_ref.extractall(temp_dir)
-                            
-                            # Find .shp files recursively
-                            shp_files = []
-                            for root, dirs, files in os.walk(temp_dir):
-                                for file in files:
-                                    if file.lower().endswith('.shp'):
-                                        shp_files.append(os.path.join(root, file))
-                            
-                            if shp_files:
-                                # Try to read the first .shp file found
-                                return gpd.read_file(shp_files[0])
-                            else:
-                                raise ValueError("No .shp files found in the ZIP archive")
-                    except Exception as e4:
-                        raise ValueError(f"Could not read ZIP file. Make sure it contains a valid Shapefile (.shp, .shx, .dbf files). Errors: {str(e1)}, {str(e2)}, {str(e3)}, {str(e4)}")
-    
-    if layer_name:
-        return gpd.read_file(path, layer=layer_name)
-    return gpd.read_file(path)
-
-
-def ensure_crs_compatible(points: gpd.GeoDataFrame, polygons: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    if polygons.crs is None and points.crs is None:
-        raise ValueError("Both layers are missing CRS. Please define CRS for your data.")
-    if polygons.crs is None:
-        raise ValueError("Polygon layer CRS is missing. Please define it before running.")
-    if points.crs is None:
-        raise ValueError("Point layer CRS is missing. Please define it before running.")
-    if points.crs != polygons.crs:
-        points = points.to_crs(polygons.crs)
-    return points
-
-
-def filter_polygons_by_name(polygons: gpd.GeoDataFrame, name_column: str, name_value: str, case_sensitive: bool) -> gpd.GeoDataFrame:
-    if name_column not in polygons.columns:
-        raise KeyError(
-            f"Column '{name_column}' not found in polygons. Available columns: {list(polygons.columns)}"
-        )
-    if case_sensitive:
-        mask = polygons[name_column] == name_value
-    else:
-        mask = polygons[name_column].astype(str).str.lower() == str(name_value).lower()
-    return polygons[mask]
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Ignore cleanup errors
 
 
-def build_union_geometry(polygons: gpd.GeoDataFrame) -> shapely_base.BaseGeometry:
-    if polygons.empty:
-        raise ValueError("No polygons matched the given name.")
-    # Use union_all() method instead of deprecated unary_union
-    try:
-        return polygons.union_all()
-    except AttributeError:
-        # Fallback for older versions of geopandas
-        return polygons.unary_union
+@functools.lru_cache(maxsize=64)
+def _zipped_shapefile(path: str, layer_name: Optional[str], mtime_ns: int, size: int) -> str:
+    # Keyed by mtime and size too, so a replaced file is inspected again
+    vsi_path, member = find_zipped_shapefile(path, layer_name)
+    print(f"Reading Shapefile '{member}' from ZIP file: {os.path.basename(path)}")
+    return vsi_path
 
 
-def select_points(points: gpd.GeoDataFrame, geom: shapely_base.BaseGeometry, predicate: str) -> gpd.GeoDataFrame:
-    if predicate == "within":
-        mask = points.within(geom)
-    elif predicate == "intersects":
-        mask = points.intersects(geom)
-    else:
-        raise ValueError(f"Unsupported predicate: {predicate}")
-    return points[mask]
+def read_vector_layer(path: str, layer_name: Optional[str] = None, **read_kwargs) -> gpd.GeoDataFrame:
+    # read_kwargs (rows, bbox, columns, ...) are passed on to gpd.read_file, through Arrow when available
+    read_kwargs = {**ARROW_READ_KWARGS, **read_kwargs}
+    lower = path.lower()
+    if lower.endswith(".zip"):
+        # Zipped shapefile - read it in place through /vsizip/, without extracting
+        stat = os.stat(path)
+        path = _zipped_shapefile(path, layer_name, stat.st_mtime_ns, stat.st_size)
+    elif layer_name:
+        read_kwargs["layer"] = layer_name
+    return order_columns(gpd.read_file(path, **read_kwargs), read_kwargs.get("columns"))
+
+
+def _download_name(name_value: str, extension: str = ".csv") -> str:
+    # Clean filename for download
+    safe_name_value = "".join(c for c in name_value if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return f"{safe_name_value}_points{extension}" if safe_name_value else f"selected_points{extension}"
+
+
+def _download_response(chunks: Iterable[bytes], download_name: str, mimetype: str = "text/csv") -> Response:
+    """Stream file blocks as a download, gzip-compressed on the fly if the client accepts it."""
+    response = Response(chunks, mimetype=mimetype)
+    response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    response.headers["Vary"] = "Accept-Encoding"
+    # Parquet and Feather are compressed already
+    precompressed = mimetype in (OUTPUT_MIMETYPES["parquet"], OUTPUT_MIMETYPES["feather"])
+    if app.config["GZIP_DOWNLOADS"] and not precompressed and request.accept_encodings["gzip"]:
+        response.response = gzip_chunks(chunks)
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def _read_uploaded_layer(path: str, content_hash: str, layer_name: Optional[str]) -> gpd.GeoDataFrame:
+    if layer_cache is None:
+        return read_vector_layer(path, layer_name)
+    with layer_cache.pinned(
+        cache_key(content_hash, layer_name),
+        lambda: iter_chunks(make_rows_reader(lambda **kwargs: read_vector_layer(path, layer_name, **kwargs)),
+                            app.config["POINTS_CHUNK_SIZE"]),
+    ) as entry:
+        return layer_cache.read_layer(entry)
 
 
 @app.route("/", methods=["GET"])
@@ -136,98 +176,317 @@ def index():
     return render_template("index.html")
 
 
-@app.route("/run", methods=["POST"])
-def run_tool():
-    try:
-        points_file = request.files.get("points_file")
-        polygons_file = request.files.get("polygons_file")
-        if not points_file or not polygons_file:
-            flash("Please upload both points and polygons files.")
-            return redirect(url_for("index"))
-
-        if not (_allowed_extension(points_file.filename) and _allowed_extension(polygons_file.filename)):
-            flash("Unsupported file type. Use GeoPackage (.gpkg), GeoJSON (.geojson/.json), or zipped Shapefile (.zip).")
-            return redirect(url_for("index"))
-
-        unique_prefix = uuid.uuid4().hex
-        points_path = os.path.join(UPLOAD_DIR, f"{unique_prefix}_" + secure_filename(points_file.filename))
-        polygons_path = os.path.join(UPLOAD_DIR, f"{unique_prefix}_" + secure_filename(polygons_file.filename))
-        points_file.save(points_path)
-        polygons_file.save(polygons_path)
-
-        points_layer = request.form.get("points_layer") or None
-        polygons_layer = request.form.get("polygons_layer") or None
-        name_column = request.form.get("name_column", "").strip()
-        name_value = request.form.get("name_value", "").strip()
-        predicate = request.form.get("predicate", "within")
-        case_sensitive = request.form.get("case_sensitive") == "on"
-
-        if not name_column or not name_value:
-            flash("Both 'Name column' and 'Name value' are required.")
-            return redirect(url_for("index"))
+def _wants_json() -> bool:
+    return request.accept_mimetypes.best == "application/json"
 
-        # Read and process data
-        print(f"Reading points from: {points_path}")
-        points = read_vector_layer(points_path, points_layer)
-        print(f"Successfully read {len(points)} points")
-        
-        print(f"Reading polygons from: {polygons_path}")
-        polygons = read_vector_layer(polygons_path, polygons_layer)
-        print(f"Successfully read {len(polygons)} polygons")
 
-        points = ensure_crs_compatible(points, polygons)
-        matched_polygons = filter_polygons_by_name(polygons, name_column, name_value, case_sensitive)
+def _run_error(message: str, status: int = 400):
+    # The page submits with fetch and asks for JSON; plain form posts get a flash message
+    if _wants_json():
+        return jsonify(error=message), status
+    flash(message)
+    return redirect(url_for("index"))
 
-        if matched_polygons.empty:
-            flash(f"No polygon matched the name '{name_value}' in column '{name_column}'. Try a different value or check spelling.")
-            return redirect(url_for("index"))
 
+def _extract_points_job(job: Job, *params) -> None:
+    """Body of a /run job: :func:`_extract_points`, profiled into :data:`stage_metrics`."""
+    profile = Profile(metrics=stage_metrics)
+    cprofile_dir = app.config["CPROFILE_DIR"]
+    try:
+        with cprofile_to(os.path.join(cprofile_dir, f"{job.id}.prof") if cprofile_dir else None):
+            _extract_points(job, profile, *params)
+    finally:
+        print(json.dumps(dict(profile.summary(), job_id=job.id)))
+
+
+def _extract_points(job: Job, profile: Profile, points_path: str, points_hash: str, points_layer: Optional[str],
+                    polygons_path: str, polygons_hash: str, polygons_layer: Optional[str],
+                    name_column: str, name_value: str, predicate: str, case_sensitive: bool,
+                    output_format: str, geometry: str, columns: Optional[List[str]] = None,
+                    distance: Optional[float] = None) -> None:
+    """Select the points and leave the output file in ``job.result_path``.
+
+    Only the ``columns`` of the points (None: all) and the name column of the
+    polygons are loaded. With ``distance`` the points within that many metres
+    of the matched polygons are selected instead of using ``predicate``.
+    """
+    extension = OUTPUT_EXTENSIONS[output_format]
+    result_path = os.path.join(UPLOAD_DIR, f"{job.id}_result{extension}")
+    try:
+        # Read and process data
+        job.update("reading")
+        chunk_size = app.config["POINTS_CHUNK_SIZE"]
+        read_points_file = functools.partial(read_vector_layer, points_path, points_layer)
+
+        def load_polygons() -> gpd.GeoDataFrame:
+            # Cached entries keep every column, so other name columns can use them too
+            if layer_cache is not None:
+                with layer_cache.pinned(
+                    cache_key(polygons_hash, polygons_layer),
+                    lambda: [read_vector_layer(polygons_path, polygons_layer)],
+                ) as polygons_entry:
+                    check_columns(layer_cache.layer_columns(polygons_entry), [name_column], "polygons")
+                    return layer_cache.read_layer(polygons_entry, columns=[name_column])
+            print(f"Reading polygons from: {polygons_path}")
+            read_polygons = functools.partial(read_vector_layer, polygons_path, polygons_layer)
+            check_layer_columns(read_polygons, [name_column], "polygons")
+            return read_polygons(columns=[name_column])
+
+        with profile.stage("read_polygons") as stage:
+            catalog = polygon_catalogs.get(cache_key(polygons_hash, polygons_layer), name_column, load_polygons)
+            stage.rows_out = len(catalog.polygons)
+        print(f"Using {len(catalog.polygons)} polygons")
+
+        job.update("filtering")
+        matched_polygons, union_geom = union_for_name(catalog, name_value, case_sensitive, profile)
         print(f"Found {len(matched_polygons)} matching polygons")
-        union_geom = build_union_geometry(matched_polygons)
-        selected_points = select_points(points, union_geom, predicate)
-        print(f"Selected {len(selected_points)} points using {predicate} predicate")
-
-        # Prepare CSV output
-        df_out = selected_points.drop(columns=["geometry"], errors="ignore")
-        csv_stream = io.StringIO()
-        df_out.to_csv(csv_stream, index=False, encoding="utf-8")
-        csv_bytes = io.BytesIO(csv_stream.getvalue().encode("utf-8"))
-        
-        # Clean filename for download
-        safe_name_value = "".join(c for c in name_value if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        download_name = f"{safe_name_value}_points.csv" if safe_name_value else "selected_points.csv"
 
+        # Only read the points inside the bounding box of the matched polygons
+        job.update("reading")
+        if layer_cache is not None:
+            with profile.stage("cache_points"):
+                source = CachedPointSource(layer_cache, points_hash, points_layer,
+                                           lambda: iter_chunks(make_rows_reader(read_points_file), chunk_size),
+                                           columns=columns)
+        else:
+            check_layer_columns(read_points_file, columns, "the point layer")
+            read_columns = read_points_file if columns is None else functools.partial(read_points_file, columns=columns)
+            source = ReaderPointSource(read_columns, chunk_size)
+
+        # Stream the points through the selection, writing matches to a file on disk in batches
+        print(f"Reading points from: {points_path} in chunks of {chunk_size} rows")
+        try:
+            with PointsWriter(result_path, output_format, geometry, crs=catalog.polygons.crs) as writer:
+                total_stats = extract_points(source, union_geom, catalog.polygons.crs, writer, predicate,
+                                             reproject=app.config["REPROJECT_MODE"], pool=selection_pool,
+                                             profile=profile, progress=job.update, distance=distance)
+        finally:
+            if isinstance(source, CachedPointSource):
+                source.close()  # Unpins its cache entry
+        if layer_cache is not None:
+            print(f"Layer cache: {layer_cache.stats()}")
+        print(format_selection_stats(total_stats))
+        if distance is not None:
+            print(f"Selected {int(total_stats['selected'])} points within {distance:g} m")
+        else:
+            print(f"Selected {int(total_stats['selected'])} points using {predicate} predicate")
+
+        job.result_path = result_path
+        job.result_mimetype = OUTPUT_MIMETYPES[output_format]
+        job.download_name = _download_name(name_value, extension)
+    except Exception:
+        _remove_quietly(result_path)
+        raise
+    finally:
         # Clean up uploaded files
+        _remove_quietly(points_path)
+        _remove_quietly(polygons_path)
+
+
+@app.route("/run", methods=["POST"])
+def run_tool():
+    """Queue a point extraction and return its job id; poll /jobs/<id> for progress."""
+    points_file = request.files.get("points_file")
+    polygons_file = request.files.get("polygons_file")
+    if not points_file or not polygons_file:
+        return _run_error("Please upload both points and polygons files.")
+
+    if not (_allowed_extension(points_file.filename) and _allowed_extension(polygons_file.filename)):
+        return _run_error("Unsupported file type. Use GeoPackage (.gpkg), GeoJSON (.geojson/.json), or zipped Shapefile (.zip).")
+
+    points_layer = request.form.get("points_layer") or None
+    polygons_layer = request.form.get("polygons_layer") or None
+    name_column = request.form.get("name_column", "").strip()
+    name_value = request.form.get("name_value", "").strip()
+    predicate = request.form.get("predicate", "within")
+    case_sensitive = request.form.get("case_sensitive") == "on"
+    output_format = request.form.get("output_format") or "csv"
+    geometry = request.form.get("geometry") or "none"
+    # Empty: every column
+    columns = parse_columns(request.form.get("columns", "")) or None
+    distance_value = request.form.get("distance", "").strip()
+
+    if not name_column or not name_value:
+        return _run_error("Both 'Name column' and 'Name value' are required.")
+    if predicate not in SUPPORTED_PREDICATES:
+        return _run_error(f"Unsupported predicate: {predicate}")
+    try:
+        check_output_format(output_format, geometry)
+    except ValueError as exc:
+        return _run_error(str(exc))
+    distance = None
+    if distance_value:
         try:
-            os.remove(points_path)
-            os.remove(polygons_path)
-        except:
-            pass  # Ignore cleanup errors
-
-        print(f"Sending CSV download: {download_name} with {len(df_out)} records")
-        return send_file(
-            csv_bytes,
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name=download_name,
+            distance = float(distance_value)
+        except ValueError:
+            distance = math.nan
+        if not (math.isfinite(distance) and distance >= 0):
+            return _run_error("Distance must be a number of metres, zero or more.")
+
+    unique_prefix = uuid.uuid4().hex
+    points_path = os.path.join(UPLOAD_DIR, f"{unique_prefix}_" + secure_filename(points_file.filename))
+    polygons_path = os.path.join(UPLOAD_DIR, f"{unique_prefix}_" + secure_filename(polygons_file.filename))
+    try:
+        points_hash = save_stream_with_hash(points_file.stream, points_path)
+        polygons_hash = save_stream_with_hash(polygons_file.stream, polygons_path)
+        job = job_queue.submit(
+            lambda job: _extract_points_job(job, points_path, points_hash, points_layer,
+                                            polygons_path, polygons_hash, polygons_layer,
+                                            name_column, name_value, predicate, case_sensitive,
+                                            output_format, geometry, columns, distance),
+            client=request.remote_addr,
         )
-        
+    except QueueFullError as exc:
+        _remove_quietly(points_path)
+        _remove_quietly(polygons_path)
+        response = _run_error(str(exc), 503)
+        response.headers["Retry-After"] = "30"
+        return response
     except Exception as exc:
         print(f"Error in run_tool: {str(exc)}")
-        import traceback
-        traceback.print_exc()
-        
-        # Clean up files on error
-        try:
-            if 'points_path' in locals():
-                os.remove(points_path)
-            if 'polygons_path' in locals():
-                os.remove(polygons_path)
-        except:
-            pass
-            
-        flash(f"Error processing your request: {str(exc)}")
-        return redirect(url_for("index"))
+        _remove_quietly(points_path)
+        _remove_quietly(polygons_path)
+        return _run_error(f"Error processing your request: {str(exc)}")
+
+    print(f"Queued job {job.id}: {job_queue.stats()}")
+    status_url = url_for("job_status", job_id=job.id)
+    response = jsonify(
+        job_id=job.id,
+        status_url=status_url,
+        result_url=url_for("job_result", job_id=job.id),
+    )
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Per-stage histograms, job queue and cache counters in the Prometheus text format."""
+    extra = {}
+    for name, value in job_queue.stats().items():
+        if name in ("completed", "failed", "rejected"):
+            extra[f"gis_jobs_{name}_total"] = ("counter", f"Jobs {name} since start.", value)
+        else:
+            extra[f"gis_jobs_{name}"] = ("gauge", f"Job queue: {name.replace('_', ' ')}.", value)
+    if layer_cache is not None:
+        for name, value in layer_cache.stats().items():
+            extra[f"gis_layer_cache_{name}_total"] = ("counter", f"Layer cache {name} since start.", value)
+    extra["gis_process_resident_memory_bytes"] = ("gauge", "Resident memory of the web process.", rss_bytes())
+    extra["gis_process_peak_resident_memory_bytes"] = ("gauge", "Peak resident memory of the web process.", peak_rss_bytes())
+    return Response(stage_metrics.render(extra), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/jobs", methods=["GET"])
+def job_metrics():
+    """Queue depth and job counters."""
+    return jsonify(job_queue.stats())
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error=f"Unknown or expired job '{job_id}'."), 404
+    status = job.to_dict()
+    status["queue_position"] = job_queue.queue_position(job)
+    if job.status == DONE:
+        status["result_url"] = url_for("job_result", job_id=job.id)
+    return jsonify(status)
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id: str):
+    """Download the result of a finished job; it stays available until the job expires."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error=f"Unknown or expired job '{job_id}'."), 404
+    if job.status == FAILED:
+        return jsonify(error=job.error), 409
+    if job.status != DONE:
+        return jsonify(error="The job has not finished yet.", status=job.status, stage=job.stage), 409
+    print(f"Sending download: {job.download_name} with {job.progress.get('rows_selected', 0)} records")
+    return _download_response(iter_file_blocks(job.result_path), job.download_name, job.result_mimetype)
+
+
+@app.route("/datasets", methods=["POST"])
+def upload_dataset():
+    """Upload a layer once and get a dataset id to use with /query."""
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify(error="Please upload a layer in the 'file' field."), 400
+    if not _allowed_extension(upload.filename):
+        return jsonify(error="Unsupported file type. Use GeoPackage (.gpkg), GeoJSON (.geojson/.json), or zipped Shapefile (.zip)."), 400
+    layer_name = request.form.get("layer") or None
+
+    upload_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_" + secure_filename(upload.filename))
+    try:
+        content_hash = save_stream_with_hash(upload.stream, upload_path)
+        dataset_id = cache_key(content_hash, layer_name)
+        gdf = dataset_registry.get(dataset_id)
+        if gdf is None:
+            gdf = dataset_registry.add(dataset_id, _read_uploaded_layer(upload_path, content_hash, layer_name))
+        print(f"Registered dataset {dataset_id} with {len(gdf)} features: {dataset_registry.stats()}")
+        return jsonify(dataset_id=dataset_id, **layer_summary(gdf)), 201
+    except Exception as exc:
+        print(f"Error in upload_dataset: {str(exc)}")
+        return jsonify(error=f"Could not read the uploaded layer: {str(exc)}"), 400
+    finally:
+        _remove_quietly(upload_path)
+
+
+@app.route("/datasets/<dataset_id>", methods=["GET"])
+def describe_dataset(dataset_id: str):
+    gdf = dataset_registry.get(dataset_id) if is_cache_key(dataset_id) else None
+    if gdf is None:
+        return jsonify(error=f"Unknown or expired dataset '{dataset_id}'. Upload it again."), 404
+    return jsonify(dataset_id=dataset_id, **layer_summary(gdf))
+
+
+@app.route("/query", methods=["POST"])
+def query_datasets():
+    """Select points from uploaded datasets by polygon name; returns CSV like /run."""
+    params = request.get_json(silent=True) or request.form
+    points_id = params.get("points_dataset")
+    polygons_id = params.get("polygons_dataset")
+    name_column = str(params.get("name_column") or "").strip()
+    name_value = str(params.get("name_value") or "").strip()
+    predicate = params.get("predicate") or "within"
+    case_sensitive = params.get("case_sensitive") in (True, "on", "true", "1")
+
+    if not points_id or not polygons_id:
+        return jsonify(error="Both 'points_dataset' and 'polygons_dataset' are required."), 400
+    if not name_column or not name_value:
+        return jsonify(error="Both 'name_column' and 'name_value' are required."), 400
+    if predicate not in SUPPORTED_PREDICATES:
+        return jsonify(error=f"Unsupported predicate: {predicate}"), 400
+
+    try:
+        # Ids come from the client; anything not shaped like an issued id is unknown
+        polygons = dataset_registry.get(polygons_id) if is_cache_key(polygons_id) else None
+        points = dataset_registry.get(points_id) if is_cache_key(points_id) else None
+        for dataset_id, gdf in ((polygons_id, polygons), (points_id, points)):
+            if gdf is None:
+                return jsonify(error=f"Unknown or expired dataset '{dataset_id}'. Upload it again."), 404
+        if points.crs is not None and polygons.crs is not None and points.crs != polygons.crs:
+            # The registry keeps the reprojected copy (and its index) for later queries
+            points = dataset_registry.get(points_id, crs=polygons.crs)
+        points = ensure_crs_compatible(points, polygons)
+
+        catalog = polygon_catalogs.get(polygons_id, name_column, lambda: polygons)
+        if len(catalog.positions(name_value, case_sensitive)) == 0:
+            return jsonify(error=f"No polygon matched the name '{name_value}' in column '{name_column}'."), 404
+        union_geom = catalog.union(name_value, case_sensitive)
+
+        selection_stats = {}
+        with Profile(metrics=stage_metrics).stage("select", rows_in=len(points)) as stage:
+            selected_points = predicate_strategy(predicate)(points, union_geom, stats=selection_stats, pool=selection_pool)
+            stage.rows_out = len(selected_points)
+        print(format_selection_stats(selection_stats))
+        return _download_response(iter_points_csv(selected_points), _download_name(name_value))
+    except Exception as exc:
+        print(f"Error in query_datasets: {str(exc)}")
+        return jsonify(error=f"Error processing your request: {str(exc)}"), 400
 
 
 if __name__ == "__main__":
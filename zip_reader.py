@@ -0,0 +1,97 @@
+"""
+Locate the Shapefile inside a ZIP upload and read it in place.
+
+The archive's member list is read once and grouped with
+``diagnose_zip.analyze_zip_members``. The first complete Shapefile (a ``.shp``
+with matching ``.shx`` and ``.dbf``) - or the one named by the requested
+layer - is opened directly through GDAL's ``/vsizip/`` virtual file system, so
+nothing is extracted. Folders inside the archive and one level of nested ZIPs
+are supported; macOS resource-fork entries are ignored.
+
+Anything else fails straight away with a :class:`ZipLayerError` that says
+what is wrong with the archive.
+"""
+
+import os
+import zipfile
+from typing import List, Optional, Tuple
+
+from diagnose_zip import analyze_zip_members
+
+# Nested archives are searched this many levels deep
+_MAX_NESTING = 1
+
+
+class ZipLayerError(ValueError):
+    """The ZIP file does not contain a readable Shapefile."""
+
+
+def _is_metadata_entry(name: str) -> bool:
+    return name.startswith("__MACOSX/") or os.path.basename(name).startswith("._")
+
+
+def _shapefile_stem(shp_name: str) -> str:
+    return os.path.splitext(os.path.basename(shp_name))[0]
+
+
+def _find_in_archive(archive: zipfile.ZipFile, vsi_root: str, layer_name: Optional[str], depth: int) -> Tuple[str, str]:
+    names = [name for name in archive.namelist() if not _is_metadata_entry(name)]
+    analysis = analyze_zip_members(names)
+    lower_names = {name.lower() for name in names}
+
+    complete: List[str] = []
+    missing = {}
+    for shp_name in analysis["shp"]:
+        base = os.path.splitext(shp_name)[0]
+        absent = [base + ext for ext in (".shx", ".dbf") if (base + ext).lower() not in lower_names]
+        if absent:
+            missing[shp_name] = absent
+        else:
+            complete.append(shp_name)
+
+    if layer_name:
+        wanted = _shapefile_stem(layer_name).lower()
+        candidates = [name for name in complete if _shapefile_stem(name).lower() == wanted]
+        if not candidates and complete:
+            available = ", ".join(_shapefile_stem(name) for name in complete)
+            raise ZipLayerError(f"No Shapefile named '{layer_name}' in the ZIP file. Available: {available}")
+    else:
+        candidates = complete
+
+    if candidates:
+        if len(candidates) > 1:
+            print(f"ZIP file contains {len(candidates)} Shapefiles; using the first: {candidates[0]}")
+        return f"{vsi_root}/{candidates[0]}", candidates[0]
+
+    if missing:
+        details = "; ".join(f"{shp} is missing {', '.join(absent)}" for shp, absent in missing.items())
+        raise ZipLayerError(f"Incomplete Shapefile in the ZIP file: {details}")
+
+    nested = [name for name in analysis["other"] if name.lower().endswith(".zip")]
+    if depth < _MAX_NESTING:
+        for inner_name in nested:
+            try:
+                with archive.open(inner_name) as inner_file, zipfile.ZipFile(inner_file) as inner:
+                    vsi_path, member = _find_in_archive(inner, f"/vsizip/{{{vsi_root}/{inner_name}}}", layer_name, depth + 1)
+                    return vsi_path, f"{inner_name}/{member}"
+            except (zipfile.BadZipFile, ZipLayerError):
+                continue
+
+    listing = ", ".join(names[:10]) + (" ..." if len(names) > 10 else "")
+    raise ZipLayerError(
+        f"No Shapefile (.shp with .shx and .dbf) found in the ZIP file. Contents: {listing or 'empty archive'}"
+    )
+
+
+def find_zipped_shapefile(zip_path: str, layer_name: Optional[str] = None) -> Tuple[str, str]:
+    """Return ``(gdal_path, member)`` for the Shapefile to read from ``zip_path``.
+
+    ``gdal_path`` can be passed to ``gpd.read_file``; ``member`` is the chosen
+    ``.shp`` inside the archive, for reporting. ``layer_name`` selects a
+    Shapefile by name when the archive holds several.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            return _find_in_archive(archive, f"/vsizip/{zip_path}", layer_name, depth=0)
+    except zipfile.BadZipFile:
+        raise ZipLayerError("This is not a valid ZIP file or it is corrupted.") from None